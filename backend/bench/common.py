@@ -0,0 +1,174 @@
+"""Helpers shared by the benchmark scripts: server processes, percentiles, resource usage and baselines."""
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics where a larger value is a regression; everything else compared is "higher is better"
+LOWER_IS_BETTER = ("p50", "p95", "p99", "cpu_seconds", "peak_rss_mb")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_fake_scenario(port: int, fake_args: Sequence[str] = ()) -> subprocess.Popen:
+    """Run bench/fake_scenario.py in its own process so it does not compete with the code under test."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_scenario", "--port", str(port), *fake_args],
+        cwd=BACKEND_DIR,
+    )
+    wait_ready(f"http://127.0.0.1:{port}/stats", process)
+    return process
+
+
+def stop(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and all its descendants (Linux /proc); the image pool workers are children of the server."""
+    pids = [pid]
+    for current in pids:
+        try:
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process tree, or None where /proc is unavailable."""
+    ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    total = 0
+    found = False
+    for current in _process_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                # Fields after the parenthesised command name; utime and stime are the 12th and 13th
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+            found = True
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / ticks if found else None
+
+
+def reset_peak_rss(pid: int) -> None:
+    for current in _process_tree(pid):
+        try:
+            with open(f"/proc/{current}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Sum of the high-water RSS of a process tree, in MiB."""
+    total = 0
+    found = False
+    for current in _process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+                        found = True
+                        break
+        except (OSError, ValueError):
+            continue
+    return total / 1024 if found else None
+
+
+def print_table(rows: Iterable[Dict[str, object]], columns: Sequence[str]) -> None:
+    rows = list(rows)
+
+    def cell(value) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.3f}" if value < 100 else f"{value:.0f}"
+        return str(value)
+
+    table = [[cell(row.get(col)) for col in columns] for row in rows]
+    widths = [max(len(col), *(len(r[i]) for r in table)) if table else len(col) for i, col in enumerate(columns)]
+    print("  ".join(col.rjust(w) for col, w in zip(columns, widths)))
+    for r in table:
+        print("  ".join(value.rjust(w) for value, w in zip(r, widths)))
+
+
+def write_results(path: str, results: List[Dict[str, object]]) -> None:
+    with open(path, "w") as f:
+        json.dump({"created_at": time.time(), "results": results}, f, indent=2)
+
+
+def compare_baseline(results: List[Dict[str, object]], baseline_path: str, keys: Sequence[str], tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (a fraction) against a previous --output file, matched on `keys`."""
+    with open(baseline_path) as f:
+        baseline = {tuple(row.get(k) for k in keys): row for row in json.load(f).get("results", [])}
+    regressions = []
+    for row in results:
+        before = baseline.get(tuple(row.get(k) for k in keys))
+        if not before:
+            continue
+        for metric in ("p50", "p95", "p99", "throughput"):
+            old, new = before.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                label = "/".join(str(row.get(k)) for k in keys)
+                regressions.append(f"{label} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+    return regressions
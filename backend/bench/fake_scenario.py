@@ -0,0 +1,374 @@
+"""
+Local stand-in for the Scenario API, for load tests that must not spend credits.
+
+Implements the endpoints the backend uses:
+
+    POST /v1/generate/custom/{model_id}    start a job
+    GET  /v1/jobs/{job_id}                 job status, progress and asset ids
+    POST /v1/jobs/{job_id}/action          {"action": "cancel"} stops a running job
+    HEAD/GET /v1/assets/{asset_id}/download
+    GET  /v1/assets/{asset_id}             asset metadata with a URL
+    GET  /v1/models/{model_id}             model record (the readiness credential check)
+    GET  /files/{asset_id}                 asset bytes (honours Range)
+
+plus GET /test-images/{width}x{height}.png (green-screen test images for
+micro-benchmarks) and GET /stats (request counts by route and status).
+
+Job duration, the shape of the progress curve, failure/429/5xx rates,
+redirect vs metadata asset URLs (and whether jobs list them) and the size
+of the generated images and videos are all set on the command line:
+
+    python -m bench.fake_scenario --port 8100 --image-seconds 2 --throttle-rate 0.05
+
+then start the backend with SCENARIO_API_BASE=http://127.0.0.1:8100/v1.
+"""
+import argparse
+import asyncio
+import io
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from PIL import Image, ImageDraw
+
+PROGRESS_CURVES = ("linear", "ease", "stall")
+URL_MODES = ("redirect", "direct", "metadata")
+
+
+class FakeScenarioConfig:
+    def __init__(
+        self,
+        image_seconds: float = 3.0,
+        video_seconds: float = 20.0,
+        jitter: float = 0.2,
+        progress_curve: str = "linear",
+        failure_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        url_mode: str = "redirect",
+        url_ttl: float = 3600.0,
+        job_urls: bool = False,
+        image_width: int = 1024,
+        image_height: int = 1820,
+        backdrop_noise: float = 0.0,
+        video_bytes: int = 8 * 1024 * 1024,
+        latency: float = 0.02,
+        seed: Optional[int] = None,
+    ):
+        # Job duration in seconds, +/- jitter as a fraction of it
+        self.image_seconds = image_seconds
+        self.video_seconds = video_seconds
+        self.jitter = jitter
+        # linear; ease (slow start and finish); stall (0% until the job is done)
+        self.progress_curve = progress_curve
+        # Fraction of jobs that end in "failure"
+        self.failure_rate = failure_rate
+        # Fraction of API requests answered 429 (with Retry-After) or 503
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        # redirect: /download answers 302 to /files; direct: /download serves the bytes;
+        # metadata: /download is 404 so clients must read the URL from the asset metadata
+        self.url_mode = url_mode
+        # File URLs carry an `Expires` epoch this far out, like signed storage URLs
+        self.url_ttl = url_ttl
+        # List each asset's URL in the finished job payload, so no asset lookup is needed
+        self.job_urls = job_urls
+        self.image_width = image_width
+        self.image_height = image_height
+        # Std-dev of per-pixel noise on the green backdrop; enough of it makes the chroma key fall back to rembg
+        self.backdrop_noise = backdrop_noise
+        self.video_bytes = video_bytes
+        # Added to every API response
+        self.latency = latency
+        self.seed = seed
+
+
+def render_test_image(width: int, height: int, backdrop_noise: float = 0.0, seed: int = 0) -> bytes:
+    """A PNG subject (framed board with a few shapes) on a flat #00FF00 backdrop."""
+    image = Image.new("RGB", (width, height), (0, 255, 0))
+    draw = ImageDraw.Draw(image)
+    margin_x, margin_y = width // 6, height // 6
+    draw.rounded_rectangle(
+        (margin_x, margin_y, width - margin_x, height - margin_y),
+        radius=max(4, min(width, height) // 20),
+        fill=(214, 96, 48),
+        outline=(90, 40, 20),
+        width=max(2, min(width, height) // 60),
+    )
+    cell = max(4, (width - 2 * margin_x) // 7)
+    for row in range(5):
+        for col in range(5):
+            x = margin_x + cell * (col + 1)
+            y = margin_y + cell * (row + 1)
+            draw.rounded_rectangle((x, y, x + cell * 0.8, y + cell * 0.8), radius=cell // 6, fill=(250, 244, 230))
+    if backdrop_noise > 0:
+        import numpy as np
+
+        pixels = np.asarray(image, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        pixels += rng.normal(0.0, backdrop_noise, pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _progress(curve: str, fraction: float) -> float:
+    fraction = min(max(fraction, 0.0), 1.0)
+    if curve == "ease":
+        return fraction * fraction * (3 - 2 * fraction)
+    if curve == "stall":
+        return 0.0 if fraction < 1.0 else 1.0
+    return fraction
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (header or "").strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        # Suffix range: the last N bytes
+        start, end = max(0, size - int(match.group(2))), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def create_app(config: Optional[FakeScenarioConfig] = None) -> FastAPI:
+    config = config or FakeScenarioConfig()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="Fake Scenario API")
+    jobs: Dict[str, Dict] = {}
+    assets: Dict[str, str] = {}
+    stats: Counter = Counter()
+    image_bytes = render_test_image(config.image_width, config.image_height, config.backdrop_noise, config.seed or 0)
+    video_bytes = random.Random(config.seed).randbytes(config.video_bytes)
+    test_images: Dict[Tuple[int, int, float], bytes] = {}
+
+    def file_url(request: Request, asset_id: str) -> str:
+        return f"{request.url_for('files', asset_id=asset_id)}?Expires={int(time.time() + config.url_ttl)}"
+
+    def count(route: str, status: int) -> None:
+        stats[f"{route} {status}"] += 1
+
+    async def admit(route: str) -> Optional[Response]:
+        """Simulated latency and rate limiting shared by every API route."""
+        if config.latency > 0:
+            await asyncio.sleep(config.latency)
+        roll = rng.random()
+        if roll < config.throttle_rate:
+            count(route, 429)
+            return JSONResponse({"error": "Too Many Requests"}, status_code=429, headers={"Retry-After": f"{config.retry_after:g}"})
+        if roll < config.throttle_rate + config.error_rate:
+            count(route, 503)
+            return JSONResponse({"error": "Service Unavailable"}, status_code=503)
+        return None
+
+    def asset_payload(asset_id: str) -> Tuple[bytes, str]:
+        kind = assets.get(asset_id)
+        if kind is None:
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return (video_bytes, "video/mp4") if kind == "video" else (image_bytes, "image/png")
+
+    def serve_bytes(body: bytes, content_type: str, request: Request) -> Response:
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{len(body)}-{config.seed}"'}
+        span = _parse_range(request.headers.get("range"), len(body))
+        if span is None:
+            headers["Content-Length"] = str(len(body))
+            return Response(b"" if request.method == "HEAD" else body, media_type=content_type, headers=headers)
+        start, end = span
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        headers["Content-Length"] = str(end - start + 1)
+        chunk = b"" if request.method == "HEAD" else body[start:end + 1]
+        return Response(chunk, status_code=206, media_type=content_type, headers=headers)
+
+    @app.post("/v1/generate/custom/{model_id}")
+    async def generate(model_id: str, request: Request):
+        rejected = await admit("generate")
+        if rejected:
+            return rejected
+        kind = "video" if "veo" in model_id else "image"
+        duration = config.video_seconds if kind == "video" else config.image_seconds
+        duration *= 1 + rng.uniform(-config.jitter, config.jitter)
+        job_id = f"job_{uuid.uuid4().hex[:16]}"
+        jobs[job_id] = {
+            "kind": kind,
+            "model_id": model_id,
+            "started_at": time.monotonic(),
+            "duration": max(0.0, duration),
+            "fails": rng.random() < config.failure_rate,
+            "asset_id": f"asset_{uuid.uuid4().hex[:16]}",
+        }
+        count("generate", 200)
+        return {"job": {"jobId": job_id, "status": "queued", "progress": 0}}
+
+    @app.get("/v1/jobs/{job_id}")
+    async def get_job(job_id: str, request: Request):
+        rejected = await admit("jobs")
+        if rejected:
+            return rejected
+        job = jobs.get(job_id)
+        if job is None:
+            count("jobs", 404)
+            raise HTTPException(status_code=404, detail="Job not found")
+        elapsed = time.monotonic() - job["started_at"]
+        fraction = 1.0 if job["duration"] <= 0 else elapsed / job["duration"]
+        payload = {"jobId": job_id, "progress": _progress(config.progress_curve, fraction), "metadata": {}}
+        if job.get("canceled"):
+            payload["status"] = "canceled"
+        elif fraction < 1.0:
+            payload["status"] = "in-progress"
+        elif job["fails"]:
+            payload["status"] = "failure"
+            payload["error"] = "Simulated failure"
+        else:
+            payload["status"] = "success"
+            payload["progress"] = 1.0
+            assets[job["asset_id"]] = job["kind"]
+            payload["metadata"]["assetIds"] = [job["asset_id"]]
+            if config.job_urls:
+                payload["metadata"]["assets"] = [{"assetId": job["asset_id"], "url": file_url(request, job["asset_id"])}]
+        count("jobs", 200)
+        return {"job": payload}
+
+    @app.post("/v1/jobs/{job_id}/action")
+    async def job_action(job_id: str, request: Request):
+        rejected = await admit("job_action")
+        if rejected:
+            return rejected
+        job = jobs.get(job_id)
+        body = await request.json()
+        if job is None or body.get("action") != "cancel":
+            count("job_action", 404 if job is None else 400)
+            raise HTTPException(status_code=404 if job is None else 400, detail="Cannot apply action")
+        if time.monotonic() - job["started_at"] >= job["duration"]:
+            count("job_action", 409)
+            raise HTTPException(status_code=409, detail="Job already finished")
+        job["canceled"] = True
+        count("job_action", 200)
+        return {"job": {"jobId": job_id, "status": "canceled"}}
+
+    @app.api_route("/v1/assets/{asset_id}/download", methods=["GET", "HEAD"])
+    async def download_asset(asset_id: str, request: Request):
+        rejected = await admit("download")
+        if rejected:
+            return rejected
+        body, content_type = asset_payload(asset_id)
+        if config.url_mode == "metadata":
+            count("download", 404)
+            return Response(status_code=404)
+        count("download", 200)
+        if config.url_mode == "redirect":
+            return RedirectResponse(file_url(request, asset_id), status_code=302)
+        return serve_bytes(body, content_type, request)
+
+    @app.get("/v1/assets/{asset_id}")
+    async def asset_metadata(asset_id: str, request: Request):
+        rejected = await admit("assets")
+        if rejected:
+            return rejected
+        body, content_type = asset_payload(asset_id)
+        count("assets", 200)
+        return {
+            "asset": {
+                "id": asset_id,
+                "mimeType": content_type,
+                "size": len(body),
+                "url": file_url(request, asset_id),
+            }
+        }
+
+    @app.api_route("/files/{asset_id}", methods=["GET", "HEAD"], name="files")
+    async def files(asset_id: str, request: Request):
+        body, content_type = asset_payload(asset_id)
+        count("files", 200)
+        return serve_bytes(body, content_type, request)
+
+    @app.get("/test-images/{width}x{height}.png")
+    async def test_image(width: int, height: int, request: Request, noise: float = 0.0):
+        if not (16 <= width <= 8192 and 16 <= height <= 8192):
+            raise HTTPException(status_code=400, detail="Size out of range")
+        key = (width, height, noise)
+        if key not in test_images:
+            test_images[key] = render_test_image(width, height, noise, config.seed or 0)
+        count("test-images", 200)
+        return serve_bytes(test_images[key], "image/png", request)
+
+    @app.get("/v1/models/{model_id}")
+    async def get_model(model_id: str):
+        count("models", 200)
+        return {"model": {"id": model_id, "status": "trained"}}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {"requests": dict(sorted(stats.items())), "jobs": len(jobs), "assets": len(assets)}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeScenarioConfig()
+    parser.add_argument("--image-seconds", type=float, default=defaults.image_seconds, help="image job duration (default: %(default)s)")
+    parser.add_argument("--video-seconds", type=float, default=defaults.video_seconds, help="video job duration (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="job duration jitter as a fraction (default: %(default)s)")
+    parser.add_argument("--progress-curve", choices=PROGRESS_CURVES, default=defaults.progress_curve)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate, help="fraction of jobs that fail")
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate, help="fraction of API requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="fraction of API requests answered 503")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after, help="Retry-After sent with 429s (default: %(default)s)")
+    parser.add_argument("--url-mode", choices=URL_MODES, default=defaults.url_mode, help="how asset URLs are exposed (default: %(default)s)")
+    parser.add_argument("--url-ttl", type=float, default=defaults.url_ttl, help="lifetime of signed file URLs (default: %(default)s)")
+    parser.add_argument("--job-urls", action="store_true", help="include asset URLs in finished job payloads")
+    parser.add_argument("--image-size", default=f"{defaults.image_width}x{defaults.image_height}", help="generated image WIDTHxHEIGHT (default: %(default)s)")
+    parser.add_argument("--backdrop-noise", type=float, default=defaults.backdrop_noise, help="noise on the green backdrop; ~40 forces the rembg path")
+    parser.add_argument("--video-mb", type=float, default=defaults.video_bytes / (1024 * 1024), help="generated video size in MiB (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds added to every API response (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeScenarioConfig:
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    return FakeScenarioConfig(
+        image_seconds=args.image_seconds,
+        video_seconds=args.video_seconds,
+        jitter=args.jitter,
+        progress_curve=args.progress_curve,
+        failure_rate=args.failure_rate,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        url_mode=args.url_mode,
+        url_ttl=args.url_ttl,
+        job_urls=args.job_urls,
+        image_width=width,
+        image_height=height,
+        backdrop_noise=args.backdrop_noise,
+        video_bytes=int(args.video_mb * 1024 * 1024),
+        latency=args.latency,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local fake Scenario API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
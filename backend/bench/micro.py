@@ -0,0 +1,141 @@
+"""
+Micro-benchmark for remove_background_from_url.
+
+Serves green-screen test images of several sizes from the fake Scenario API
+and runs the real download -> chroma key / rembg -> encode path through the
+app's lifespan, in-process (--workers 0) or on the image process pool. Reports
+latency percentiles, throughput and the mean time of each stage, taken from
+the same STAGE_SECONDS histogram that /metrics exports.
+
+    python -m bench.micro --sizes 512x512,1024x1820 --iterations 30
+    python -m bench.micro --workers 4 --concurrency 8 --output micro.json
+    python -m bench.micro --noise 40 --baseline micro.json   # rembg path, fail on regressions
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from bench.common import compare_baseline, free_port, print_table, start_fake_scenario, stop, summarize, write_results
+
+STAGES = ("image_download", "chroma_key", "rembg", "encode", "background_removal")
+
+COLUMNS = ("size", "workers", "concurrency", "ok", "errors", "p50", "p95", "p99", "throughput") + tuple(f"{s}_ms" for s in STAGES)
+
+
+def _stage_totals(histogram) -> Dict[str, Tuple[int, float]]:
+    totals: Dict[str, Tuple[int, float]] = {}
+    for (stage, _model), (count, total) in histogram.totals().items():
+        c, t = totals.get(stage, (0, 0.0))
+        totals[stage] = (c + count, t + total)
+    return totals
+
+
+async def _run(args: argparse.Namespace, fake_port: int) -> List[Dict[str, object]]:
+    # Imported here: settings are read from the environment prepared in main()
+    import main
+    from metrics import STAGE_SECONDS
+
+    results = []
+    async with main.lifespan(main.app):
+        for size in args.sizes:
+            url = f"http://127.0.0.1:{fake_port}/test-images/{size}.png?noise={args.noise:g}"
+            # Warm up: first decode/encode and the fake server's image render are not what we measure
+            await main.remove_background_from_url(url)
+
+            before = _stage_totals(STAGE_SECONDS)
+            latencies: List[float] = []
+            errors = 0
+            next_index = 0
+
+            async def worker():
+                nonlocal next_index, errors
+                while next_index < args.iterations:
+                    next_index += 1
+                    started = time.perf_counter()
+                    try:
+                        ok = await main.remove_background_from_url(url) is not None
+                    except Exception:
+                        ok = False
+                    if ok:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            wall = time.perf_counter() - started
+            after = _stage_totals(STAGE_SECONDS)
+
+            row = {
+                "size": size,
+                "workers": args.workers,
+                "concurrency": args.concurrency,
+                "ok": len(latencies),
+                "errors": errors,
+                **summarize(latencies),
+                "throughput": len(latencies) / wall if wall > 0 else 0.0,
+            }
+            for stage in STAGES:
+                count = after.get(stage, (0, 0.0))[0] - before.get(stage, (0, 0.0))[0]
+                total = after.get(stage, (0, 0.0))[1] - before.get(stage, (0, 0.0))[1]
+                row[f"{stage}_ms"] = total / count * 1000 if count else None
+            results.append(row)
+            print_table([row], COLUMNS)
+    return results
+
+
+def parse_args() -> Tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(description="Benchmark remove_background_from_url on synthetic green-screen images")
+    parser.add_argument("--sizes", default="512x512,1024x1820,2048x2048", help="comma-separated WIDTHxHEIGHT (default: %(default)s)")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per size (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=1, help="calls in flight (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0, help="IMAGE_WORKERS; 0 runs in-process (default: %(default)s)")
+    parser.add_argument("--noise", type=float, default=0.0, help="backdrop noise; ~40 makes the chroma key fall back to rembg")
+    parser.add_argument("--no-chroma", action="store_true", help="disable the chroma key fast path")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="previous --output file; exit 1 on regressions beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression (default: %(default)s)")
+    args, fake_args = parser.parse_known_args()
+    args.sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    return args, [a for a in fake_args if a != "--"]
+
+
+def main() -> int:
+    args, fake_args = parse_args()
+    fake_port = free_port()
+    fake = None
+    with tempfile.TemporaryDirectory(prefix="orbella-micro-") as scratch:
+        os.environ.update({
+            "IMAGE_WORKERS": str(args.workers),
+            "CHROMA_KEY_ENABLED": "false" if args.no_chroma else "true",
+            "ASSET_DIR": os.path.join(scratch, "assets"),
+            "CACHE_DIR": os.path.join(scratch, "results"),
+            "CLAIM_DIR": os.path.join(scratch, "claims"),
+            "PREWARM_STATS_PATH": os.path.join(scratch, "theme_stats.json"),
+            "PREWARM_ENABLED": "false",
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        })
+        try:
+            fake = start_fake_scenario(fake_port, fake_args)
+            results = asyncio.run(_run(args, fake_port))
+        finally:
+            stop(fake)
+
+    print()
+    print_table(results, COLUMNS)
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, ("size", "workers", "concurrency"), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Broadcast benchmark for the live bingo rooms (/ws/rooms/{id}).
+
+Starts the backend under uvicorn and, for each --clients level, connects
+that many WebSocket players to one fresh room, spread over --client-procs
+processes so the clients do not starve each other. Each client listens for
+--calls ball calls and records the delay between the server stamping a call
+and the client receiving it. Reports latency percentiles, connections the
+server dropped as too slow, and the CPU time and peak RSS of the backend.
+
+    python -m bench.rooms --clients 100,1000,5000 --calls 20 --call-interval 0.5
+    python -m bench.rooms --clients 2000 --slow 0.05 --cards 0.5 --output rooms.json
+
+--slow makes that fraction of clients stop reading, to exercise the
+slow-consumer path; --cards makes that fraction play a card (the first win
+ends a game, so expect game_over/new_game cycles). Needs the `websockets`
+package on both ends.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from bench.common import (
+    BACKEND_DIR, compare_baseline, cpu_seconds, free_port, peak_rss_mb, print_table, reset_peak_rss, stop, summarize,
+    wait_ready, write_results,
+)
+from game.engine import generate_card
+from game.rooms import CLOSE_TOO_SLOW
+
+COLUMNS = ("clients", "connected", "calls", "p50", "p95", "p99", "max", "dropped", "failed", "cpu_seconds", "peak_rss_mb")
+
+
+async def _client(url: str, calls: int, slow: bool, card: bool, deadline: float, latencies: List[float], counts: Dict[str, int]) -> None:
+    import websockets
+
+    ws = None
+    try:
+        # A tiny client-side buffer makes a client that stops reading push back on the server sooner
+        async with websockets.connect(url, max_queue=1 if slow else 64, open_timeout=60) as ws:
+            counts["connected"] += 1
+            if card:
+                await ws.send(json.dumps({"type": "card", "numbers": generate_card()}))
+            if slow:
+                await asyncio.wait_for(ws.wait_closed(), timeout=max(0.1, deadline - time.time()))
+                return
+            seen = 0
+            while seen < calls and time.time() < deadline:
+                message = json.loads(await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.time())))
+                if message.get("type") == "call":
+                    latencies.append(time.time() - message["ts"])
+                    seen += 1
+                elif message.get("type") == "new_game" and card:
+                    await ws.send(json.dumps({"type": "card", "numbers": generate_card()}))
+    except asyncio.TimeoutError:
+        pass
+    except Exception:
+        if ws is None or ws.close_code != CLOSE_TOO_SLOW:
+            counts["failed"] += 1
+    finally:
+        if ws is not None and ws.close_code == CLOSE_TOO_SLOW:
+            counts["dropped"] += 1
+
+
+async def _clients(base_url: str, count: int, offset: int, args: argparse.Namespace, deadline: float) -> Tuple[List[float], Dict[str, int]]:
+    latencies: List[float] = []
+    counts = {"connected": 0, "dropped": 0, "failed": 0}
+    rng = random.Random(offset)
+    tasks = []
+    for i in range(count):
+        player = f"p{offset + i}"
+        tasks.append(asyncio.create_task(_client(
+            f"{base_url}?player={player}", args.calls, rng.random() < args.slow, rng.random() < args.cards, deadline, latencies, counts,
+        )))
+        if i % 100 == 99:
+            # Stagger connects so the accept queue does not overflow
+            await asyncio.sleep(0.05)
+    await asyncio.gather(*tasks)
+    return latencies, counts
+
+
+def _client_process(base_url: str, count: int, offset: int, args: argparse.Namespace, deadline: float) -> Tuple[List[float], Dict[str, int]]:
+    return asyncio.run(_clients(base_url, count, offset, args, deadline))
+
+
+def run_benchmarks(args: argparse.Namespace) -> List[Dict[str, object]]:
+    port = free_port()
+    backend = None
+    results: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="orbella-rooms-") as scratch:
+        env = dict(os.environ)
+        env.update({
+            "CACHE_DIR": os.path.join(scratch, "results"),
+            "CLAIM_DIR": os.path.join(scratch, "claims"),
+            "ASSET_DIR": os.path.join(scratch, "assets"),
+            "PREWARM_STATS_PATH": os.path.join(scratch, "theme_stats.json"),
+            "PREWARM_ENABLED": "false",
+            # Rooms only: keep image pool workers out of the CPU and RSS columns
+            "IMAGE_WORKERS": "0",
+            "ROOM_CALL_INTERVAL": str(args.call_interval),
+            "ROOM_INTERMISSION": str(args.call_interval),
+            "LOG_LEVEL": "WARNING",
+        })
+        for item in args.env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        try:
+            backend = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--ws", "websockets", "--log-level", "warning", "--backlog", "4096"],
+                cwd=BACKEND_DIR,
+                env=env,
+            )
+            wait_ready(f"http://127.0.0.1:{port}/healthz", backend)
+            run_id = uuid.uuid4().hex[:8]
+            for clients in args.clients:
+                base_url = f"ws://127.0.0.1:{port}/ws/rooms/bench-{run_id}-{clients}"
+                procs = max(1, min(args.client_procs, clients))
+                # Connecting takes a while at high counts; leave room for that on top of the calls themselves
+                deadline = time.time() + clients / 500 + args.calls * args.call_interval * 3 + 30
+                reset_peak_rss(backend.pid)
+                cpu_before = cpu_seconds(backend.pid)
+                latencies: List[float] = []
+                counts = {"connected": 0, "dropped": 0, "failed": 0}
+                with ProcessPoolExecutor(max_workers=procs) as pool:
+                    shares = [clients // procs + (1 if i < clients % procs else 0) for i in range(procs)]
+                    offsets = [sum(shares[:i]) for i in range(procs)]
+                    futures = [pool.submit(_client_process, base_url, n, off, args, deadline) for n, off in zip(shares, offsets)]
+                    for future in futures:
+                        lat, cnt = future.result()
+                        latencies.extend(lat)
+                        for key in counts:
+                            counts[key] += cnt[key]
+                cpu_after = cpu_seconds(backend.pid)
+                row = {
+                    "clients": clients,
+                    "connected": counts["connected"],
+                    "calls": len(latencies),
+                    **summarize(latencies),
+                    "max": max(latencies) if latencies else 0.0,
+                    "dropped": counts["dropped"],
+                    "failed": counts["failed"],
+                    "cpu_seconds": cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+                    "peak_rss_mb": peak_rss_mb(backend.pid),
+                }
+                results.append(row)
+                print_table([row], COLUMNS)
+        finally:
+            stop(backend)
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure ball-call broadcast latency to many WebSocket players")
+    parser.add_argument("--clients", default="100,1000", help="comma-separated connection counts (default: %(default)s)")
+    parser.add_argument("--calls", type=int, default=20, help="ball calls each client waits for (default: %(default)s)")
+    parser.add_argument("--call-interval", type=float, default=0.5, help="ROOM_CALL_INTERVAL for the run (default: %(default)s)")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="client processes (default: %(default)s)")
+    parser.add_argument("--slow", type=float, default=0.0, help="fraction of clients that stop reading")
+    parser.add_argument("--cards", type=float, default=0.0, help="fraction of clients that play a card")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra backend setting, e.g. ROOM_SEND_QUEUE=64")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="previous --output file; exit 1 on regressions beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression (default: %(default)s)")
+    args = parser.parse_args()
+    args.clients = [int(c) for c in args.clients.split(",") if c.strip()]
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+    results = run_benchmarks(args)
+    print()
+    print_table(results, COLUMNS)
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, ("clients",), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
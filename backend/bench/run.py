@@ -0,0 +1,184 @@
+"""
+End-to-end load benchmark: drives main.app against the fake Scenario API.
+
+Starts bench/fake_scenario.py and the backend (uvicorn main:app, with its
+caches in a throwaway directory) as separate processes, then sends each
+endpoint `--requests` requests at every `--concurrency` level and reports
+p50/p95/p99 latency, throughput, and the CPU time and peak RSS of the
+backend process tree (including image pool workers) per run.
+
+    python -m bench.run --endpoints card,room --concurrency 1,8,32 --requests 64
+    python -m bench.run --cached --output bench.json
+    python -m bench.run --baseline bench.json -- --image-seconds 1 --throttle-rate 0.05
+
+Arguments after `--` (or any this script does not know) go to the fake
+server. Every request uses a fresh theme unless --cached is given, in which
+case one theme is generated up front and the runs measure cache hits.
+Requires Linux /proc for the CPU and RSS columns.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+
+from bench.common import (
+    BACKEND_DIR, compare_baseline, cpu_seconds, free_port, peak_rss_mb, print_table, reset_peak_rss,
+    start_fake_scenario, stop, summarize, wait_ready, write_results,
+)
+
+ENDPOINTS = {
+    "video": "/scenario/generate",
+    "card": "/scenario/generate-card",
+    "ball-caller": "/scenario/generate-ball-caller",
+    "room": "/scenario/generate-room",
+}
+
+COLUMNS = ("endpoint", "concurrency", "requests", "ok", "errors", "p50", "p95", "p99", "throughput", "cpu_seconds", "peak_rss_mb")
+
+
+def backend_env(api_base: str, scratch: str, overrides: List[str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "SCENARIO_API_BASE": api_base,
+        "SCENARIO_ID": "bench",
+        "SCENARIO_SECRET": "bench",
+        "CACHE_DIR": os.path.join(scratch, "results"),
+        "CLAIM_DIR": os.path.join(scratch, "claims"),
+        "ASSET_DIR": os.path.join(scratch, "assets"),
+        "VIDEO_DOWNLOAD_DIR": os.path.join(scratch, "downloads"),
+        "PREWARM_STATS_PATH": os.path.join(scratch, "theme_stats.json"),
+        "PREWARM_ENABLED": "false",
+        # Measure the backend, not the production request-rate quota
+        "UPSTREAM_RATE": "0",
+        "LOG_LEVEL": "WARNING",
+    })
+    for item in overrides:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def _load(url: str, concurrency: int, requests: int, theme_for, timeout: float) -> Tuple[List[float], int, float]:
+    """Send `requests` POSTs with at most `concurrency` in flight; returns (ok latencies, errors, wall seconds)."""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal next_index, errors
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                resp = await client.post(url, json={"theme": theme_for(index)})
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+def run_benchmarks(args: argparse.Namespace, fake_args: List[str]) -> List[Dict[str, object]]:
+    fake_port, backend_port = free_port(), free_port()
+    fake = backend = None
+    results: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="orbella-bench-") as scratch:
+        try:
+            fake = start_fake_scenario(fake_port, fake_args)
+            backend = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(backend_port), "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=backend_env(f"http://127.0.0.1:{fake_port}/v1", scratch, args.env),
+            )
+            base_url = f"http://127.0.0.1:{backend_port}"
+            wait_ready(f"{base_url}/", backend)
+
+            run_id = uuid.uuid4().hex[:8]
+            for name in args.endpoints:
+                url = base_url + ENDPOINTS[name]
+                if args.cached:
+                    theme = f"bench {name} {run_id}"
+                    # Fill the cache first so every measured request is a hit
+                    httpx.post(url, json={"theme": theme}, timeout=args.timeout).raise_for_status()
+                    theme_for = lambda i, theme=theme: theme
+                for concurrency in args.concurrency:
+                    if not args.cached:
+                        theme_for = lambda i, prefix=f"bench {name} {run_id} c{concurrency}": f"{prefix} {i}"
+                    reset_peak_rss(backend.pid)
+                    cpu_before = cpu_seconds(backend.pid)
+                    latencies, errors, wall = asyncio.run(_load(url, concurrency, args.requests, theme_for, args.timeout))
+                    cpu_after = cpu_seconds(backend.pid)
+                    row = {
+                        "endpoint": name,
+                        "concurrency": concurrency,
+                        "requests": args.requests,
+                        "ok": len(latencies),
+                        "errors": errors,
+                        **summarize(latencies),
+                        "throughput": len(latencies) / wall if wall > 0 else 0.0,
+                        "cpu_seconds": cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None,
+                        "peak_rss_mb": peak_rss_mb(backend.pid),
+                    }
+                    results.append(row)
+                    print_table([row], COLUMNS)
+            print("\nFake Scenario traffic:", httpx.get(f"http://127.0.0.1:{fake_port}/stats").json()["requests"])
+        finally:
+            stop(backend)
+            stop(fake)
+    return results
+
+
+def parse_args() -> Tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(description="Load-test the backend against a local fake Scenario API")
+    parser.add_argument("--endpoints", default="card,ball-caller,video,room", help=f"comma-separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=32, help="requests per endpoint and concurrency level (default: %(default)s)")
+    parser.add_argument("--cached", action="store_true", help="measure cache hits instead of fresh generations")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (default: %(default)s)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra backend setting, e.g. IMAGE_WORKERS=4")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-request timeout in seconds (default: %(default)s)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="previous --output file; exit 1 on regressions beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression (default: %(default)s)")
+    args, fake_args = parser.parse_known_args()
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in args.endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    return args, [a for a in fake_args if a != "--"]
+
+
+def main() -> int:
+    args, fake_args = parse_args()
+    results = run_benchmarks(args, fake_args)
+    print()
+    print_table(results, COLUMNS)
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, ("endpoint", "concurrency"), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Content-addressed cache for generated theme assets.
+
+Two tiers:
+- an in-memory LRU bounded by the approximate byte size of its entries
+- a persistent disk store (one directory per key) holding the result JSON
+
+Processed images and transcoded videos are not copied into the cache: they
+already live in the content-addressed AssetStore, and results point at them
+with /images/<id> and /assets/<name> URLs. When an entry is read back from
+disk (typically after a restart) every local asset it references must still
+be in the store, otherwise the entry is dropped and the theme regenerated
+instead of handing out dead links.
+
+Entries expire after a per-entry TTL and can be invalidated by key or wiped.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from media.encode import IMAGE_URL_PREFIX
+from media.store import ASSET_URL_PREFIX, AssetStore
+
+
+def cache_key(**parts: Any) -> str:
+    """Hash the rendered prompt and generation parameters into a stable key."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        root: str,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        default_ttl: float = 7 * 24 * 3600,
+        assets: Optional[AssetStore] = None,
+    ):
+        self.root = root
+        # Store the results' /images and /assets URLs point into; None skips the check on disk reads
+        self.assets = assets
+        self.max_memory_bytes = max_memory_bytes
+        self.default_ttl = default_ttl
+        self._memory: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- public API ---
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                entry, _ = hit
+                if not self._expired(entry):
+                    self._memory.move_to_end(key)
+                    return entry["result"]
+                self._drop_memory(key)
+
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+        if self._expired(entry) or not self._assets_present(entry["result"]):
+            self.invalidate(key)
+            return None
+        with self._lock:
+            self._store_memory(key, entry)
+        return entry["result"]
+
+    def put(self, key: str, result: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        entry = {
+            "created_at": time.time(),
+            "ttl": self.default_ttl if ttl is None else ttl,
+            "result": result,
+        }
+        self._write_disk(key, entry)
+        with self._lock:
+            self._store_memory(key, entry)
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            in_memory = self._drop_memory(key)
+        entry_dir = self._entry_dir(key)
+        on_disk = os.path.isdir(entry_dir)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return in_memory or on_disk
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+            }
+
+    # --- memory tier ---
+
+    @staticmethod
+    def _expired(entry: Dict[str, Any]) -> bool:
+        ttl = entry.get("ttl")
+        return bool(ttl) and time.time() - entry.get("created_at", 0) > ttl
+
+    def _store_memory(self, key: str, entry: Dict[str, Any]) -> None:
+        size = len(json.dumps(entry["result"], default=str))
+        if size > self.max_memory_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (entry, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _drop_memory(self, key: str) -> bool:
+        hit = self._memory.pop(key, None)
+        if hit is None:
+            return False
+        self._memory_bytes -= hit[1]
+        return True
+
+    # --- disk tier ---
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "entry.json"), "w") as f:
+            json.dump(entry, f)
+        # Swap the finished directory into place so readers never see a partial entry
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._entry_dir(key), "entry.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _assets_present(self, result: Any) -> bool:
+        if self.assets is None:
+            return True
+        return all(self.assets.path(name) is not None for name in _local_assets(result))
+
+
+def _local_assets(value: Any) -> Iterator[str]:
+    """Asset store names behind the /images and /assets URLs anywhere in a result."""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _local_assets(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _local_assets(item)
+    elif isinstance(value, str):
+        path = value.split("?", 1)[0]
+        if path.startswith(IMAGE_URL_PREFIX):
+            # An /images URL names the manifest listing its encoded variants
+            yield path[len(IMAGE_URL_PREFIX):] + ".json"
+        elif path.startswith(ASSET_URL_PREFIX):
+            yield path[len(ASSET_URL_PREFIX):]
@@ -0,0 +1,260 @@
+"""
+Streaming, size-limited downloads of upstream assets.
+
+Responses are checked (status, Content-Type, Content-Length) before any body
+is read, then streamed in large chunks either into a SpooledTemporaryFile,
+which stays in memory up to `spool_bytes` and rolls over to disk after that,
+or straight into a file on disk. Bodies larger than `max_bytes` are aborted
+as soon as the limit is crossed, so peak memory per download is bounded by
+`spool_bytes` plus one chunk no matter how large the upstream file is.
+
+fetch_ranged() splits large files into HTTP Range requests fetched in
+parallel, and records finished parts next to the partial file so an
+interrupted download resumes instead of starting over.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+IMAGE_CONTENT_TYPES = ("image/",)
+VIDEO_CONTENT_TYPES = ("video/", "application/octet-stream", "binary/octet-stream")
+
+
+class FetchError(Exception):
+    """Raised when an upstream asset cannot be downloaded or is rejected."""
+
+
+_CONTENT_RANGE_RE = re.compile(r"^bytes\s+\d+-\d+/(\d+)$")
+
+
+def _check_content_type(resp: httpx.Response, content_types: Sequence[str]) -> str:
+    content_type = (resp.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+    if content_types and not any(content_type.startswith(t) for t in content_types):
+        raise FetchError(f"unexpected content type '{content_type or 'none'}'")
+    return content_type
+
+
+def _check_size(size: int, max_bytes: int) -> None:
+    if max_bytes and size > max_bytes:
+        raise FetchError(f"asset is {size} bytes, limit is {max_bytes}")
+
+
+def _check_response(resp: httpx.Response, max_bytes: int, content_types: Sequence[str]) -> str:
+    if resp.status_code != 200:
+        raise FetchError(f"upstream returned {resp.status_code}")
+    content_type = _check_content_type(resp, content_types)
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        _check_size(int(length), max_bytes)
+    return content_type
+
+
+async def _copy_body(resp: httpx.Response, f, max_bytes: int, chunk_size: int) -> int:
+    size = 0
+    async for chunk in resp.aiter_bytes(chunk_size=chunk_size):
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise FetchError(f"asset exceeded the {max_bytes} byte limit")
+        f.write(chunk)
+    return size
+
+
+@asynccontextmanager
+async def fetch_spooled(
+    http: httpx.AsyncClient,
+    url: str,
+    max_bytes: int,
+    spool_bytes: int,
+    content_types: Sequence[str] = (),
+    auth=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[Tuple["tempfile.SpooledTemporaryFile", str]]:
+    """
+    Download url into a spooled temp file and yield (file, content_type) with
+    the file rewound; PIL can open the file object directly without a copy.
+    The file is closed (and deleted, if it rolled over) on exit.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        async with http.stream("GET", url, auth=auth, follow_redirects=True) as resp:
+            content_type = _check_response(resp, max_bytes, content_types)
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > spool_bytes:
+                # Known to be large: go to disk now rather than growing a buffer and copying it out
+                spool.rollover()
+            await _copy_body(resp, spool, max_bytes, chunk_size)
+        spool.seek(0)
+        yield spool, content_type
+    finally:
+        spool.close()
+
+
+async def fetch_to_file(
+    http: httpx.AsyncClient,
+    url: str,
+    path: str,
+    max_bytes: int,
+    content_types: Sequence[str] = (),
+    auth=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> str:
+    """
+    Stream url into path (written to a temp file, then renamed into place)
+    and return the response content type.
+    """
+    async with http.stream("GET", url, auth=auth, follow_redirects=True) as resp:
+        content_type = _check_response(resp, max_bytes, content_types)
+        await _write_body(resp, path, max_bytes, chunk_size)
+    return content_type
+
+
+async def _write_body(resp: httpx.Response, path: str, max_bytes: int, chunk_size: int) -> None:
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            await _copy_body(resp, f, max_bytes, chunk_size)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _load_progress(state_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_progress(state_path: str, state: Dict[str, Any]) -> None:
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+async def fetch_ranged(
+    http: httpx.AsyncClient,
+    url: str,
+    path: str,
+    max_bytes: int,
+    content_types: Sequence[str] = (),
+    auth=None,
+    part_size: int = DEFAULT_PART_SIZE,
+    concurrency: int = 4,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> str:
+    """
+    Download url into path with up to `concurrency` parallel Range requests
+    and return the content type. Parts are written in place into
+    `path + ".part"` and listed in `path + ".part.json"` as they complete;
+    a later call for the same path skips them if the upstream size and
+    validator (ETag or Last-Modified) still match. Servers that ignore Range
+    get a plain single-stream download.
+    """
+    partial_path = path + ".part"
+    state_path = partial_path + ".json"
+
+    # Probe with a one-byte range: learns the size, range support and the post-redirect URL
+    async with http.stream("GET", url, auth=auth, follow_redirects=True, headers={"Range": "bytes=0-0"}) as probe:
+        if probe.status_code == 200:
+            content_type = _check_response(probe, max_bytes, content_types)
+            await _write_body(probe, path, max_bytes, chunk_size)
+            return content_type
+        if probe.status_code != 206:
+            raise FetchError(f"upstream returned {probe.status_code}")
+        content_type = _check_content_type(probe, content_types)
+        match = _CONTENT_RANGE_RE.match(probe.headers.get("Content-Range") or "")
+        if not match:
+            raise FetchError("upstream sent a Range response without a total size")
+        size = int(match.group(1))
+        _check_size(size, max_bytes)
+        validator = probe.headers.get("ETag") or probe.headers.get("Last-Modified") or ""
+        final_url = probe.url
+
+    # Signed redirect targets carry their own credentials
+    part_auth = auth if final_url == httpx.URL(url) else None
+    parts = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+    state = _load_progress(state_path)
+    if (
+        state is None
+        or state.get("size") != size
+        or state.get("validator") != validator
+        or state.get("part_size") != part_size
+        or not os.path.isfile(partial_path)
+        or os.path.getsize(partial_path) != size
+    ):
+        state = {"size": size, "validator": validator, "part_size": part_size, "done": []}
+        with open(partial_path, "wb") as f:
+            f.truncate(size)
+        _save_progress(state_path, state)
+    done = set(state["done"])
+    remaining = [i for i in range(len(parts)) if i not in done]
+    if len(remaining) < len(parts):
+        logger.info(f"Resuming download: {len(parts) - len(remaining)}/{len(parts)} parts already on disk")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    fd = os.open(partial_path, os.O_WRONLY)
+
+    async def fetch_part(index: int) -> None:
+        start, end = parts[index]
+        async with semaphore:
+            headers = {"Range": f"bytes={start}-{end}"}
+            async with http.stream("GET", final_url, auth=part_auth, headers=headers) as resp:
+                if resp.status_code != 206:
+                    raise FetchError(f"range request returned {resp.status_code}")
+                offset = start
+                async for chunk in resp.aiter_bytes(chunk_size=chunk_size):
+                    if offset + len(chunk) > end + 1:
+                        raise FetchError("upstream sent more bytes than requested")
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                if offset != end + 1:
+                    raise FetchError(f"range {start}-{end} ended early at {offset}")
+        done.add(index)
+        state["done"] = sorted(done)
+        _save_progress(state_path, state)
+
+    tasks = [asyncio.ensure_future(fetch_part(i)) for i in remaining]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        os.close(fd)
+
+    os.replace(partial_path, path)
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        pass
+    return content_type
+
+
+def spool_path(directory: Optional[str] = None, suffix: str = "") -> str:
+    """Reserve a temp file path for a download that another process will read."""
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    return path
@@ -0,0 +1 @@
+"""Server-side bingo: card layout, ball draws and win detection for rooms."""
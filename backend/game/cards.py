@@ -0,0 +1,123 @@
+"""
+Batch card issue and claim audits, vectorized with NumPy.
+
+Cards are rows of a (n, 25) uint8 array in cell order (row * 5 + col), with
+0 on the FREE centre, the same layout game.engine uses for a single card.
+
+generate_cards() samples every column of every card at once: each column
+takes the first five entries of a random permutation of its fifteen numbers,
+which is sampling without replacement with no rejection loop. A seed makes a
+batch reproducible, so a tournament can re-derive its cards from the seed
+instead of storing them. With unique=True any repeated card is redrawn until
+the batch has no duplicates.
+
+audit_claims() works out, for every card at once, the call at which each win
+line was completed given the order the numbers were called in, so a whole
+round of claims is checked without looping over cards.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from game.engine import CELLS, COLUMN_RANGES, FREE_CELL, MAX_NUMBER, WIN_LINES
+
+# Lowest/highest number allowed in each cell, following the column ranges
+_CELL_LOW = np.array([COLUMN_RANGES[cell % 5][0] for cell in range(CELLS)], dtype=np.int16)
+_CELL_HIGH = np.array([COLUMN_RANGES[cell % 5][1] for cell in range(CELLS)], dtype=np.int16)
+# (12, 5) cell indexes of each win line, in WIN_LINES order
+_LINE_CELLS = np.array([indices for _type, _name, _mask, indices in WIN_LINES], dtype=np.intp)
+LINE_NAMES = [name for _type, name, _mask, _indices in WIN_LINES]
+
+NOT_WON = -1
+
+
+def _draw(rng: np.random.Generator, count: int) -> np.ndarray:
+    # Random keys argsorted per (card, column) give independent permutations of 0-14
+    picks = rng.random((count, 5, 15)).argsort(axis=2)[:, :, :5]
+    lows = np.array([low for low, _high in COLUMN_RANGES], dtype=np.uint8)
+    # (count, column, row) -> (count, row, column), i.e. cell order row * 5 + col
+    cards = (picks.astype(np.uint8) + lows[None, :, None]).transpose(0, 2, 1).reshape(count, CELLS)
+    cards[:, FREE_CELL] = 0
+    return np.ascontiguousarray(cards)
+
+
+def _duplicate_rows(cards: np.ndarray) -> np.ndarray:
+    """Indexes of rows that repeat an earlier row."""
+    keys = cards.view(np.dtype((np.void, cards.shape[1])))[:, 0]
+    _, first = np.unique(keys, return_index=True)
+    repeated = np.ones(len(cards), dtype=bool)
+    repeated[first] = False
+    return np.flatnonzero(repeated)
+
+
+def generate_cards(count: int, seed: Optional[int] = None, unique: bool = False) -> np.ndarray:
+    """A (count, 25) uint8 array of cards; the same seed always gives the same batch."""
+    rng = np.random.default_rng(seed)
+    cards = _draw(rng, count)
+    if unique:
+        repeated = _duplicate_rows(cards)
+        while len(repeated):
+            cards[repeated] = _draw(rng, len(repeated))
+            repeated = _duplicate_rows(cards)
+    return cards
+
+
+def as_cards(rows: Sequence[Sequence[int]]) -> np.ndarray:
+    """Card lists from a request as a (n, 25) array; ValueError if they are not all 25 small integers."""
+    if not len(rows):
+        return np.zeros((0, CELLS), dtype=np.int16)
+    try:
+        cards = np.array(rows, dtype=np.int16)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Cards must be lists of {CELLS} numbers") from None
+    if cards.ndim != 2 or cards.shape[1] != CELLS:
+        raise ValueError(f"Cards must be lists of {CELLS} numbers")
+    return cards
+
+
+def line_bits(lines: np.ndarray) -> List[int]:
+    """Per-card bitsets of complete lines: bit n stands for LINE_NAMES[n]."""
+    return (lines.astype(np.int64) << np.arange(len(WIN_LINES), dtype=np.int64)).sum(axis=1).tolist()
+
+
+def validate_cards(cards: np.ndarray) -> List[int]:
+    """Indexes of cards that break the column ranges, repeat a number or fill the FREE centre."""
+    if cards.ndim != 2 or cards.shape[1] != CELLS:
+        raise ValueError(f"Cards must be lists of {CELLS} cells")
+    values = cards.astype(np.int16)
+    in_range = (values >= _CELL_LOW) & (values <= _CELL_HIGH)
+    in_range[:, FREE_CELL] = values[:, FREE_CELL] == 0
+    # Column ranges do not overlap, so a repeat can only be within a column; sorted rows make it adjacent
+    ordered = np.sort(values, axis=1)
+    repeats = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] != 0)).any(axis=1)
+    return np.flatnonzero(~in_range.all(axis=1) | repeats).tolist()
+
+
+def audit_claims(cards: np.ndarray, called: Sequence[int], claimed_at: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Check bingo claims for a batch of cards against the called sequence.
+
+    claimed_at[i] is how many numbers had been called when card i claimed
+    (default: all of them; ValueError outside 0..len(called)). Returns (valid, won_at, lines):
+    - valid: bool per card, a line was complete at claim time
+    - won_at: 1-based call count at which the card first completed a line, or NOT_WON
+    - lines: (n, 12) bool, which WIN_LINES were complete at claim time
+    """
+    called = np.asarray(called, dtype=np.intp)
+    # Position in the call order of every number; the FREE centre (0) counts from the start.
+    # Cards must have passed validate_cards(), so every value indexes into this table
+    position = np.full(MAX_NUMBER + 1, np.iinfo(np.int32).max, dtype=np.int64)
+    position[called] = np.arange(1, len(called) + 1)
+    position[0] = 0
+    # A line is complete once the last of its five cells has been called
+    line_done_at = position[cards.astype(np.intp)][:, _LINE_CELLS].max(axis=2)
+    first_win = line_done_at.min(axis=1)
+    if claimed_at is None:
+        limit = np.full(len(cards), len(called), dtype=np.int64)
+    else:
+        limit = np.asarray(claimed_at, dtype=np.int64)
+        if limit.shape != (len(cards),) or ((limit < 0) | (limit > len(called))).any():
+            raise ValueError(f"claimed_at needs one count from 0 to {len(called)} per card")
+    lines = line_done_at <= limit[:, None]
+    won_at = np.where(first_win <= len(called), first_win, NOT_WON)
+    return lines.any(axis=1), won_at, lines
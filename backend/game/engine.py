@@ -0,0 +1,284 @@
+"""
+75-ball bingo rules, refereed with bitmasks.
+
+Same game as frontend/game.js: a 5x5 card whose columns B, I, N, G, O hold
+five distinct numbers from 1-15, 16-30, 31-45, 46-60 and 61-75, a FREE
+centre square, and the twelve win lines checkBingo() looks for (five rows,
+five columns, both diagonals). Cells are numbered row * 5 + col as in the
+frontend, and a card's marks are a 25-bit int with bit i set when cell i is
+covered.
+
+BingoEngine keeps the marks of every card in one NumPy array and, for every
+number, the cards holding it grouped by row (a number's column is fixed).
+A call therefore touches only the cards holding that number, and for those
+only the two to four lines through the marked cell are compared against the
+mask, as a handful of vectorized bit operations per row.
+"""
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COLUMNS = "BINGO"
+COLUMN_RANGES = ((1, 15), (16, 30), (31, 45), (46, 60), (61, 75))
+MAX_NUMBER = 75
+CELLS = 25
+FREE_CELL = 12
+FREE_MASK = 1 << FREE_CELL
+
+
+def _line(indices: Sequence[int]) -> int:
+    mask = 0
+    for index in indices:
+        mask |= 1 << index
+    return mask
+
+
+# (type, name, mask, indices) in the order checkBingo() reports them
+WIN_LINES: List[Tuple[str, str, int, Tuple[int, ...]]] = (
+    [("row", f"Row {row + 1}", _line(range(row * 5, row * 5 + 5)), tuple(range(row * 5, row * 5 + 5))) for row in range(5)]
+    + [("column", f"Column {COLUMNS[col]}", _line(range(col, CELLS, 5)), tuple(range(col, CELLS, 5))) for col in range(5)]
+    + [
+        ("diagonal", "Diagonal \\", _line(i * 6 for i in range(5)), tuple(i * 6 for i in range(5))),
+        ("diagonal", "Diagonal /", _line(i * 4 + 4 for i in range(5)), tuple(i * 4 + 4 for i in range(5))),
+    ]
+)
+
+# For each cell, the (line number, line mask) pairs passing through it
+LINES_BY_CELL: List[Tuple[Tuple[int, int], ...]] = [
+    tuple((n, mask) for n, (_type, _name, mask, indices) in enumerate(WIN_LINES) if cell in indices)
+    for cell in range(CELLS)
+]
+
+# Bitset of WIN_LINES indexes -> the indexes it contains
+_LINES_IN: List[Tuple[int, ...]] = [tuple(n for n in range(len(WIN_LINES)) if bits >> n & 1) for bits in range(1 << len(WIN_LINES))]
+
+
+def letter_for(number: int) -> str:
+    """B, I, N, G or O for a ball number; empty for anything outside 1-75."""
+    if 1 <= number <= MAX_NUMBER:
+        return COLUMNS[(number - 1) // 15]
+    return ""
+
+
+def generate_card(rng: Optional[random.Random] = None) -> List[int]:
+    """A random card as 25 numbers in cell order, with 0 on the FREE centre."""
+    rng = rng or random
+    card = [0] * CELLS
+    for col, (low, high) in enumerate(COLUMN_RANGES):
+        for row, number in enumerate(rng.sample(range(low, high + 1), 5)):
+            card[row * 5 + col] = number
+    card[FREE_CELL] = 0
+    return card
+
+
+def _is_int(value: object) -> bool:
+    # bool is an int subclass: True would otherwise pass as a B-column 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_card(card: Sequence[int]) -> List[int]:
+    """Check a card follows the column ranges; returns it as a list or raises ValueError."""
+    card = list(card)
+    if len(card) != CELLS:
+        raise ValueError(f"A card has {CELLS} cells, got {len(card)}")
+    for cell, number in enumerate(card):
+        if cell == FREE_CELL:
+            # 0 == False == 0.0, so check the type too
+            if number is not None and (not _is_int(number) or number != 0):
+                raise ValueError("The centre cell is FREE")
+            continue
+        low, high = COLUMN_RANGES[cell % 5]
+        if not _is_int(number) or not low <= number <= high:
+            raise ValueError(f"Cell {cell} must hold a number from {low} to {high}, got {number!r}")
+    numbers = [n for cell, n in enumerate(card) if cell != FREE_CELL]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError("A card cannot repeat a number")
+    card[FREE_CELL] = 0
+    return card
+
+
+def winning_lines(marks: int) -> List[Dict[str, object]]:
+    """The win lines covered by a marks mask, shaped like checkBingo()'s patterns."""
+    return [
+        {"type": line_type, "name": name, "indices": list(indices)}
+        for line_type, name, mask, indices in WIN_LINES
+        if marks & mask == mask
+    ]
+
+
+def marks_for(card: Sequence[int], called: Sequence[int]) -> int:
+    """Marks mask for a card given the numbers called so far (the FREE centre always counts)."""
+    called_set = set(called)
+    marks = FREE_MASK
+    for cell, number in enumerate(card):
+        if number in called_set:
+            marks |= 1 << cell
+    return marks
+
+
+def _line_info(n: int) -> Dict[str, object]:
+    line_type, name, _mask, indices = WIN_LINES[n]
+    return {"type": line_type, "name": name, "indices": list(indices)}
+
+
+class Win:
+    """A card completing one or more lines on a call."""
+
+    __slots__ = ("card_id", "lines")
+
+    def __init__(self, card_id: str, lines: Sequence[int]):
+        self.card_id = card_id
+        # Indexes into WIN_LINES
+        self.lines = lines
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "card_id": self.card_id,
+            "lines": [_line_info(n) for n in self.lines],
+        }
+
+
+class BingoEngine:
+    """
+    Referee for one room: owns the draw order and the marks of every card.
+
+    call() draws the next ball (or takes a given one), marks it on every card
+    holding it and returns the wins it completed. Wins are reported once per
+    line; a card that later completes a second line is reported again with
+    just the new line.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.called: List[int] = []
+        self._remaining = list(range(1, MAX_NUMBER + 1))
+        # Per-slot arrays; a removed card keeps its slot but leaves the index
+        self._ids: List[Optional[str]] = []
+        self._cards: List[List[int]] = []
+        self._marks = np.zeros(64, dtype=np.uint32)
+        # Bitset of WIN_LINES indexes already reported for the card
+        self._won = np.zeros(64, dtype=np.uint16)
+        # Bitset of WIN_LINES indexes already complete when the card was registered; they never count
+        self._preset = np.zeros(64, dtype=np.uint16)
+        self._slots: Dict[str, int] = {}
+        # (number, row) -> slots holding the number in that row; the column is fixed by the number
+        self._index: List[List[List[int]]] = [[[] for _ in range(5)] for _ in range(MAX_NUMBER + 1)]
+        self._arrays: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, card_id: str) -> bool:
+        return card_id in self._slots
+
+    @property
+    def finished(self) -> bool:
+        return not self._remaining
+
+    def add_card(self, card_id: str, card: Sequence[int]) -> None:
+        """Register a card; numbers already called are marked straight away."""
+        if card_id in self._slots:
+            raise ValueError(f"Card {card_id} is already in play")
+        card = validate_card(card)
+        slot = len(self._ids)
+        if slot == len(self._marks):
+            self._marks = np.concatenate([self._marks, np.zeros_like(self._marks)])
+            self._won = np.concatenate([self._won, np.zeros_like(self._won)])
+            self._preset = np.concatenate([self._preset, np.zeros_like(self._preset)])
+        self._ids.append(card_id)
+        self._cards.append(card)
+        marks = marks_for(card, self.called)
+        self._marks[slot] = marks
+        # Lines already complete at join time are not announced as wins, nor accepted as claims
+        self._won[slot] = self._preset[slot] = self._completed(marks)
+        self._slots[card_id] = slot
+        for cell, number in enumerate(card):
+            if cell != FREE_CELL:
+                self._index[number][cell // 5].append(slot)
+                self._arrays.pop((number, cell // 5), None)
+
+    def remove_card(self, card_id: str) -> None:
+        slot = self._slots.pop(card_id)
+        self._ids[slot] = None
+        for cell, number in enumerate(self._cards[slot]):
+            if cell != FREE_CELL:
+                self._index[number][cell // 5].remove(slot)
+                self._arrays.pop((number, cell // 5), None)
+
+    def card(self, card_id: str) -> List[int]:
+        return list(self._cards[self._slots[card_id]])
+
+    def marks(self, card_id: str) -> int:
+        return int(self._marks[self._slots[card_id]])
+
+    def winning_lines(self, card_id: str) -> List[Dict[str, object]]:
+        """Lines the card completed after it was registered, shaped like checkBingo()'s patterns."""
+        return [_line_info(n) for n in _LINES_IN[self._claimable(card_id)]]
+
+    def verify(self, card_id: str) -> bool:
+        """Whether a player's bingo claim holds: a line was completed by a call made after the card joined."""
+        return self._claimable(card_id) != 0
+
+    def _claimable(self, card_id: str) -> int:
+        slot = self._slots[card_id]
+        return self._completed(int(self._marks[slot])) & ~int(self._preset[slot])
+
+    def call(self, number: Optional[int] = None) -> Tuple[Optional[int], List[Win]]:
+        """
+        Draw the next ball (or call `number`) and return (number, new wins).
+        Returns (None, []) once all 75 balls are out.
+        """
+        if not self._remaining:
+            return None, []
+        if number is None:
+            # Swap-remove keeps the draw O(1)
+            i = self.rng.randrange(len(self._remaining))
+            self._remaining[i], self._remaining[-1] = self._remaining[-1], self._remaining[i]
+            number = self._remaining.pop()
+        else:
+            if not 1 <= number <= MAX_NUMBER:
+                raise ValueError(f"Ball numbers run from 1 to {MAX_NUMBER}, got {number}")
+            try:
+                self._remaining.remove(number)
+            except ValueError:
+                raise ValueError(f"{number} has already been called") from None
+        self.called.append(number)
+
+        wins: List[Win] = []
+        col = (number - 1) // 15
+        for row in range(5):
+            slots = self._slot_array(number, row)
+            if not len(slots):
+                continue
+            cell = row * 5 + col
+            marks = self._marks[slots] | np.uint32(1 << cell)
+            self._marks[slots] = marks
+            # Only the lines through this cell can have been completed by it
+            done = np.zeros(len(slots), dtype=np.uint16)
+            for line, mask in LINES_BY_CELL[cell]:
+                done |= ((marks & np.uint32(mask)) == mask).astype(np.uint16) << np.uint16(line)
+            new = done & ~self._won[slots]
+            hits = np.flatnonzero(new)
+            if not len(hits):
+                continue
+            self._won[slots[hits]] |= new[hits]
+            ids = self._ids
+            wins.extend(Win(ids[slot], _LINES_IN[lines]) for slot, lines in zip(slots[hits].tolist(), new[hits].tolist()))
+        return number, wins
+
+    def _slot_array(self, number: int, row: int) -> np.ndarray:
+        key = (number, row)
+        slots = self._arrays.get(key)
+        if slots is None:
+            slots = self._arrays[key] = np.array(self._index[number][row], dtype=np.intp)
+        return slots
+
+    @staticmethod
+    def _completed(marks: int) -> int:
+        """Bitset of WIN_LINES indexes fully covered by marks."""
+        done = 0
+        for n, (_type, _name, mask, _indices) in enumerate(WIN_LINES):
+            if marks & mask == mask:
+                done |= 1 << n
+        return done
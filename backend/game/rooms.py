@@ -0,0 +1,381 @@
+"""
+Live bingo rooms over WebSocket.
+
+A Room owns one draw sequence (a BingoEngine) and calls a ball every
+`call_interval` seconds while anyone is connected, so every player in the
+room sees the same numbers. Each event is encoded to JSON once per room and
+the same string is queued to every connection: fan-out costs a queue put per
+player, not a json.dumps per player.
+
+Every connection has a bounded send queue drained by its own writer task. A
+player whose queue fills up (a slow or stalled client) is disconnected
+instead of holding memory or delaying the others. Clients reconnect with
+?since=<last seq seen> and the room replays what they missed from a ring
+buffer of recent events, or sends a state snapshot if they fell further
+behind. A ping is sent after `heartbeat` seconds without traffic so proxies
+keep idle sockets open and dead ones are noticed.
+
+Players may register a card ({"type": "card", "numbers": [...25 cells]})
+under their ?player= id before the first ball of a game is drawn; cards are
+locked from then until the game ends. The engine marks it on every call; the
+first call that completes a line for any card ends the game, and after an
+intermission a new one starts with no cards in play (players send theirs
+again).
+
+The first connection to use a player id is sent a token for it
+({"type": "player", ...}). Later connections with that id must present it as
+?token= to take the id over (a reconnect); anyone else is refused, so one
+client cannot evict another or claim with their card.
+"""
+import asyncio
+import json
+import logging
+import re
+import secrets
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from game.engine import BingoEngine, letter_for, validate_card
+from metrics import FALLBACKS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ROOM_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+PING = json.dumps({"type": "ping"})
+# Queued by Subscriber.close() so a writer blocked on an empty queue returns at once
+_WAKE = object()
+# Close code 1013 is "try again later": the client should reconnect with ?since=
+CLOSE_TOO_SLOW = 1013
+# The player's id was taken over by a newer connection presenting its token
+CLOSE_REPLACED = 4000
+# The room shut down (idle, failed or server stopping)
+CLOSE_ROOM_CLOSED = 1001
+
+
+def _encode(event: Dict[str, Any]) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+
+class RoomFull(Exception):
+    pass
+
+
+class PlayerTaken(Exception):
+    pass
+
+
+class RoomClosed(Exception):
+    pass
+
+
+class CardsLocked(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, queue_size: int, player: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.player = player
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=queue_size)
+        # Set when the room is done with this connection, with the close code and reason to send
+        self.dropped = False
+        self.close_code = 1000
+        self.close_reason = ""
+
+    def close(self, code: int, reason: str) -> None:
+        self.dropped = True
+        self.close_code = code
+        self.close_reason = reason
+        # Nothing queued will be sent any more; clearing it also makes room for the wake-up when it was full
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_WAKE)
+
+    def offer(self, text: str) -> bool:
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+
+class Room:
+    def __init__(
+        self,
+        room_id: str,
+        call_interval: float = 4.0,
+        intermission: float = 10.0,
+        queue_size: int = 256,
+        replay_size: int = 200,
+        idle_timeout: float = 60.0,
+        max_cards: int = 50000,
+        seed: Optional[int] = None,
+        on_close: Optional[Callable[["Room"], None]] = None,
+    ):
+        self.id = room_id
+        self.call_interval = call_interval
+        self.intermission = intermission
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.max_cards = max_cards
+        self.seed = seed
+        self.on_close = on_close
+        self.engine = BingoEngine(seed)
+        self.game = 1
+        self.status = "playing"
+        self.seq = 0
+        self.subscribers: Set[Subscriber] = set()
+        self._players: Dict[str, Subscriber] = {}
+        self._tokens: Dict[str, str] = {}
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=replay_size)
+        self._snapshot: Tuple[int, str] = (-1, "")
+        self._joined = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Set once the draw loop has ended; the room never calls another ball
+        self.closed = False
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def queued(self) -> int:
+        return sum(sub.queue.qsize() for sub in self.subscribers)
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Encode an event once, record it for replay and queue it to every connection; returns its seq."""
+        started = time.perf_counter()
+        self.seq += 1
+        text = _encode({"seq": self.seq, **event})
+        self._history.append((self.seq, text))
+        for sub in list(self.subscribers):
+            if not sub.offer(text):
+                self._drop(sub)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="room_fanout", model="")
+        return self.seq
+
+    def snapshot(self) -> str:
+        """The room's state as one message, re-encoded only when something has happened since."""
+        if self._snapshot[0] != self.seq:
+            self._snapshot = (self.seq, _encode({
+                "type": "state",
+                "seq": self.seq,
+                "room": self.id,
+                "game": self.game,
+                "status": self.status,
+                "called": self.engine.called,
+                "call_interval": self.call_interval,
+            }))
+        return self._snapshot[1]
+
+    def join(self, since: Optional[int] = None, player: Optional[str] = None, token: Optional[str] = None) -> Subscriber:
+        """
+        Add a connection and queue what it needs to catch up: missed events, or a snapshot.
+        Raises PlayerTaken if the player id belongs to someone else (no or wrong token),
+        RoomClosed if the room has shut down (get a fresh one from the hub).
+        """
+        if self.closed:
+            raise RoomClosed(f"Room {self.id} has closed")
+        issued = None
+        if player:
+            known = self._tokens.get(player)
+            if known is None:
+                issued = self._tokens[player] = secrets.token_urlsafe(16)
+            elif token is None or not secrets.compare_digest(token, known):
+                raise PlayerTaken(f"Player id {player} is in use; reconnect with its ?token=")
+        sub = Subscriber(self.queue_size, player)
+        if issued:
+            sub.offer(_encode({"type": "player", "player": player, "token": issued}))
+        oldest = self._history[0][0] if self._history else self.seq + 1
+        if since is not None and oldest - 1 <= since <= self.seq:
+            backlog = [text for seq, text in self._history if seq > since]
+        else:
+            backlog = [self.snapshot()]
+        if len(backlog) > self.queue_size:
+            backlog = [self.snapshot()]
+        for text in backlog:
+            sub.offer(text)
+        self.subscribers.add(sub)
+        if player:
+            previous = self._players.get(player)
+            if previous is not None and previous is not sub:
+                # A reconnect replaces the old socket; win notices go to the new one
+                previous.close(CLOSE_REPLACED, "Replaced by a newer connection for this player")
+                self.subscribers.discard(previous)
+            self._players[player] = sub
+        self._joined.set()
+        return sub
+
+    def leave(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+        if sub.player and self._players.get(sub.player) is sub:
+            del self._players[sub.player]
+            if sub.player not in self.engine:
+                # Nothing in play to protect, so the id is free again
+                self._tokens.pop(sub.player, None)
+
+    def _drop(self, sub: Subscriber) -> None:
+        FALLBACKS.inc(kind="room_slow_consumer")
+        logger.info(f"Room {self.id}: dropping a connection that fell {self.queue_size} messages behind")
+        sub.close(CLOSE_TOO_SLOW, "Too far behind; reconnect with ?since=")
+        self.leave(sub)
+
+    def add_card(self, player: str, numbers) -> Dict[str, Any]:
+        """Put a player's card in play for the current game; cards are fixed once the first ball is drawn."""
+        if self.status != "playing" or self.engine.called:
+            raise CardsLocked("Cards are locked once the first ball is drawn; send yours after new_game")
+        if player in self.engine:
+            raise CardsLocked("Your card is already in play for this game")
+        numbers = validate_card(numbers)
+        if len(self.engine) >= self.max_cards:
+            raise RoomFull(f"Room {self.id} already has {self.max_cards} cards in play")
+        self.engine.add_card(player, numbers)
+        return {"type": "card", "game": self.game, "marks": self.engine.marks(player)}
+
+    def claim(self, player: str) -> Dict[str, Any]:
+        """Check a player's bingo claim against the numbers called so far."""
+        if player not in self.engine:
+            return {"type": "claim", "game": self.game, "valid": False, "lines": []}
+        return {
+            "type": "claim",
+            "game": self.game,
+            "valid": self.engine.verify(player),
+            "lines": self.engine.winning_lines(player),
+        }
+
+    def handle(self, sub: Subscriber, text: str) -> None:
+        """Act on a message from a player and queue the reply to that connection only."""
+        if sub.dropped:
+            # Replaced or closed: the reader may still deliver a message or two before the socket goes
+            return
+        try:
+            message = json.loads(text)
+            kind = message.get("type")
+        except (ValueError, AttributeError):
+            reply = {"type": "error", "detail": "Messages are JSON objects with a type"}
+        else:
+            if kind in ("card", "claim") and not sub.player:
+                reply = {"type": "error", "detail": "Connect with ?player=<id> to play a card"}
+            elif kind == "card":
+                try:
+                    reply = self.add_card(sub.player, message.get("numbers") or [])
+                except (ValueError, TypeError, RoomFull, CardsLocked) as e:
+                    reply = {"type": "error", "detail": str(e)}
+            elif kind == "claim":
+                reply = self.claim(sub.player)
+            elif kind == "pong":
+                return
+            else:
+                reply = {"type": "error", "detail": f"Unknown message type: {kind}"}
+        if not sub.offer(_encode(reply)):
+            self._drop(sub)
+
+    def _notify_winners(self, wins) -> None:
+        for win in wins:
+            sub = self._players.get(win.card_id)
+            if sub is not None and not sub.offer(_encode({"type": "bingo", "game": self.game, **win.to_dict()})):
+                self._drop(sub)
+
+    async def _wait_for_players(self) -> bool:
+        """Block until someone is connected; False if the room stayed empty for idle_timeout."""
+        while not self.subscribers:
+            self._joined.clear()
+            try:
+                await asyncio.wait_for(self._joined.wait(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _run(self) -> None:
+        try:
+            while await self._wait_for_players():
+                await asyncio.sleep(self.call_interval)
+                number, wins = self.engine.call()
+                if number is not None:
+                    self.publish({
+                        "type": "call",
+                        "game": self.game,
+                        "number": number,
+                        "letter": letter_for(number),
+                        "count": len(self.engine.called),
+                        "winners": len(wins),
+                        "ts": time.time(),
+                    })
+                    self._notify_winners(wins)
+                if wins or self.engine.finished:
+                    self.status = "intermission"
+                    self.publish({"type": "game_over", "game": self.game, "winners": [w.card_id for w in wins[:100]], "winner_count": len(wins)})
+                    await asyncio.sleep(self.intermission)
+                    self.game += 1
+                    self.engine = BingoEngine(None if self.seed is None else self.seed + self.game)
+                    # Ids with no connection have no card in the new game to protect
+                    self._tokens = {player: token for player, token in self._tokens.items() if player in self._players}
+                    self.status = "playing"
+                    self.publish({"type": "new_game", "game": self.game})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Room {self.id} stopped")
+        finally:
+            self.closed = True
+            for sub in self.subscribers:
+                sub.close(CLOSE_ROOM_CLOSED, "Room closed")
+            if self.on_close is not None:
+                self.on_close(self)
+
+    async def pump(self, sub: Subscriber, send: Callable[[str], Awaitable[None]], heartbeat: float, send_timeout: float) -> None:
+        """Writer loop for one connection: drain its queue, pinging when idle. Returns when the room drops it."""
+        while not sub.dropped:
+            try:
+                text = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                text = PING
+            if sub.dropped or text is _WAKE:
+                return
+            await asyncio.wait_for(send(text), timeout=send_timeout)
+
+
+class RoomHub:
+    """Rooms by id, created on first join and removed once they have been empty for their idle timeout."""
+
+    def __init__(self, max_rooms: int = 1000, **room_options: Any):
+        self.max_rooms = max_rooms
+        self.room_options = room_options
+        self.rooms: Dict[str, Room] = {}
+
+    def connections(self) -> int:
+        return sum(len(room.subscribers) for room in self.rooms.values())
+
+    def queued(self) -> int:
+        return sum(room.queued() for room in self.rooms.values())
+
+    def room(self, room_id: str) -> Room:
+        """The open room for an id, creating it (or replacing one that has shut down) if needed."""
+        room = self.rooms.get(room_id)
+        if room is None or room.closed:
+            if not ROOM_ID_RE.match(room_id):
+                raise ValueError("Room ids are 1-64 letters, digits, '-' or '_'")
+            if len(self.rooms) - (room is not None) >= self.max_rooms:
+                raise RoomFull(f"{self.max_rooms} rooms are already open")
+            room = Room(room_id, on_close=self._closed, **self.room_options)
+            self.rooms[room_id] = room
+            room.start()
+        return room
+
+    def _closed(self, room: Room) -> None:
+        if self.rooms.get(room.id) is room:
+            del self.rooms[room.id]
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(room.aclose() for room in list(self.rooms.values())))
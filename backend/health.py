@@ -0,0 +1,59 @@
+"""
+Readiness checks for the load balancer.
+
+/healthz only says the process is serving. /readyz also requires that image
+processing has finished loading and that Scenario accepts our credentials,
+verified with a cheap authenticated GET whose result is reused for
+`interval` seconds so health probes do not turn into upstream traffic.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+
+import httpx
+
+from metrics import UPSTREAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialCheck:
+    def __init__(self, http: httpx.AsyncClient, url: str, auth: Tuple[str, str], interval: float = 300.0, timeout: float = 5.0):
+        self.http = http
+        self.url = url
+        self.auth = auth
+        self.interval = interval
+        self.timeout = timeout
+        # None until Scenario has answered once
+        self.valid: Optional[bool] = None
+        self.detail = "not checked yet"
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> Optional[bool]:
+        if self._checked_at and time.monotonic() - self._checked_at < self.interval:
+            return self.valid
+        async with self._lock:
+            if self._checked_at and time.monotonic() - self._checked_at < self.interval:
+                return self.valid
+            try:
+                resp = await self.http.get(self.url, auth=self.auth, timeout=self.timeout)
+            except httpx.HTTPError as e:
+                # Keep the last verdict: a blip upstream should not pull every instance out of rotation
+                UPSTREAM_RESPONSES.inc(operation="credential_check", status="error")
+                self.detail = f"Scenario unreachable: {e.__class__.__name__}"
+                self._checked_at = time.monotonic()
+                return self.valid
+            UPSTREAM_RESPONSES.inc(operation="credential_check", status=str(resp.status_code))
+            self._checked_at = time.monotonic()
+            if resp.status_code in (401, 403):
+                self.valid = False
+                self.detail = f"rejected by Scenario ({resp.status_code})"
+                logger.warning(f"Scenario credentials were rejected ({resp.status_code})")
+            elif resp.status_code < 500:
+                self.valid = True
+                self.detail = "ok"
+            else:
+                self.detail = f"Scenario answered {resp.status_code}"
+            return self.valid
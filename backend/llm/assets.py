@@ -0,0 +1,212 @@
+"""
+Resolve Scenario asset ids to directly fetchable URLs.
+
+AssetResolver is shared by the video and image clients. A job's assets are
+resolved concurrently, and the result is cached per asset id until shortly
+before its signature expires. The expiry is read from the usual signed-URL
+query parameters (S3 / GCS V4, CloudFront/V2 `Expires`, Azure `se`); URLs
+without one are kept for `default_ttl`. When the finished job payload
+already lists a URL for an asset, it is used as is and no lookup is sent.
+
+Lookup order for an unknown asset: HEAD on /download (following the
+redirect to storage), then the asset metadata document.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from llm.governor import UpstreamGovernor
+from metrics import CACHE_LOOKUPS, FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+URL_KEYS = ("downloadUrl", "url", "signedUrl")
+ID_KEYS = ("assetId", "id")
+
+
+def url_candidates(data: Any) -> List[str]:
+    """URLs in an asset metadata document, top level first, then common nested nodes."""
+    if not isinstance(data, dict):
+        return []
+    candidates = [data[key] for key in URL_KEYS if data.get(key)]
+    for node_key in ("asset", "data", "result", "file"):
+        node = data.get(node_key)
+        if isinstance(node, dict):
+            candidates.extend(node[key] for key in URL_KEYS if node.get(key))
+    return [u for u in candidates if isinstance(u, str) and u.startswith("http")]
+
+
+def urls_from_job(job: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """{asset id: URL} for any assets the job payload already describes with a URL."""
+    found: Dict[str, str] = {}
+    if not isinstance(job, dict):
+        return found
+    metadata = job.get("metadata") or {}
+    for container in (job, metadata):
+        for key in ("assets", "outputs"):
+            entries = container.get(key) if isinstance(container, dict) else None
+            if not isinstance(entries, list):
+                continue
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                asset_id = next((entry[k] for k in ID_KEYS if entry.get(k)), None)
+                urls = url_candidates(entry)
+                if asset_id and urls:
+                    found.setdefault(asset_id, urls[0])
+    return found
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def signed_url_expiry(url: str) -> Optional[float]:
+    """Epoch seconds at which a signed URL stops working, or None if it carries no expiry."""
+    query = {k.lower(): v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+    try:
+        for prefix in ("x-amz", "x-goog"):
+            if f"{prefix}-date" in query and f"{prefix}-expires" in query:
+                signed_at = _parse_timestamp(query[f"{prefix}-date"])
+                if signed_at is not None:
+                    return signed_at + float(query[f"{prefix}-expires"])
+        if "expires" in query:
+            return float(query["expires"])
+    except ValueError:
+        return None
+    if "se" in query:
+        return _parse_timestamp(query["se"])
+    return None
+
+
+class AssetResolver:
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        governor: UpstreamGovernor,
+        auth: Tuple[str, str],
+        assets_base_url: str,
+        default_ttl: float = 600.0,
+        expiry_margin: float = 120.0,
+        max_entries: int = 4096,
+    ):
+        self.http = http
+        self.governor = governor
+        self.auth = auth
+        self.assets_base_url = assets_base_url.rstrip("/")
+        self.default_ttl = default_ttl
+        # Stop handing out a URL this long before it expires, so the client still has time to fetch it
+        self.expiry_margin = expiry_margin
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Task[Optional[str]]"] = {}
+
+    def _cached(self, asset_id: str) -> Optional[str]:
+        entry = self._cache.get(asset_id)
+        if entry is None:
+            return None
+        url, valid_until = entry
+        if time.monotonic() >= valid_until:
+            del self._cache[asset_id]
+            return None
+        self._cache.move_to_end(asset_id)
+        return url
+
+    def remember(self, asset_id: str, url: str) -> bool:
+        """Cache a URL until shortly before its signature expires; False if it is already too close to expiry."""
+        expires = signed_url_expiry(url)
+        if expires is None:
+            lifetime = self.default_ttl
+        else:
+            lifetime = expires - time.time() - self.expiry_margin
+        if lifetime <= 0:
+            return False
+        self._cache[asset_id] = (url, time.monotonic() + lifetime)
+        self._cache.move_to_end(asset_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return True
+
+    def forget(self, asset_id: str) -> None:
+        self._cache.pop(asset_id, None)
+
+    async def resolve(self, asset_id: str, hint: Optional[str] = None) -> Optional[str]:
+        """A directly usable URL for the asset, or None if Scenario does not give us one."""
+        url = self._cached(asset_id)
+        if url is not None:
+            CACHE_LOOKUPS.inc(kind="asset_url", result="hit")
+            return url
+        CACHE_LOOKUPS.inc(kind="asset_url", result="miss")
+        # A hint that has expired (or is about to) is no better than none: look the asset up instead
+        if hint and self.remember(asset_id, hint):
+            return hint
+        task = self._inflight.get(asset_id)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(asset_id))
+            self._inflight[asset_id] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(asset_id, None))
+        return await asyncio.shield(task)
+
+    async def resolve_many(self, asset_ids: Sequence[str], job: Optional[Dict[str, Any]] = None) -> List[Optional[str]]:
+        """Resolve a job's assets concurrently, using URLs from the job payload where it has them."""
+        hints = urls_from_job(job)
+        results = await asyncio.gather(*(self.resolve(aid, hints.get(aid)) for aid in asset_ids), return_exceptions=True)
+        urls: List[Optional[str]] = []
+        for aid, result in zip(asset_ids, results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                logger.warning(f"Could not resolve asset {aid}: {result}")
+                result = None
+            urls.append(result)
+        return urls
+
+    async def metadata_urls(self, asset_id: str) -> List[str]:
+        meta_url = f"{self.assets_base_url}/{asset_id}"
+        meta = await self.governor.request(
+            lambda: self.http.get(meta_url, auth=self.auth, follow_redirects=True),
+            label="Asset metadata request",
+        )
+        if meta.status_code != 200:
+            logger.warning(f"Failed to fetch asset metadata: {meta.status_code} - {meta.text}")
+            return []
+        return url_candidates(meta.json())
+
+    async def _lookup(self, asset_id: str) -> Optional[str]:
+        # Prefer direct download endpoint if it responds with a redirect or content
+        download_url = f"{self.assets_base_url}/{asset_id}/download"
+        try:
+            head = await self.governor.request(
+                lambda: self.http.head(download_url, auth=self.auth, follow_redirects=True),
+                label="Asset lookup",
+            )
+            if head.status_code == 200:
+                # After following any redirect this is the storage URL, which needs no Scenario auth
+                url = str(head.url)
+                self.remember(asset_id, url)
+                return url
+        except httpx.HTTPError:
+            pass
+
+        # Fallback: fetch metadata to get a signed URL
+        FALLBACKS.inc(kind="asset_url_metadata")
+        try:
+            candidates = await self.metadata_urls(asset_id)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Asset metadata lookup for {asset_id} failed: {e}")
+            return None
+        if not candidates:
+            return None
+        self.remember(asset_id, candidates[0])
+        return candidates[0]
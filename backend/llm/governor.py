@@ -0,0 +1,226 @@
+"""
+Admission control for everything we send to Scenario.
+
+- Job slots: at most N generation jobs per model kind (Veo video, Gemini
+  image) are running upstream at once, counted from the create request until
+  polling finishes. Waiters are served by priority, so players queue ahead
+  of background pre-generation.
+- A token bucket shared by every request (create, poll, asset lookups)
+  keeps the request rate under the account quota; a 429 empties it for
+  Retry-After seconds for everyone.
+- request() retries 429, 502/503/504 and connection failures with jittered
+  exponential backoff, never sooner than Retry-After.
+
+The priority of the current task comes from a context variable, so callers
+deep in the stack do not need to pass it through.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from metrics import UPSTREAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+request_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Run the enclosed upstream work (and tasks it starts) at the given priority."""
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class UpstreamThrottled(Exception):
+    """Raised when Scenario keeps answering 429 after every retry."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        # rate <= 0 disables limiting
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0 and self._paused_until <= time.monotonic():
+            return
+        # The lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.rate > 0:
+                    self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0 and (self.rate <= 0 or self._tokens >= 1):
+                    if self.rate > 0:
+                        self._tokens -= 1
+                    return
+                if self.rate > 0:
+                    wait = max(wait, (1 - self._tokens) / self.rate)
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = now
+
+
+class PrioritySlots:
+    """A semaphore whose waiters are woken lowest priority value first, FIFO within a priority."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, level: int) -> None:
+        if self.active < self.limit and not self.waiting():
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; `active` is unchanged
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class UpstreamGovernor:
+    def __init__(
+        self,
+        job_limits: Optional[Dict[str, int]] = None,
+        rate: float = 5.0,
+        burst: int = 10,
+        max_retries: int = 5,
+        retry_base: float = 1.0,
+        retry_max: float = 30.0,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = {kind: PrioritySlots(limit) for kind, limit in (job_limits or {"video": 4, "image": 8}).items()}
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    @asynccontextmanager
+    async def job_slot(self, kind: str):
+        """Hold one of the kind's concurrent job slots for the lifetime of an upstream job."""
+        slots = self.slots.get(kind)
+        if slots is None:
+            yield
+            return
+        level = request_priority.get()
+        started = time.perf_counter()
+        await slots.acquire(level)
+        waited = time.perf_counter() - started
+        if waited > 0.5:
+            logger.info(f"Waited {waited:.1f}s for a {kind} job slot (priority {level})")
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def _backoff(self, attempt: int) -> float:
+        # Equal jitter: half fixed, half random, so retries spread out but never go to zero
+        ceiling = min(self.retry_max, self.retry_base * (2 ** attempt))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    @staticmethod
+    def _operation(label: str) -> str:
+        return label.lower().replace(" ", "_")
+
+    async def request(self, send: Callable[[], Awaitable[httpx.Response]], label: str = "Scenario request") -> httpx.Response:
+        """
+        Rate-limit and send one request, retrying throttling and transient
+        failures. Returns the last response (which may still be an error
+        status); raises UpstreamThrottled if every attempt got a 429.
+        """
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                resp = await send()
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                UPSTREAM_RESPONSES.inc(operation=self._operation(label), status="error")
+                # Only failures where the request never reached Scenario are safe to resend
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{label} failed to connect ({e}), retrying in {delay:.1f}s")
+            else:
+                UPSTREAM_RESPONSES.inc(operation=self._operation(label), status=str(resp.status_code))
+                if resp.status_code not in RETRY_STATUSES:
+                    return resp
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                delay = max(retry_after or 0.0, self._backoff(attempt))
+                if resp.status_code == 429:
+                    # The quota is per account, so everyone waits
+                    self.bucket.pause(delay)
+                if attempt >= self.max_retries:
+                    if resp.status_code == 429:
+                        raise UpstreamThrottled(f"{label} is still rate limited after {attempt + 1} attempts", retry_after)
+                    return resp
+                logger.warning(f"{label} got {resp.status_code}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
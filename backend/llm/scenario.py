@@ -1,18 +1,310 @@
+import logging
 import os
-import time
-import requests
+import asyncio
+from typing import Callable, Optional
+import httpx
+
+from fetch import DEFAULT_CHUNK_SIZE, DEFAULT_PART_SIZE, VIDEO_CONTENT_TYPES, FetchError, fetch_ranged
+from llm.assets import AssetResolver
+from llm.governor import TokenBucket, UpstreamGovernor, parse_retry_after
+from metrics import CANCELLATIONS, STAGE_SECONDS, UPSTREAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = "https://api.cloud.scenario.com/v1"
+
+
+def create_http_client(
+    max_connections: int = 100,
+    max_keepalive: int = 20,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 30.0,
+    connect_timeout: float = 10.0,
+    http2: bool = True,
+) -> httpx.AsyncClient:
+    """
+    Build the keep-alive connection pool shared by all Scenario clients.
+    HTTP/2 is only enabled when the optional `h2` package is installed.
+    """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+
+
+class PollProfile:
+    """Polling cadence for one kind of job: start fast, back off to a ceiling."""
+
+    def __init__(self, initial: float, maximum: float, factor: float, deadline: float):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.deadline = deadline
+
+
+# Gemini images finish in seconds; Veo videos take minutes
+DEFAULT_POLL_PROFILES = {
+    "image": PollProfile(initial=1.0, maximum=5.0, factor=1.5, deadline=300.0),
+    "video": PollProfile(initial=5.0, maximum=15.0, factor=1.3, deadline=900.0),
+}
+
+TERMINAL_STATUSES = ("success", "failure", "canceled")
+
+
+class _WatchedJob:
+    def __init__(self, url: str, auth, profile: PollProfile, label: str, on_progress, future: "asyncio.Future", now: float):
+        self.url = url
+        self.auth = auth
+        self.profile = profile
+        self.label = label
+        self.on_progress = on_progress
+        self.future = future
+        self.started_at = now
+        self.deadline_at = now + profile.deadline
+        self.interval = profile.initial
+        self.next_poll_at = now + profile.initial
+
+
+class JobPoller:
+    """
+    One scheduler polling every outstanding Scenario job.
+
+    Each job gets its own adaptive interval (fast early for images, backing
+    off for videos, tightened when reported progress says it is nearly
+    done) and a hard deadline. 429/5xx responses push the next poll out by
+    Retry-After; a 429 pauses all polling since the quota is shared.
+
+    When a waiter gives up on a job that is still running, polling stops and
+    (with cancel_abandoned) Scenario is asked to cancel the job so it stops
+    spending quota on a result nobody will read.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient, profiles=None, max_concurrency: int = 16, rate_limiter: Optional[TokenBucket] = None, cancel_abandoned: bool = True):
+        self.http = http_client
+        # Shared with the governor so polls and job creation draw from one request quota
+        self.rate_limiter = rate_limiter
+        self.profiles = profiles or DEFAULT_POLL_PROFILES
+        self.cancel_abandoned = cancel_abandoned
+        self._jobs: dict = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # Fire-and-forget cancel requests, referenced here so they are not garbage collected mid-flight
+        self._cancels: set = set()
+
+    def outstanding(self) -> int:
+        return len(self._jobs)
+
+    async def wait(self, polling_url: str, auth, kind: str = "image", label: str = "Job", on_progress: Optional[Callable[[float], None]] = None):
+        """Track a job until it reaches a terminal status; returns the job payload or None."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _WatchedJob(polling_url, auth, self.profiles[kind], label, on_progress, future, loop.time())
+        self._jobs[polling_url] = job
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if self.cancel_abandoned and not (future.done() and not future.cancelled()):
+                CANCELLATIONS.inc(kind="upstream_job")
+                task = asyncio.ensure_future(self._cancel_upstream(job))
+                self._cancels.add(task)
+                task.add_done_callback(self._cancels.discard)
+            raise
+        finally:
+            # Also reached when the waiter is cancelled: stop polling for nobody
+            self._jobs.pop(polling_url, None)
+
+    async def _cancel_upstream(self, job: _WatchedJob) -> None:
+        try:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            resp = await self.http.post(f"{job.url}/action", json={"action": "cancel"}, auth=job.auth)
+        except httpx.HTTPError as e:
+            UPSTREAM_RESPONSES.inc(operation="job_cancel", status="error")
+            logger.warning(f"Could not cancel abandoned {job.label.lower()} job: {e}")
+            return
+        UPSTREAM_RESPONSES.inc(operation="job_cancel", status=str(resp.status_code))
+        if resp.status_code < 400:
+            logger.info(f"Canceled abandoned {job.label.lower()} job {job.url.rsplit('/', 1)[-1]}")
+        else:
+            # Jobs that already finished, or models that cannot be stopped, just answer with an error
+            logger.info(f"Scenario did not cancel {job.label.lower()} job {job.url.rsplit('/', 1)[-1]}: {resp.status_code}")
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._cancels:
+            # Give in-flight cancel requests a moment so shutdown does not leave jobs running upstream
+            await asyncio.wait(self._cancels, timeout=5.0)
+        for job in self._jobs.values():
+            if not job.future.done():
+                job.future.set_result(None)
+        self._jobs.clear()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._jobs:
+            try:
+                await self._round(loop)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # This task is the only thing resolving waiters: a bug in one round must not strand all of them
+                logger.exception("Job poller round failed")
+                await asyncio.sleep(1.0)
+
+    async def _round(self, loop: asyncio.AbstractEventLoop):
+        now = loop.time()
+        due = []
+        for job in list(self._jobs.values()):
+            if job.future.done():
+                continue
+            if now >= job.deadline_at:
+                logger.warning(f"{job.label} {job.url} exceeded its {job.profile.deadline:.0f}s deadline")
+                job.future.set_result(None)
+            elif now >= max(job.next_poll_at, self._paused_until):
+                due.append(job)
+        if due:
+            await asyncio.gather(*(self._poll(job) for job in due))
+            return
+
+        pending = [j for j in self._jobs.values() if not j.future.done()]
+        if not pending:
+            # Give waiters a turn to pick up their results and unregister
+            await asyncio.sleep(0)
+            return
+        wake_at = min(min(max(j.next_poll_at, self._paused_until), j.deadline_at) for j in pending)
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wake_at - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll(self, job: _WatchedJob):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._semaphore:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                resp = await self.http.get(job.url, auth=job.auth)
+        except httpx.HTTPError as e:
+            UPSTREAM_RESPONSES.inc(operation="job_poll", status="error")
+            logger.warning(f"Error polling {job.label.lower()} status: {e}")
+            self._back_off(job, None)
+            return
+        UPSTREAM_RESPONSES.inc(operation="job_poll", status=str(resp.status_code))
+        if job.future.done():
+            return
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            logger.warning(f"Polling {job.label.lower()} throttled: {resp.status_code}, retrying in {retry_after or job.interval:.1f}s")
+            if resp.status_code == 429:
+                self._paused_until = loop.time() + (retry_after or job.interval)
+                if self.rate_limiter:
+                    self.rate_limiter.pause(retry_after or job.interval)
+            self._back_off(job, retry_after)
+            return
+        if resp.status_code != 200:
+            logger.warning(f"Error polling {job.label.lower()} status: {resp.status_code} - {resp.text}")
+            job.future.set_result(None)
+            return
+
+        try:
+            data = resp.json()
+            payload = data.get("job") or {}
+            status = payload.get("status")
+            progress = float(payload.get("progress") or 0)
+        except (ValueError, TypeError, AttributeError) as e:
+            # A garbled 200 is treated like a transient error; the deadline still bounds the job
+            logger.warning(f"Malformed {job.label.lower()} status response: {e}")
+            self._back_off(job, None)
+            return
+        logger.info(f"{job.label} {payload.get('jobId', '')} status: {status}, progress: {progress * 100:.2f}%")
+        if job.on_progress:
+            try:
+                job.on_progress(progress)
+            except Exception:
+                logger.exception(f"{job.label} progress callback failed")
+        if status in TERMINAL_STATUSES:
+            if status == "success":
+                asset_ids = (payload.get("metadata") or {}).get("assetIds", [])
+                logger.info(f"{job.label} completed! Asset IDs: {asset_ids}")
+            else:
+                logger.warning(f"{job.label} failed or canceled: {payload.get('error')}")
+            job.future.set_result(data)
+            return
+        job.next_poll_at = loop.time() + self._next_interval(job, progress, loop.time())
+
+    def _back_off(self, job: _WatchedJob, retry_after: Optional[float]):
+        job.interval = min(job.interval * 2, job.profile.maximum * 4)
+        job.next_poll_at = asyncio.get_running_loop().time() + max(retry_after or 0.0, job.interval)
+
+    @staticmethod
+    def _next_interval(job: _WatchedJob, progress: float, now: float) -> float:
+        profile = job.profile
+        job.interval = min(job.interval * profile.factor, profile.maximum)
+        if 0 < progress < 1:
+            # Estimate time to completion from the reported progress and aim to poll about twice before it
+            elapsed = now - job.started_at
+            remaining = elapsed * (1 - progress) / progress
+            return max(profile.initial, min(job.interval, remaining / 2))
+        return job.interval
+
 
 class ScenarioVideoGenerator:
-    def __init__(self, api_key: str, api_secret: str, model_id: str = "model_veo3-1", resolution: str = "1080p"):
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        model_id: str = "model_veo3-1",
+        resolution: str = "1080p",
+        http_client: Optional[httpx.AsyncClient] = None,
+        poller: Optional[JobPoller] = None,
+        governor: Optional[UpstreamGovernor] = None,
+        max_download_bytes: int = 512 * 1024 * 1024,
+        download_chunk_size: int = DEFAULT_CHUNK_SIZE,
+        download_part_size: int = DEFAULT_PART_SIZE,
+        download_concurrency: int = 4,
+        api_base: str = DEFAULT_API_BASE,
+        asset_resolver: Optional[AssetResolver] = None,
+    ):
         self.api_key = api_key
         self.api_secret = api_secret
+        self.http = http_client or create_http_client()
+        self.poller = poller or JobPoller(self.http)
+        self.governor = governor or UpstreamGovernor()
         self.model_id = model_id
-        self.generate_url = f"https://api.cloud.scenario.com/v1/generate/custom/{self.model_id}"
-        self.jobs_base_url = "https://api.cloud.scenario.com/v1/jobs"
+        api_base = api_base.rstrip("/")
+        self.generate_url = f"{api_base}/generate/custom/{self.model_id}"
+        self.jobs_base_url = f"{api_base}/jobs"
         self.resolution = resolution
-        self.assets_base_url = "https://api.cloud.scenario.com/v1/assets"
+        self.assets_base_url = f"{api_base}/assets"
+        self.assets = asset_resolver or AssetResolver(self.http, self.governor, (api_key, api_secret), self.assets_base_url)
+        self.max_download_bytes = max_download_bytes
+        self.download_chunk_size = download_chunk_size
+        self.download_part_size = download_part_size
+        self.download_concurrency = download_concurrency
 
-    def start_generation(self, prompt: str, generate_audio: bool = True, aspect_ratio: str = "16:9", duration: int = 8):
+    async def start_generation(self, prompt: str, generate_audio: bool = True, aspect_ratio: str = "16:9", duration: int = 8):
         payload = {
             "prompt": prompt,
             "generateAudio": generate_audio,
@@ -20,147 +312,105 @@ class ScenarioVideoGenerator:
             "duration": duration,
             "resolution": self.resolution,
         }
-        print("Initiating video generation...")
-        r = requests.post(self.generate_url, headers={"Content-Type": "application/json"}, json=payload, auth=(self.api_key, self.api_secret))
+        logger.info("Initiating video generation...")
+        r = await self.governor.request(
+            lambda: self.http.post(self.generate_url, headers={"Content-Type": "application/json"}, json=payload, auth=(self.api_key, self.api_secret)),
+            label="Video generation request",
+        )
         if r.status_code == 200:
             data = r.json()
             job = data.get("job") or {}
             job_id = job.get("jobId")
             if job_id:
-                print(f"Video generation job initiated. Job ID: {job_id}")
+                logger.info(f"Video generation job initiated. Job ID: {job_id}")
                 return job_id
-            print("Error: No jobId returned in the initial response.")
+            logger.warning("Error: No jobId returned in the initial response.")
             return None
-        print(f"Error initiating video generation: {r.status_code} - {r.text}")
+        logger.warning(f"Error initiating video generation: {r.status_code} - {r.text}")
         return None
 
-    def poll_job(self, job_id: str):
+    async def poll_job(self, job_id: str, on_progress: Optional[Callable[[float], None]] = None):
         polling_url = f"{self.jobs_base_url}/{job_id}"
-        status = "queued"
-        while status not in ["success", "failure", "canceled"]:
-            print(f"Polling job {job_id}... Current status: {status}")
-            time.sleep(3)
-            resp = requests.get(polling_url, auth=(self.api_key, self.api_secret))
-            if resp.status_code == 200:
-                data = resp.json()
-                job = data.get("job") or {}
-                status = job.get("status")
-                progress = (job.get("progress") or 0) * 100
-                print(f"Progress: {progress:.2f}%")
-                if status == "success":
-                    asset_ids = (job.get("metadata") or {}).get("assetIds", [])
-                    print(f"Video generation completed! Asset IDs: {asset_ids}")
-                    return data
-                if status in ["failure", "canceled"]:
-                    print(f"Video generation failed or canceled: {job.get('error')}")
-                    return data
-            else:
-                print(f"Error polling job status: {resp.status_code} - {resp.text}")
-                return None
-        return None
+        return await self.poller.wait(polling_url, (self.api_key, self.api_secret), kind="video", label="Video generation", on_progress=on_progress)
 
-    def download_asset(self, asset_id: str, dest_dir: str):
+    async def download_asset(self, asset_id: str, dest_dir: str):
         os.makedirs(dest_dir, exist_ok=True)
         # 1) Try direct download endpoint
         download_url = f"{self.assets_base_url}/{asset_id}/download"
-        resp = requests.get(download_url, auth=(self.api_key, self.api_secret), stream=True)
-        if resp.status_code == 200:
-            ctype = (resp.headers.get("Content-Type") or "").lower()
-            ext = ".mp4" if "mp4" in ctype else ".webm" if "webm" in ctype else ".mov" if "quicktime" in ctype else ".bin"
-            out_path = os.path.join(dest_dir, f"{asset_id}{ext}")
-            with open(out_path, "wb") as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            print(f"Saved: {out_path}")
+        out_path = await self._stream_to_file(download_url, dest_dir, asset_id, auth=(self.api_key, self.api_secret))
+        if out_path:
             return out_path
 
         # 2) Fallback: fetch metadata to get a signed URL
-        meta_url = f"{self.assets_base_url}/{asset_id}"
-        meta = requests.get(meta_url, auth=(self.api_key, self.api_secret))
-        if meta.status_code == 200:
-            data = meta.json()
-            # Try common fields where a URL may appear
-            candidates = []
-            for key in ("downloadUrl", "url", "signedUrl"):
-                if isinstance(data, dict) and data.get(key):
-                    candidates.append(data.get(key))
-            for node_key in ("asset", "data", "result", "file"):
-                node = data.get(node_key) if isinstance(data, dict) else None
-                if isinstance(node, dict):
-                    for key in ("downloadUrl", "url", "signedUrl"):
-                        if node.get(key):
-                            candidates.append(node.get(key))
-            for file_url in candidates:
-                try:
-                    r2 = requests.get(file_url, stream=True)
-                    if r2.status_code == 200:
-                        ctype = (r2.headers.get("Content-Type") or "").lower()
-                        ext = ".mp4" if "mp4" in ctype else ".webm" if "webm" in ctype else ".mov" if "quicktime" in ctype else ".bin"
-                        out_path = os.path.join(dest_dir, f"{asset_id}{ext}")
-                        with open(out_path, "wb") as f:
-                            for chunk in r2.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                        print(f"Saved: {out_path}")
-                        return out_path
-                except Exception as e:
-                    print(f"Download via signed URL failed: {e}")
-        else:
-            print(f"Failed to fetch asset metadata: {meta.status_code} - {meta.text}")
-        print(f"Unable to download asset {asset_id}")
+        for file_url in await self.assets.metadata_urls(asset_id):
+            try:
+                out_path = await self._stream_to_file(file_url, dest_dir, asset_id)
+                if out_path:
+                    return out_path
+            except Exception as e:
+                logger.warning(f"Download via signed URL failed: {e}")
+        logger.warning(f"Unable to download asset {asset_id}")
         return None
 
-    def get_asset_url(self, asset_id: str):
+    async def _stream_to_file(self, url: str, dest_dir: str, asset_id: str, auth=None):
+        # The extension comes from the response Content-Type, so download under a neutral name first;
+        # the name is stable per asset so an interrupted download resumes from its finished parts
+        partial_path = os.path.join(dest_dir, f"{asset_id}.download")
+        try:
+            ctype = await fetch_ranged(
+                self.http,
+                url,
+                partial_path,
+                max_bytes=self.max_download_bytes,
+                content_types=VIDEO_CONTENT_TYPES,
+                auth=auth,
+                part_size=self.download_part_size,
+                concurrency=self.download_concurrency,
+                chunk_size=self.download_chunk_size,
+            )
+        except FetchError as e:
+            logger.warning(f"Download of {asset_id} rejected: {e}")
+            return None
+        except httpx.HTTPError as e:
+            # Connection errors and timeouts fall through to the next URL; finished parts stay for a resume
+            logger.warning(f"Download of {asset_id} from {url.split('?', 1)[0]} failed: {e}")
+            return None
+        ext = ".mp4" if "mp4" in ctype else ".webm" if "webm" in ctype else ".mov" if "quicktime" in ctype else ".bin"
+        out_path = os.path.join(dest_dir, f"{asset_id}{ext}")
+        os.replace(partial_path, out_path)
+        logger.info(f"Saved: {out_path}")
+        return out_path
+
+    async def get_asset_url(self, asset_id: str):
         """
         Try to fetch a directly usable URL for the given asset. Returns None if not found.
         """
-        # Prefer direct download endpoint if it responds with a redirect or content
-        download_url = f"{self.assets_base_url}/{asset_id}/download"
-        try:
-            head = requests.head(download_url, auth=(self.api_key, self.api_secret), allow_redirects=True)
-            if head.status_code in (200, 302, 303) and head.headers.get('Location'):
-                return head.headers['Location']
-            if head.status_code == 200:
-                return download_url
-        except Exception:
-            pass
+        return await self.assets.resolve(asset_id)
 
-        # Fallback: fetch metadata to get a signed URL
-        meta_url = f"{self.assets_base_url}/{asset_id}"
-        meta = requests.get(meta_url, auth=(self.api_key, self.api_secret))
-        if meta.status_code == 200:
-            data = meta.json()
-            candidates = []
-            for key in ("downloadUrl", "url", "signedUrl"):
-                if isinstance(data, dict) and data.get(key):
-                    candidates.append(data.get(key))
-            for node_key in ("asset", "data", "result", "file"):
-                node = data.get(node_key) if isinstance(data, dict) else None
-                if isinstance(node, dict):
-                    for key in ("downloadUrl", "url", "signedUrl"):
-                        if node.get(key):
-                            candidates.append(node.get(key))
-            for u in candidates:
-                if isinstance(u, str) and u.startswith("http"):
-                    return u
-        return None
-
-    def generate_video(self, prompt: str, generate_audio: bool = True, aspect_ratio: str = "16:9", duration: int = 8):
-        job_id = self.start_generation(prompt=prompt, generate_audio=generate_audio, aspect_ratio=aspect_ratio, duration=duration)
-        if not job_id:
-            return None
-        return self.poll_job(job_id)
+    async def generate_video(self, prompt: str, generate_audio: bool = True, aspect_ratio: str = "16:9", duration: int = 8, on_progress: Optional[Callable[[float], None]] = None):
+        async with self.governor.job_slot("video"):
+            with STAGE_SECONDS.time(stage="start_generation", model=self.model_id):
+                job_id = await self.start_generation(prompt=prompt, generate_audio=generate_audio, aspect_ratio=aspect_ratio, duration=duration)
+            if not job_id:
+                return None
+            with STAGE_SECONDS.time(stage="poll_wait", model=self.model_id):
+                return await self.poll_job(job_id, on_progress=on_progress)
 
 class ScenarioImageGenerator:
-    def __init__(self, api_key: str, api_secret: str, model_id: str = "model_google-gemini-pro-image-t2i"):
+    def __init__(self, api_key: str, api_secret: str, model_id: str = "model_google-gemini-pro-image-t2i", http_client: Optional[httpx.AsyncClient] = None, poller: Optional[JobPoller] = None, governor: Optional[UpstreamGovernor] = None, api_base: str = DEFAULT_API_BASE, asset_resolver: Optional[AssetResolver] = None):
         self.api_key = api_key
         self.api_secret = api_secret
+        self.http = http_client or create_http_client()
+        self.poller = poller or JobPoller(self.http)
+        self.governor = governor or UpstreamGovernor()
         self.model_id = model_id
-        self.generate_url = f"https://api.cloud.scenario.com/v1/generate/custom/{self.model_id}"
-        self.jobs_base_url = "https://api.cloud.scenario.com/v1/jobs"
+        api_base = api_base.rstrip("/")
+        self.generate_url = f"{api_base}/generate/custom/{self.model_id}"
+        self.jobs_base_url = f"{api_base}/jobs"
+        self.assets_base_url = f"{api_base}/assets"
+        self.assets = asset_resolver or AssetResolver(self.http, self.governor, (api_key, api_secret), self.assets_base_url)
 
-    def start_generation(self, prompt: str, aspect_ratio: str = "9:16", resolution: str = "1K"):
+    async def start_generation(self, prompt: str, aspect_ratio: str = "9:16", resolution: str = "1K"):
         payload = {
             "prompt": prompt,
             "aspectRatio": aspect_ratio,
@@ -168,74 +418,36 @@ class ScenarioImageGenerator:
             "useGoogleSearch": False,
             "seed": None,
         }
-        r = requests.post(
-            self.generate_url,
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            auth=(self.api_key, self.api_secret),
+        r = await self.governor.request(
+            lambda: self.http.post(
+                self.generate_url,
+                headers={"Content-Type": "application/json"},
+                json=payload,
+                auth=(self.api_key, self.api_secret),
+            ),
+            label="Image generation request",
         )
         if r.status_code == 200:
             data = r.json()
             job = data.get("job") or {}
             job_id = job.get("jobId")
             return job_id
-        print(f"Image generation error: {r.status_code} - {r.text}")
+        logger.warning(f"Image generation error: {r.status_code} - {r.text}")
         return None
 
-    def poll_job(self, job_id: str):
+    async def poll_job(self, job_id: str, on_progress: Optional[Callable[[float], None]] = None):
         polling_url = f"{self.jobs_base_url}/{job_id}"
-        status = "queued"
-        while status not in ["success", "failure", "canceled"]:
-            time.sleep(3)
-            resp = requests.get(polling_url, auth=(self.api_key, self.api_secret))
-            if resp.status_code != 200:
-                print(f"Error polling image job: {resp.status_code} - {resp.text}")
-                return None
-            data = resp.json()
-            job = data.get("job") or {}
-            status = job.get("status")
-            if status in ["success", "failure", "canceled"]:
-                return data
-        return None
+        return await self.poller.wait(polling_url, (self.api_key, self.api_secret), kind="image", label="Image generation", on_progress=on_progress)
 
-    def generate_image(self, prompt: str, aspect_ratio: str = "9:16", resolution: str = "1K"):
-        job_id = self.start_generation(prompt=prompt, aspect_ratio=aspect_ratio, resolution=resolution)
-        if not job_id:
-            return None
-        return self.poll_job(job_id)
+    async def generate_image(self, prompt: str, aspect_ratio: str = "9:16", resolution: str = "1K", on_progress: Optional[Callable[[float], None]] = None):
+        async with self.governor.job_slot("image"):
+            with STAGE_SECONDS.time(stage="start_generation", model=self.model_id):
+                job_id = await self.start_generation(prompt=prompt, aspect_ratio=aspect_ratio, resolution=resolution)
+            if not job_id:
+                return None
+            with STAGE_SECONDS.time(stage="poll_wait", model=self.model_id):
+                return await self.poll_job(job_id, on_progress=on_progress)
 
-    def get_asset_url(self, asset_id: str):
+    async def get_asset_url(self, asset_id: str):
         """Try to fetch a directly usable URL for the given image asset."""
-        assets_base_url = "https://api.cloud.scenario.com/v1/assets"
-
-        # Prefer direct download endpoint if it responds with a redirect or content
-        download_url = f"{assets_base_url}/{asset_id}/download"
-        try:
-            head = requests.head(download_url, auth=(self.api_key, self.api_secret), allow_redirects=True)
-            if head.status_code in (200, 302, 303) and head.headers.get("Location"):
-                return head.headers["Location"]
-            if head.status_code == 200:
-                return download_url
-        except Exception:
-            pass
-
-        # Fallback: fetch metadata to get a signed URL
-        meta_url = f"{assets_base_url}/{asset_id}"
-        meta = requests.get(meta_url, auth=(self.api_key, self.api_secret))
-        if meta.status_code == 200:
-            data = meta.json()
-            candidates = []
-            for key in ("downloadUrl", "url", "signedUrl"):
-                if isinstance(data, dict) and data.get(key):
-                    candidates.append(data.get(key))
-            for node_key in ("asset", "data", "result", "file"):
-                node = data.get(node_key) if isinstance(data, dict) else None
-                if isinstance(node, dict):
-                    for key in ("downloadUrl", "url", "signedUrl"):
-                        if node.get(key):
-                            candidates.append(node.get(key))
-            for u in candidates:
-                if isinstance(u, str) and u.startswith("http"):
-                    return u
-        return None
-        
\ No newline at end of file
+        return await self.assets.resolve(asset_id)
@@ -0,0 +1,97 @@
+"""
+Structured logging with a per-request id.
+
+RequestContextMiddleware takes the caller's X-Request-ID (or makes one),
+stores it in a context variable for the duration of the request and echoes
+it on the response. Background work started from a request (jobs, shared
+generations) inherits the id, because asyncio tasks copy the context they
+were created in. Every log record carries it: as a JSON field with
+LOG_FORMAT=json, or in brackets with LOG_FORMAT=text.
+"""
+import contextvars
+import json
+import logging
+import sys
+import time
+import uuid
+from typing import Callable, Optional
+
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", request_id.get()),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json") -> None:
+    """Route the app's loggers to stdout; safe to call again (e.g. in pool workers)."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(_RequestIdFilter())
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if getattr(existing, "_orbella", False):
+            root.removeHandler(existing)
+    handler._orbella = True
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    # httpx logs every request at INFO, which drowns out the app during polling
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware, so streaming responses (SSE, NDJSON) keep the request id too."""
+
+    def __init__(self, app, on_complete: Optional[Callable[[str, str, int, float], None]] = None):
+        self.app = app
+        self.on_complete = on_complete
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        rid = incoming[:64] if incoming else uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+            if self.on_complete:
+                route = scope.get("route")
+                self.on_complete(scope["method"], getattr(route, "path", "unmatched"), status[0], time.perf_counter() - started)
@@ -1,23 +1,347 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
+import logging
 import os
+import asyncio
+import json
+import secrets
+import time
+import uuid
+from collections import OrderedDict
 from pathlib import Path
 import dotenv
-import io
-import base64
-from rembg import remove
-from PIL import Image
-import requests as req_lib
+from fastapi.concurrency import run_in_threadpool
 # Load .env located next to this file and override any empty/placeholder envs
 dotenv.load_dotenv(dotenv_path=Path(__file__).with_name(".env"), override=True)
 
 
-from llm.scenario import ScenarioVideoGenerator, ScenarioImageGenerator
+import settings
+from cache import ResultCache, cache_key
+from fetch import IMAGE_CONTENT_TYPES, fetch_spooled, fetch_to_file, spool_path
+from health import CredentialCheck
+from logs import RequestContextMiddleware, configure_logging
+from metrics import (
+    CACHE_LOOKUPS, CANCELLATIONS, CONTENT_TYPE as METRICS_CONTENT_TYPE, FALLBACKS, HTTP_REQUEST_SECONDS, INFLIGHT,
+    QUEUE_DEPTH, STAGE_SECONDS, render as render_metrics,
+)
+from singleflight import ClaimStore, SingleFlight, run_claimed
+from game.cards import LINE_NAMES, NOT_WON, as_cards, audit_claims, generate_cards, line_bits, validate_cards
+from game.engine import MAX_NUMBER
+from game.rooms import ROOM_ID_RE, PlayerTaken, RoomFull, RoomHub
+from prewarm import Prewarmer, ThemeStats
+from llm.assets import AssetResolver
+from llm.governor import PRIORITY_BACKGROUND, UpstreamGovernor, UpstreamThrottled, priority
+from llm.scenario import JobPoller, PollProfile, ScenarioVideoGenerator, ScenarioImageGenerator, create_http_client
 from llm.prompt import get_prompt, get_card_prompt, get_ball_caller_prompt
+from media.background import create_session, record_timings, remove_background_to_store, warm_up
+from media.chroma import ChromaKeyConfig
+from media.encode import IMAGE_URL_PREFIX, EncodeConfig, choose_variant, load_manifest
+from media.pool import ImageWorkerPool, PoolSaturated
+from media.store import CONTENT_TYPES, AssetStore
+from media.video import TranscodeConfig, VideoTranscoder, playable_url
+
+configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def _scenario_credentials():
+    api_key = os.getenv("SCENARIO_ID") or os.getenv("SCENARIO_API_KEY") or "YOUR_API_KEY"
+    api_secret = os.getenv("SCENARIO_SECRET") or os.getenv("SCENARIO_API_SECRET") or "YOUR_API_SECRET"
+    if api_key == "YOUR_API_KEY" or api_secret == "YOUR_API_SECRET":
+        return None
+    return api_key, api_secret
+
+
+def _setup_image_processing(app: FastAPI) -> None:
+    """Build the image processing configuration and (unstarted) worker pool; nothing heavy is loaded here."""
+    app.state.chroma_config = None
+    if settings.CHROMA_KEY_ENABLED:
+        app.state.chroma_config = ChromaKeyConfig(
+            low=settings.CHROMA_KEY_LOW,
+            high=settings.CHROMA_KEY_HIGH,
+            min_border_coverage=settings.CHROMA_KEY_MIN_BORDER_COVERAGE,
+        )
+    app.state.encode_config = EncodeConfig(
+        widths=settings.IMAGE_VARIANT_WIDTHS,
+        webp_lossless=settings.IMAGE_WEBP_LOSSLESS,
+        webp_quality=settings.IMAGE_WEBP_QUALITY,
+        avif=settings.IMAGE_AVIF,
+    )
+    app.state.image_pool = None
+    app.state.rembg_session = None
+    app.state.image_status = {"loaded": False, "detail": "loading"}
+    if settings.IMAGE_WORKERS > 0:
+        app.state.image_pool = ImageWorkerPool(
+            workers=settings.IMAGE_WORKERS,
+            max_queue=settings.IMAGE_QUEUE_SIZE,
+            store_root=app.state.assets.root,
+            model_name=settings.REMBG_MODEL,
+            intra_op_threads=settings.REMBG_INTRA_OP_THREADS,
+            inter_op_threads=settings.REMBG_INTER_OP_THREADS,
+            warmup=settings.REMBG_WARMUP,
+            chroma_config=app.state.chroma_config,
+            encode_config=app.state.encode_config,
+            log_level=settings.LOG_LEVEL,
+            log_format=settings.LOG_FORMAT,
+        )
+
+
+async def _load_image_processing(app: FastAPI) -> None:
+    """
+    Load the background-removal model in the background after startup, so the
+    app answers immediately and /readyz turns green once images can be processed:
+    either in every worker of the image process pool, or in this process.
+    """
+    status = app.state.image_status
+    started = time.perf_counter()
+
+    if app.state.image_pool:
+        loaded = await app.state.image_pool.start()
+        logger.info(f"Started {settings.IMAGE_WORKERS} image workers ({loaded} with rembg model '{settings.REMBG_MODEL}') in {time.perf_counter() - started:.2f}s")
+        status["loaded"] = loaded > 0
+        status["detail"] = f"{loaded} of {settings.IMAGE_WORKERS} workers loaded '{settings.REMBG_MODEL}'"
+        return
+
+    try:
+        app.state.rembg_session = await run_in_threadpool(
+            create_session,
+            settings.REMBG_MODEL,
+            settings.REMBG_INTRA_OP_THREADS,
+            settings.REMBG_INTER_OP_THREADS,
+        )
+        logger.info(f"Loaded rembg model '{settings.REMBG_MODEL}' in {time.perf_counter() - started:.2f}s")
+        if settings.REMBG_WARMUP:
+            warmup_seconds = await run_in_threadpool(warm_up, app.state.rembg_session)
+            logger.info(f"rembg warm-up inference took {warmup_seconds:.2f}s")
+        status["loaded"] = True
+        status["detail"] = f"loaded '{settings.REMBG_MODEL}'"
+    except Exception as e:
+        # Background removal falls back to the original images, so keep serving
+        logger.warning(f"Failed to load rembg model '{settings.REMBG_MODEL}': {e}")
+        status["detail"] = f"failed to load '{settings.REMBG_MODEL}': {e}"
+
+
+async def _image_processing_ready() -> None:
+    """Wait for the background model load; requests that arrive during startup queue here instead of failing."""
+    loader = app.state.image_loader
+    if not loader.done():
+        await asyncio.shield(loader)
+
+
+def _register_gauges(app: FastAPI) -> None:
+    """Gauges are read at scrape time from the live objects in app.state."""
+
+    def inflight():
+        values = {
+            ("upstream_polls",): app.state.poller.outstanding(),
+            ("generations",): app.state.flights.inflight(),
+            ("room_jobs",): sum(1 for job in app.state.jobs.values() if not job.done),
+            ("room_connections",): app.state.rooms.connections(),
+        }
+        for kind, slots in app.state.governor.slots.items():
+            values[(f"{kind}_jobs",)] = slots.active
+        if app.state.image_pool:
+            values[("images",)] = min(app.state.image_pool.pending, app.state.image_pool.workers)
+        return values
+
+    def queue_depth():
+        values = {(f"{kind}_jobs",): slots.waiting() for kind, slots in app.state.governor.slots.items()}
+        values[("room_sends",)] = app.state.rooms.queued()
+        if app.state.image_pool:
+            values[("images",)] = max(0, app.state.image_pool.pending - app.state.image_pool.workers)
+        return values
+
+    INFLIGHT.set_function(inflight)
+    QUEUE_DEPTH.set_function(queue_depth)
 
-app = FastAPI(title="Orbella Bingo - Scenario API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One keep-alive pool and one client per model for the lifetime of the app
+    app.state.http = create_http_client(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        timeout=settings.HTTP_TIMEOUT,
+        connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+        http2=settings.HTTP2_ENABLED,
+    )
+    app.state.assets = AssetStore(settings.ASSET_DIR)
+    app.state.cache = ResultCache(
+        settings.CACHE_DIR,
+        max_memory_bytes=settings.CACHE_MEMORY_MB * 1024 * 1024,
+        default_ttl=settings.CACHE_TTL,
+        assets=app.state.assets,
+    )
+    _setup_image_processing(app)
+    app.state.image_loader = asyncio.create_task(_load_image_processing(app))
+    app.state.transcoder = VideoTranscoder(
+        app.state.assets,
+        TranscodeConfig(
+            ffmpeg=settings.FFMPEG_PATH,
+            workers=settings.VIDEO_TRANSCODE_WORKERS,
+            mobile_height=settings.VIDEO_MOBILE_HEIGHT,
+            webm=settings.VIDEO_WEBM,
+            av1=settings.VIDEO_AV1,
+        ),
+    )
+    if settings.VIDEO_DOWNLOAD_ENABLED and not app.state.transcoder.enabled:
+        logger.warning(f"ffmpeg not found at '{settings.FFMPEG_PATH}'; downloaded videos will be served untranscoded")
+    app.state.jobs = OrderedDict()
+    app.state.rooms = RoomHub(
+        max_rooms=settings.ROOM_MAX_ROOMS,
+        call_interval=settings.ROOM_CALL_INTERVAL,
+        intermission=settings.ROOM_INTERMISSION,
+        queue_size=settings.ROOM_SEND_QUEUE,
+        replay_size=settings.ROOM_REPLAY_EVENTS,
+        idle_timeout=settings.ROOM_IDLE_SECONDS,
+        max_cards=settings.ROOM_MAX_CARDS,
+    )
+    app.state.flights = SingleFlight()
+    app.state.claims = ClaimStore(settings.CLAIM_DIR, stale_after=settings.CLAIM_STALE_AFTER)
+    app.state.governor = UpstreamGovernor(
+        job_limits={"video": settings.UPSTREAM_MAX_VIDEO_JOBS, "image": settings.UPSTREAM_MAX_IMAGE_JOBS},
+        rate=settings.UPSTREAM_RATE,
+        burst=settings.UPSTREAM_BURST,
+        max_retries=settings.UPSTREAM_MAX_RETRIES,
+        retry_base=settings.UPSTREAM_RETRY_BASE,
+        retry_max=settings.UPSTREAM_RETRY_MAX,
+    )
+    app.state.poller = JobPoller(
+        app.state.http,
+        profiles={
+            "image": PollProfile(
+                initial=settings.POLL_IMAGE_INITIAL,
+                maximum=settings.POLL_IMAGE_MAX,
+                factor=1.5,
+                deadline=settings.POLL_IMAGE_DEADLINE,
+            ),
+            "video": PollProfile(
+                initial=settings.POLL_VIDEO_INITIAL,
+                maximum=settings.POLL_VIDEO_MAX,
+                factor=1.3,
+                deadline=settings.POLL_VIDEO_DEADLINE,
+            ),
+        },
+        max_concurrency=settings.POLL_MAX_CONCURRENCY,
+        rate_limiter=app.state.governor.bucket,
+        cancel_abandoned=settings.UPSTREAM_CANCEL_ABANDONED,
+    )
+    app.state.asset_resolver = None
+    app.state.credential_check = None
+    app.state.video_client = None
+    app.state.image_client = None
+    credentials = _scenario_credentials()
+    if credentials:
+        api_key, api_secret = credentials
+        # One resolver for both clients, so a signed URL looked up once is reused by everyone
+        app.state.asset_resolver = AssetResolver(
+            app.state.http,
+            app.state.governor,
+            (api_key, api_secret),
+            f"{settings.SCENARIO_API_BASE.rstrip('/')}/assets",
+            default_ttl=settings.ASSET_URL_TTL,
+            expiry_margin=settings.ASSET_URL_EXPIRY_MARGIN,
+        )
+        app.state.video_client = ScenarioVideoGenerator(
+            api_key=api_key,
+            api_secret=api_secret,
+            model_id="model_veo3-1",
+            resolution="1080p",
+            http_client=app.state.http,
+            poller=app.state.poller,
+            governor=app.state.governor,
+            max_download_bytes=settings.FETCH_MAX_VIDEO_BYTES,
+            download_chunk_size=settings.FETCH_CHUNK_BYTES,
+            download_part_size=settings.VIDEO_DOWNLOAD_PART_BYTES,
+            download_concurrency=settings.VIDEO_DOWNLOAD_CONCURRENCY,
+            api_base=settings.SCENARIO_API_BASE,
+            asset_resolver=app.state.asset_resolver,
+        )
+        app.state.image_client = ScenarioImageGenerator(
+            api_key=api_key,
+            api_secret=api_secret,
+            http_client=app.state.http,
+            poller=app.state.poller,
+            governor=app.state.governor,
+            api_base=settings.SCENARIO_API_BASE,
+            asset_resolver=app.state.asset_resolver,
+        )
+        # Reading our own model's record is the cheapest authenticated call
+        app.state.credential_check = CredentialCheck(
+            app.state.http,
+            f"{settings.SCENARIO_API_BASE.rstrip('/')}/models/{app.state.video_client.model_id}",
+            (api_key, api_secret),
+            interval=settings.READY_CREDENTIALS_INTERVAL,
+        )
+    else:
+        logger.warning("Scenario API credentials are not set; generation endpoints will return 500.")
+    app.state.prewarmer = Prewarmer(
+        ThemeStats(settings.PREWARM_STATS_PATH, half_life=settings.PREWARM_HALF_LIFE_HOURS * 3600, max_themes=settings.PREWARM_MAX_THEMES),
+        app.state.claims,
+        missing_parts=_missing_room_parts,
+        warm_part=_prewarm_part,
+        seeds=[normalize_theme(t) for t in settings.PREWARM_SEED_THEMES],
+        top_n=settings.PREWARM_TOP_N,
+        interval=settings.PREWARM_INTERVAL,
+        idle_after=settings.PREWARM_IDLE_SECONDS,
+        budget=settings.PREWARM_BUDGET,
+        budget_window=settings.PREWARM_BUDGET_WINDOW,
+        concurrency=settings.PREWARM_CONCURRENCY,
+    )
+    if settings.PREWARM_ENABLED and credentials:
+        app.state.prewarmer.start()
+    _register_gauges(app)
+    try:
+        yield
+    finally:
+        app.state.image_loader.cancel()
+        await app.state.rooms.aclose()
+        await app.state.prewarmer.aclose()
+        if app.state.image_pool:
+            app.state.image_pool.shutdown()
+        await app.state.poller.aclose()
+        await app.state.http.aclose()
+
+
+def _require_client(name: str):
+    client = getattr(app.state, name, None)
+    if client is None:
+        raise HTTPException(status_code=500, detail="Scenario API credentials are not set in environment variables.")
+    return client
+
+
+def _require_admin(request: Request) -> None:
+    """Guard for endpoints that could cost money if anyone could call them (e.g. wiping the result cache)."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them.")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.strip().encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required.", headers={"WWW-Authenticate": "Bearer"})
+
+
+app = FastAPI(title="Orbella Bingo - Scenario API", lifespan=lifespan)
+
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Image processing is at capacity: {exc}"},
+        headers={"Retry-After": str(settings.IMAGE_RETRY_AFTER)},
+    )
+
+@app.exception_handler(UpstreamThrottled)
+async def upstream_throttled_handler(request: Request, exc: UpstreamThrottled):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Scenario is rate limiting us: {exc}"},
+        headers={"Retry-After": str(int(exc.retry_after or settings.UPSTREAM_RETRY_MAX))},
+    )
 
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*")
 origins = [o.strip() for o in allowed_origins.split(",") if o.strip()]
@@ -27,6 +351,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
+)
+app.add_middleware(
+    RequestContextMiddleware,
+    on_complete=lambda method, route, status, seconds: HTTP_REQUEST_SECONDS.observe(
+        seconds, method=method, route=route, status=str(status)
+    ),
 )
 
 
@@ -44,213 +375,858 @@ def root():
     return {"status": "ok"}
 
 
-@app.post("/scenario/generate")
-def generate_video(req: GenerateRequest):
-    api_key = os.getenv("SCENARIO_ID") or os.getenv("SCENARIO_API_KEY") or "YOUR_API_KEY"
-    api_secret = os.getenv("SCENARIO_SECRET") or os.getenv("SCENARIO_API_SECRET") or "YOUR_API_SECRET"
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: image processing is loaded and Scenario accepts our credentials."""
+    image_status = app.state.image_status
+    checks = {
+        "image_processing": {"ok": app.state.image_loader.done() and image_status["loaded"], "detail": image_status["detail"]},
+    }
+    credential_check: Optional[CredentialCheck] = app.state.credential_check
+    if credential_check is None:
+        checks["credentials"] = {"ok": False, "detail": "Scenario API credentials are not set"}
+    else:
+        valid = await credential_check.check()
+        checks["credentials"] = {"ok": bool(valid), "detail": credential_check.detail}
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse({"ready": ready, "checks": checks}, status_code=200 if ready else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage latencies, cache hit rate, fallbacks and queue depths."""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+def normalize_theme(theme: str) -> str:
+    """Collapse case and whitespace so trivially different themes share one generation."""
+    return " ".join((theme or "").split()).lower()
+
+
+def video_spec(theme: str) -> Dict[str, Any]:
+    """Everything that determines the generated video; hashed into its cache key."""
+    client = _require_client("video_client")
+    return {
+        "kind": "video",
+        "prompt": get_prompt(normalize_theme(theme)),
+        "model_id": client.model_id,
+        "aspect_ratio": "16:9",
+        "resolution": client.resolution,
+        "duration": 8,
+        "generate_audio": False,
+    }
+
+
+def card_spec(theme: str) -> Dict[str, Any]:
+    return {
+        "kind": "card",
+        "prompt": get_card_prompt(normalize_theme(theme)),
+        "model_id": _require_client("image_client").model_id,
+        "aspect_ratio": "9:16",
+        "resolution": "1K",
+    }
+
+
+def ball_caller_spec(theme: str) -> Dict[str, Any]:
+    return {
+        "kind": "ball_caller",
+        "prompt": get_ball_caller_prompt(normalize_theme(theme)),
+        "model_id": _require_client("image_client").model_id,
+        # Use 16:9 aspect ratio for the elongated capsule shape
+        "aspect_ratio": "16:9",
+        "resolution": "1K",
+    }
+
+
+async def _cached_build(spec: Dict[str, Any], producer, theme: str) -> Dict[str, Any]:
+    """
+    Serve a spec from the result cache, or run producer() and store its result.
+    producer returns (result, ttl); ttl=None uses the cache default.
+
+    Concurrent requests for the same spec share one producer run, in this
+    process via SingleFlight and across workers via the claim store. If every
+    requester goes away the run is cancelled, unless the theme is one the
+    prewarmer would generate anyway, in which case it finishes into the cache.
+    """
+    cache: ResultCache = app.state.cache
+    key = cache_key(**spec)
+
+    async def lookup():
+        hit = await run_in_threadpool(cache.get, key)
+        if hit is not None:
+            logger.info(f"Cache hit for {spec['kind']} ({key[:12]})")
+            return {**hit, "cached": True}
+        return None
+
+    async def produce():
+        result, ttl = await producer()
+        if result.get("asset_urls"):
+            await run_in_threadpool(cache.put, key, result, ttl)
+        return {**result, "cached": False}
+
+    hit = await lookup()
+    CACHE_LOOKUPS.inc(kind=spec["kind"], result="hit" if hit is not None else "miss")
+    if hit is not None:
+        return hit
+    return await app.state.flights.do(
+        key,
+        lambda: run_claimed(app.state.claims, key, lookup, produce, poll_interval=settings.CLAIM_POLL_INTERVAL),
+        keep_if_abandoned=lambda: settings.PREWARM_ENABLED and app.state.prewarmer.adopt(normalize_theme(theme)),
+    )
+
+
+async def build_video(theme: str, on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    spec = video_spec(theme)
+    return await _cached_build(spec, lambda: _produce_video(spec, on_progress), theme)
 
-    if api_key == "YOUR_API_KEY" or api_secret == "YOUR_API_SECRET":
-        raise HTTPException(status_code=500, detail="Scenario API credentials are not set in environment variables.")
 
-    client = ScenarioVideoGenerator(
-        api_key=api_key,
-        api_secret=api_secret,
-        model_id="model_veo3-1",
-        resolution="1080p",
+async def _produce_video(spec: Dict[str, Any], on_progress: Optional[Callable[[float], None]] = None):
+    client = _require_client("video_client")
+
+    data = await client.generate_video(
+        prompt=spec["prompt"],
+        generate_audio=spec["generate_audio"],
+        aspect_ratio=spec["aspect_ratio"],
+        duration=spec["duration"],
+        on_progress=on_progress,
     )
+    if not data:
+        raise HTTPException(status_code=502, detail="Failed to generate video.")
+
+    job = data.get("job") or {}
+    asset_ids = (job.get("metadata") or {}).get("assetIds", [])
+    # Try to resolve directly playable URLs for convenience
+    with STAGE_SECONDS.time(stage="asset_url", model=client.model_id):
+        resolved = await client.assets.resolve_many(asset_ids, job)
+    asset_urls: List[str] = [url for url in resolved if url]
+
+    videos: List[Optional[Dict[str, str]]] = []
+    if settings.VIDEO_DOWNLOAD_ENABLED and asset_ids:
+        videos = await asyncio.gather(*(_localize_video(client, aid) for aid in asset_ids))
+
+    result = {
+        "job": job,
+        "asset_ids": asset_ids,
+        "asset_urls": asset_urls,
+    }
+    if videos and all(videos):
+        # Served from the asset store from now on, so the result never goes stale
+        result["asset_urls"] = [playable_url(v) for v in videos]
+        result["videos"] = videos
+        return result, None
+    # Playable URLs are signed upstream URLs, so only keep them while they stay valid
+    return result, settings.CACHE_SIGNED_URL_TTL
 
+
+async def _localize_video(client: ScenarioVideoGenerator, asset_id: str) -> Optional[Dict[str, str]]:
+    """
+    Download a generated video with parallel, resumable Range requests and
+    transcode it into the asset store. Returns {variant: /assets URL} or None on failure.
+    """
     try:
-        prompt_text = get_prompt(req.theme)
-        data = client.generate_video(
-            prompt=prompt_text,
-            generate_audio=False,
-            aspect_ratio="16:9",
-            duration=8,
+        started = time.perf_counter()
+        path = await client.download_asset(asset_id, settings.VIDEO_DOWNLOAD_DIR)
+        if not path:
+            FALLBACKS.inc(kind="video_localize")
+            return None
+        downloaded = time.perf_counter()
+        STAGE_SECONDS.observe(downloaded - started, stage="video_download", model=client.model_id)
+        ext = os.path.splitext(path)[1].lstrip(".") or "mp4"
+        variants = await app.state.transcoder.transcode(path, ext)
+        STAGE_SECONDS.observe(time.perf_counter() - downloaded, stage="video_transcode", model="ffmpeg")
+        if playable_url(variants) is None:
+            # Only a poster came out; the room needs something it can play
+            FALLBACKS.inc(kind="video_localize")
+            logger.warning(f"Video {asset_id}: no playable variant among {sorted(variants)}")
+            return None
+        logger.info(
+            f"Video {asset_id}: downloaded in {downloaded - started:.1f}s, "
+            f"transcoded {len(variants)} variants in {time.perf_counter() - downloaded:.1f}s"
         )
-        if not data:
-            raise HTTPException(status_code=502, detail="Failed to generate video.")
-
-        job = data.get("job") or {}
-        asset_ids = (job.get("metadata") or {}).get("assetIds", [])
-        # Try to resolve directly playable URLs for convenience
-        asset_urls: List[str] = []
-        for aid in asset_ids:
-            try:
-                url = client.get_asset_url(aid)
-                if url:
-                    asset_urls.append(url)
-            except Exception:
-                pass
-
-        downloaded_paths: List[str] = []
-        # Optional: enable download via query flag in future if needed
-        if False and asset_ids:
-            project_root = os.path.dirname(__file__)
-            out_dir = os.path.join(project_root, "video")
-            os.makedirs(out_dir, exist_ok=True)
-            for aid in asset_ids:
-                path = client.download_asset(aid, out_dir)
-                if path:
-                    downloaded_paths.append(path)
-
-        return {
-            "job": job,
-            "asset_ids": asset_ids,
-            "asset_urls": asset_urls,
-            "downloaded": downloaded_paths,
-        }
-    except HTTPException:
-        raise
+        return variants
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        FALLBACKS.inc(kind="video_localize")
+        logger.warning(f"Failed to localize video {asset_id}: {e}")
+        return None
 
 
-def remove_background_from_url(image_url: str) -> Optional[str]:
+async def remove_background_from_url(image_url: str) -> Optional[str]:
     """
-    Download image from URL, remove background, and return as base64 data URL.
-    Returns None if processing fails.
+    Download image from URL, remove background, store the encoded variants in
+    the asset store and return the /images URL path. Returns None if processing fails.
     """
     try:
-        # Download the image
-        response = req_lib.get(image_url, timeout=30)
-        response.raise_for_status()
-        
-        # Open image with PIL
-        input_image = Image.open(io.BytesIO(response.content))
-        
-        # Remove background using rembg
-        output_image = remove(input_image)
-        
-        # Convert to PNG bytes
-        output_buffer = io.BytesIO()
-        output_image.save(output_buffer, format='PNG')
-        output_buffer.seek(0)
-        
-        # Convert to base64 data URL
-        image_base64 = base64.b64encode(output_buffer.read()).decode('utf-8')
-        data_url = f"data:image/png;base64,{image_base64}"
-        
-        return data_url
+        await _image_processing_ready()
+        pool = app.state.image_pool
+        if pool:
+            # The upstream image is already paid for, so queue for a worker rather than shed it.
+            # The slot is reserved before the download, so queued images stay off the spool disk
+            await pool.acquire_slot()
+            path = None
+            try:
+                try:
+                    # Stream to a temp file and hand the worker its path, so the image never sits in this process
+                    path = spool_path(settings.FETCH_SPOOL_DIR)
+                    with STAGE_SECONDS.time(stage="image_download", model=""):
+                        await fetch_to_file(
+                            app.state.http,
+                            image_url,
+                            path,
+                            max_bytes=settings.FETCH_MAX_IMAGE_BYTES,
+                            content_types=IMAGE_CONTENT_TYPES,
+                            chunk_size=settings.FETCH_CHUNK_BYTES,
+                        )
+                except BaseException:
+                    pool.release_slot()
+                    raise
+                with STAGE_SECONDS.time(stage="background_removal", model=settings.REMBG_MODEL):
+                    return await pool.remove_background(path, reserved=True)
+            finally:
+                if path is not None:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+        started = time.perf_counter()
+        async with fetch_spooled(
+            app.state.http,
+            image_url,
+            max_bytes=settings.FETCH_MAX_IMAGE_BYTES,
+            spool_bytes=settings.FETCH_SPOOL_BYTES,
+            content_types=IMAGE_CONTENT_TYPES,
+            chunk_size=settings.FETCH_CHUNK_BYTES,
+        ) as (spool, _content_type):
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="image_download", model="")
+            # Only the rembg/PIL work needs a thread; the download stays on the event loop
+            timings: Dict[str, float] = {}
+            with STAGE_SECONDS.time(stage="background_removal", model=settings.REMBG_MODEL):
+                url = await run_in_threadpool(
+                    remove_background_to_store,
+                    spool,
+                    app.state.assets,
+                    app.state.rembg_session,
+                    app.state.chroma_config,
+                    app.state.encode_config,
+                    timings,
+                )
+            record_timings(timings, settings.REMBG_MODEL)
+            return url
     except Exception as e:
-        print(f"Background removal failed: {e}")
+        logger.warning(f"Background removal failed: {e}")
         return None
 
 
-@app.post("/scenario/generate-card")
-def generate_card_image(req: CardGenerateRequest):
-    api_key = os.getenv("SCENARIO_ID") or os.getenv("SCENARIO_API_KEY") or "YOUR_API_KEY"
-    api_secret = os.getenv("SCENARIO_SECRET") or os.getenv("SCENARIO_API_SECRET") or "YOUR_API_SECRET"
+async def _produce_ui_image(spec: Dict[str, Any], label: str, on_progress: Optional[Callable[[float], None]] = None):
+    """Generate a chroma-keyed UI image and strip its background."""
+    client = _require_client("image_client")
 
-    if api_key == "YOUR_API_KEY" or api_secret == "YOUR_API_SECRET":
-        raise HTTPException(status_code=500, detail="Scenario API credentials are not set in environment variables.")
+    data = await client.generate_image(
+        prompt=spec["prompt"],
+        aspect_ratio=spec["aspect_ratio"],
+        resolution=spec["resolution"],
+        on_progress=on_progress,
+    )
+    if not data:
+        raise HTTPException(status_code=502, detail=f"Failed to generate {label} image.")
+
+    job = data.get("job") or {}
+    asset_ids = (job.get("metadata") or {}).get("assetIds", [])
+
+    with STAGE_SECONDS.time(stage="asset_url", model=client.model_id):
+        resolved = await client.assets.resolve_many(asset_ids, job)
+    asset_urls: List[str] = [url for url in resolved if url]
+
+    async def process(url: str) -> str:
+        # Remove background from the generated image
+        bg_removed_url = await remove_background_from_url(url)
+        if bg_removed_url:
+            return bg_removed_url
+        # Fallback to original if background removal fails
+        FALLBACKS.inc(kind="background_removal")
+        logger.warning(f"Background removal failed for a {label} image, using original image")
+        return url
+
+    logger.info(f"Removing background from {len(asset_urls)} {label} image(s)...")
+    processed_urls: List[str] = list(await asyncio.gather(*(process(url) for url in asset_urls)))
+
+    result = {
+        "job": job,
+        "asset_ids": asset_ids,
+        "asset_urls": processed_urls if processed_urls else asset_urls,  # Use processed URLs with bg removed
+        "original_urls": asset_urls,  # Keep original URLs as backup
+    }
+    # Fully processed images live in the cache; any upstream fallback URL expires with its signature
+    fully_processed = bool(processed_urls) and all(u.startswith(IMAGE_URL_PREFIX) for u in processed_urls)
+    return result, None if fully_processed else settings.CACHE_SIGNED_URL_TTL
+
+
+async def build_card(theme: str, on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    spec = card_spec(theme)
+    return await _cached_build(spec, lambda: _produce_ui_image(spec, label="card", on_progress=on_progress), theme)
 
-    client = ScenarioImageGenerator(api_key=api_key, api_secret=api_secret)
 
+async def build_ball_caller(theme: str, on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    spec = ball_caller_spec(theme)
+    logger.debug(f"Generating ball caller with prompt: {spec['prompt']}")
+    return await _cached_build(spec, lambda: _produce_ui_image(spec, label="ball caller", on_progress=on_progress), theme)
+
+
+ROOM_PARTS = {
+    "video": build_video,
+    "card": build_card,
+    "ball_caller": build_ball_caller,
+}
+
+ROOM_SPECS = {
+    "video": video_spec,
+    "card": card_spec,
+    "ball_caller": ball_caller_spec,
+}
+
+
+async def _missing_room_parts(theme: str) -> List[str]:
+    """Room parts for a theme that are not in the result cache yet."""
+    missing = []
+    for name, spec in ROOM_SPECS.items():
+        if await run_in_threadpool(app.state.cache.get, cache_key(**spec(theme))) is None:
+            missing.append(name)
+    return missing
+
+
+async def _prewarm_part(theme: str, part: str) -> bool:
+    """Generate one room part into the cache; returns False if it was already there."""
+    # Queue behind players for upstream job slots
+    with priority(PRIORITY_BACKGROUND):
+        result = await ROOM_PARTS[part](theme)
+    return not result.get("cached")
+
+
+def _check_image_capacity() -> None:
+    """
+    Shed load before starting upstream work that could not be post-processed.
+    This is the only place PoolSaturated is raised: once an upstream image is paid for it waits for a worker.
+    """
+    pool = app.state.image_pool
+    if pool is not None and pool.saturated():
+        raise PoolSaturated(f"{pool.pending} images already queued for processing")
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has already been read, so the next ASGI message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _unless_disconnected(request: Request, work) -> Any:
+    """
+    Await work, cancelling it if the client hangs up first. Cancellation runs
+    down through polling, downloads and queued image work; shared generations
+    keep going for any other waiters.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
     try:
-        prompt_text = get_card_prompt(req.theme)
-        data = client.generate_image(prompt=prompt_text, aspect_ratio="9:16", resolution="1K")
-        if not data:
-            raise HTTPException(status_code=502, detail="Failed to generate card image.")
-
-        job = data.get("job") or {}
-        asset_ids = (job.get("metadata") or {}).get("assetIds", [])
-
-        asset_urls: List[str] = []
-        processed_urls: List[str] = []
-        
-        for aid in asset_ids:
-            try:
-                url = client.get_asset_url(aid)
-                if url:
-                    asset_urls.append(url)
-                    
-                    # Remove background from the generated card
-                    print(f"Removing background from card image...")
-                    bg_removed_url = remove_background_from_url(url)
-                    
-                    if bg_removed_url:
-                        processed_urls.append(bg_removed_url)
-                        print(f"Background removed successfully!")
-                    else:
-                        # Fallback to original if background removal fails
-                        processed_urls.append(url)
-                        print(f"Background removal failed, using original image")
-            except Exception as e:
-                print(f"Error processing asset {aid}: {e}")
-                pass
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        logger.info(f"Client disconnected from {request.url.path}; cancelling its work")
+        CANCELLATIONS.inc(kind="request")
+        # Nobody reads this; nginx's "client closed request" keeps the access logs honest
+        return Response(status_code=499)
+    finally:
+        watcher.cancel()
+        task.cancel()
 
-        return {
-            "job": job,
-            "asset_ids": asset_ids,
-            "asset_urls": processed_urls if processed_urls else asset_urls,  # Use processed URLs with bg removed
-            "original_urls": asset_urls,  # Keep original URLs as backup
-        }
-    except HTTPException:
+
+async def _run_endpoint(builder, theme: str, request: Request) -> Dict[str, Any]:
+    try:
+        with app.state.prewarmer.player_request(normalize_theme(theme)):
+            return await _unless_disconnected(request, builder(theme))
+    except (HTTPException, PoolSaturated, UpstreamThrottled):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _run_room_part(name: str, theme: str, on_progress: Optional[Callable[[str, float], None]] = None):
+    """Run one room part, capturing its failure instead of raising."""
+    part_progress = (lambda fraction: on_progress(name, fraction)) if on_progress else None
+    try:
+        return name, await ROOM_PARTS[name](theme, on_progress=part_progress), None
+    except HTTPException as e:
+        return name, None, e.detail
+    except Exception as e:
+        return name, None, str(e)
+
+
+async def iter_room_parts(theme: str, parts: Optional[List[str]] = None, on_progress: Optional[Callable[[str, float], None]] = None):
+    """Start every room part at once and yield (name, result, error) as each one finishes."""
+    tasks = [asyncio.create_task(_run_room_part(name, theme, on_progress)) for name in (parts or ROOM_PARTS)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/scenario/generate")
+async def generate_video(req: GenerateRequest, request: Request):
+    return await _run_endpoint(build_video, req.theme, request)
+
+
+@app.post("/scenario/generate-card")
+async def generate_card_image(req: CardGenerateRequest, request: Request):
+    _check_image_capacity()
+    return await _run_endpoint(build_card, req.theme, request)
+
+
 class BallCallerGenerateRequest(BaseModel):
     theme: str
 
 
 @app.post("/scenario/generate-ball-caller")
-def generate_ball_caller_image(req: BallCallerGenerateRequest):
-    api_key = os.getenv("SCENARIO_ID") or os.getenv("SCENARIO_API_KEY") or "YOUR_API_KEY"
-    api_secret = os.getenv("SCENARIO_SECRET") or os.getenv("SCENARIO_API_SECRET") or "YOUR_API_SECRET"
+async def generate_ball_caller_image(req: BallCallerGenerateRequest, request: Request):
+    _check_image_capacity()
+    return await _run_endpoint(build_ball_caller, req.theme, request)
 
-    if api_key == "YOUR_API_KEY" or api_secret == "YOUR_API_SECRET":
-        raise HTTPException(status_code=500, detail="Scenario API credentials are not set in environment variables.")
 
-    client = ScenarioImageGenerator(api_key=api_key, api_secret=api_secret)
+class RoomGenerateRequest(BaseModel):
+    theme: str
+    # Stream one NDJSON line per part as it completes instead of a single manifest
+    stream: bool = False
 
-    try:
-        prompt_text = get_ball_caller_prompt(req.theme)
-        print(f"Generating ball caller with prompt: {prompt_text}")
-        
-        # Use 16:9 aspect ratio for the elongated capsule shape
-        data = client.generate_image(prompt=prompt_text, aspect_ratio="16:9", resolution="1K")
-        if not data:
-            raise HTTPException(status_code=502, detail="Failed to generate ball caller image.")
 
-        job = data.get("job") or {}
-        asset_ids = (job.get("metadata") or {}).get("assetIds", [])
+@app.post("/scenario/generate-room")
+async def generate_room(req: RoomGenerateRequest, request: Request):
+    """Generate the video, card and ball caller for a theme concurrently."""
+    _require_client("video_client")
+    _check_image_capacity()
 
-        asset_urls: List[str] = []
-        processed_urls: List[str] = []
-        
-        for aid in asset_ids:
-            try:
-                url = client.get_asset_url(aid)
-                if url:
-                    asset_urls.append(url)
-                    
-                    # Remove background from the generated ball caller
-                    print(f"Removing background from ball caller image...")
-                    bg_removed_url = remove_background_from_url(url)
-                    
-                    if bg_removed_url:
-                        processed_urls.append(bg_removed_url)
-                        print(f"Background removed successfully!")
-                    else:
-                        # Fallback to original if background removal fails
-                        processed_urls.append(url)
-                        print(f"Background removal failed, using original image")
-            except Exception as e:
-                print(f"Error processing asset {aid}: {e}")
-                pass
+    if req.stream:
+        async def ndjson():
+            manifest = {"theme": req.theme, "errors": {}}
+            with app.state.prewarmer.player_request(normalize_theme(req.theme)):
+                async for name, result, error in iter_room_parts(req.theme):
+                    manifest[name] = result
+                    if error:
+                        manifest["errors"][name] = error
+                    yield json.dumps({"part": name, "result": result, "error": error}) + "\n"
+            yield json.dumps({"part": "manifest", "result": manifest, "error": None}) + "\n"
+
+        # StreamingResponse cancels ndjson() itself when the client disconnects
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
+    manifest: Dict[str, Any] = {"theme": req.theme, "errors": {}}
+
+    async def collect():
+        async for name, result, error in iter_room_parts(req.theme):
+            manifest[name] = result
+            if error:
+                manifest["errors"][name] = error
+
+    with app.state.prewarmer.player_request(normalize_theme(req.theme)):
+        disconnected = await _unless_disconnected(request, collect())
+    if disconnected is not None:
+        return disconnected
+    if len(manifest["errors"]) == len(ROOM_PARTS):
+        raise HTTPException(status_code=502, detail=manifest["errors"])
+    return manifest
+
+
+class GenerationJob:
+    """A room generation running in the background, observable via /jobs."""
+
+    def __init__(self, theme: str, parts: List[str]):
+        self.id = uuid.uuid4().hex
+        self.theme = theme
+        self.parts = parts
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, float] = {name: 0.0 for name in parts}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[asyncio.Task] = None
+        # Last time anyone polled the job or had its event stream open
+        self.seen_at = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        message = {"id": len(self.events) + 1, "event": event, "data": data}
+        self.events.append(message)
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+    def on_progress(self, part: str, fraction: float) -> None:
+        # Skip duplicate ticks so the event log stays small for long video jobs
+        if abs(fraction - self.progress.get(part, 0.0)) < 0.005:
+            return
+        self.progress[part] = fraction
+        self.publish("progress", {"part": part, "progress": fraction})
+
+    def snapshot(self) -> Dict[str, Any]:
         return {
-            "job": job,
-            "asset_ids": asset_ids,
-            "asset_urls": processed_urls if processed_urls else asset_urls,
-            "original_urls": asset_urls,
+            "job_id": self.id,
+            "theme": self.theme,
+            "status": self.status,
+            "parts": self.parts,
+            "progress": self.progress,
+            "results": self.results,
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
         }
-    except HTTPException:
+
+
+def _prune_jobs() -> None:
+    """Drop finished jobs past their retention window, and the oldest ones beyond the cap."""
+    jobs: "OrderedDict[str, GenerationJob]" = app.state.jobs
+    now = time.time()
+    for job_id, job in list(jobs.items()):
+        if job.done and now - job.finished_at > settings.JOB_RETENTION_SECONDS:
+            del jobs[job_id]
+    for job_id, job in list(jobs.items()):
+        if len(jobs) <= settings.JOB_MAX_RETAINED:
+            break
+        if job.done:
+            del jobs[job_id]
+
+
+async def _run_job(job: GenerationJob) -> None:
+    job.status = "running"
+    job.publish("status", {"status": job.status})
+    try:
+        with app.state.prewarmer.player_request(normalize_theme(job.theme)):
+            async for name, result, error in iter_room_parts(job.theme, job.parts, on_progress=job.on_progress):
+                if error:
+                    job.errors[name] = error
+                    job.publish("error", {"part": name, "error": error})
+                else:
+                    job.results[name] = result
+                    job.progress[name] = 1.0
+                    job.publish("asset", {"part": name, "result": result})
+    except asyncio.CancelledError:
+        job.status = "canceled"
+        job.finished_at = time.time()
+        job.publish("done", job.snapshot())
         raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not job.errors:
+        job.status = "success"
+    elif job.results:
+        job.status = "partial"
+    else:
+        job.status = "failure"
+    job.finished_at = time.time()
+    job.publish("done", job.snapshot())
+
+
+async def _cancel_when_abandoned(job: GenerationJob) -> None:
+    """Cancel a running job once nobody has polled it or listened to its events for JOB_ABANDON_SECONDS."""
+    while not job.done:
+        idle = 0.0 if job.subscribers else time.monotonic() - job.seen_at
+        if idle >= settings.JOB_ABANDON_SECONDS:
+            logger.info(f"Job {job.id} abandoned for {idle:.0f}s; cancelling")
+            CANCELLATIONS.inc(kind="room_job")
+            job.task.cancel()
+            return
+        await asyncio.sleep(settings.JOB_ABANDON_SECONDS - idle)
+
+
+def _get_job(job_id: str) -> GenerationJob:
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    job.seen_at = time.monotonic()
+    return job
+
+
+class JobRequest(BaseModel):
+    theme: str
+    # Subset of room parts to generate; defaults to the whole room
+    parts: Optional[List[str]] = None
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: JobRequest):
+    """Start a room generation and return a handle immediately."""
+    parts = req.parts or list(ROOM_PARTS)
+    unknown = [p for p in parts if p not in ROOM_PARTS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown room parts: {unknown}")
+    for name in parts:
+        _require_client("video_client" if name == "video" else "image_client")
+    if any(name != "video" for name in parts):
+        _check_image_capacity()
+
+    _prune_jobs()
+    job = GenerationJob(req.theme, parts)
+    app.state.jobs[job.id] = job
+    job.task = asyncio.create_task(_run_job(job))
+    if settings.JOB_ABANDON_SECONDS > 0:
+        # EventSource reconnects within seconds, so a job nobody comes back for is an abandoned room
+        job.watchdog = asyncio.create_task(_cancel_when_abandoned(job))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return _get_job(job_id).snapshot()
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Stop a running job; parts that another room is also waiting for keep generating for it."""
+    job = _get_job(job_id)
+    if not job.done:
+        CANCELLATIONS.inc(kind="room_job")
+        job.task.cancel()
+    return {"job_id": job.id, "status": job.status if job.done else "canceled"}
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events stream of progress, per-part completion and the final manifest."""
+    job = _get_job(job_id)
+    try:
+        last_seen = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_seen = 0
+
+    def format_event(message: Dict[str, Any]) -> str:
+        return f"id: {message['id']}\nevent: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+    async def stream():
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.append(queue)
+        try:
+            # Replay what the client missed, then follow live events. The slice is
+            # taken right after subscribing, so nothing is lost or sent twice.
+            for message in job.events[last_seen:]:
+                yield format_event(message)
+            if job.done:
+                return
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(message)
+                if message["event"] == "done":
+                    return
+        finally:
+            job.subscribers.remove(queue)
+            job.seen_at = time.monotonic()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/rooms/{room_id}")
+async def room_socket(websocket: WebSocket, room_id: str, since: Optional[int] = None, player: Optional[str] = None, token: Optional[str] = None):
+    """
+    Live ball calls for a room. Every connection to the same room id gets the
+    same draw sequence; reconnect with ?since=<last seq> to replay missed calls,
+    and with ?token= to take back a player id.
+    """
+    if player is not None and not ROOM_ID_RE.match(player):
+        await websocket.close(code=1008, reason="Player ids are 1-64 letters, digits, '-' or '_'")
+        return
+    # Accepted first so refusals reach the client as close reasons instead of a bare 403, and so nothing
+    # awaits between looking the room up and joining it: a room that times out in between would never call again
+    await websocket.accept()
+    try:
+        room = app.state.rooms.room(room_id)
+        sub = room.join(since, player, token)
+    except (ValueError, RoomFull, PlayerTaken) as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    async def read():
+        while True:
+            room.handle(sub, await websocket.receive_text())
+
+    writer = asyncio.create_task(room.pump(sub, websocket.send_text, settings.ROOM_HEARTBEAT_SECONDS, settings.ROOM_SEND_TIMEOUT))
+    reader = asyncio.create_task(read())
+    try:
+        done, _ = await asyncio.wait((writer, reader), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        writer.cancel()
+        reader.cancel()
+        room.leave(sub)
+    for task in done:
+        error = task.exception()
+        if error is not None and not isinstance(error, (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError)):
+            logger.warning(f"Room {room_id} connection failed: {error!r}")
+    if sub.dropped:
+        try:
+            await websocket.close(code=sub.close_code, reason=sub.close_reason)
+        except RuntimeError:
+            pass
+
+
+class CardBatchRequest(BaseModel):
+    count: int = 1
+    # Omit for a fresh batch; the response carries the seed so it can be reproduced
+    seed: Optional[int] = None
+    # Redraw any card that repeats another one in the batch
+    unique: bool = False
+
+
+@app.post("/cards")
+def issue_cards(req: CardBatchRequest):
+    """Issue a batch of cards in one vectorized draw."""
+    if not 1 <= req.count <= settings.CARDS_MAX_BATCH:
+        raise HTTPException(status_code=422, detail=f"count must be between 1 and {settings.CARDS_MAX_BATCH}")
+    if req.seed is not None and req.seed < 0:
+        raise HTTPException(status_code=422, detail="seed must be a non-negative integer")
+    seed = req.seed if req.seed is not None else secrets.randbits(63)
+    with STAGE_SECONDS.time(stage="card_issue", model=""):
+        cards = generate_cards(req.count, seed=seed, unique=req.unique)
+    # JSONResponse directly: FastAPI's encoder is slow on large nested lists
+    return JSONResponse({"seed": seed, "unique": req.unique, "cards": cards.tolist()})
+
+
+class ClaimAuditRequest(BaseModel):
+    # Numbers in the order they were called
+    called: List[int]
+    cards: List[List[int]]
+    # How many numbers had been called when each card claimed; defaults to all of them
+    claimed_at: Optional[List[int]] = None
+
+
+@app.post("/cards/verify")
+def verify_claims(req: ClaimAuditRequest):
+    """
+    Audit a batch of bingo claims against the called sequence in one pass.
+    Results are per card, in request order; bit n of `lines` stands for line_names[n].
+    """
+    if len(req.cards) > settings.CARDS_MAX_BATCH:
+        raise HTTPException(status_code=422, detail=f"At most {settings.CARDS_MAX_BATCH} cards per audit")
+    if any(not 1 <= n <= MAX_NUMBER for n in req.called) or len(set(req.called)) != len(req.called):
+        raise HTTPException(status_code=422, detail=f"called must list distinct numbers from 1 to {MAX_NUMBER}")
+    if req.claimed_at is not None:
+        if len(req.claimed_at) != len(req.cards):
+            raise HTTPException(status_code=422, detail="claimed_at needs one entry per card")
+        out_of_range = [i for i, n in enumerate(req.claimed_at) if not 0 <= n <= len(req.called)]
+        if out_of_range:
+            raise HTTPException(
+                status_code=422,
+                detail={"message": f"claimed_at values must be from 0 to {len(req.called)}", "invalid": out_of_range[:100]},
+            )
+    try:
+        cards = as_cards(req.cards)
+        invalid = validate_cards(cards)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if invalid:
+        raise HTTPException(status_code=422, detail={"message": "Cards break the B-I-N-G-O column rules", "invalid": invalid[:100]})
+
+    with STAGE_SECONDS.time(stage="claim_audit", model=""):
+        valid, won_at, lines = audit_claims(cards, req.called, req.claimed_at)
+    return JSONResponse({
+        "valid_count": int(valid.sum()),
+        "valid": valid.tolist(),
+        "won_at": [None if w == NOT_WON else w for w in won_at.tolist()],
+        "lines": line_bits(lines),
+        "line_names": LINE_NAMES,
+    })
+
+
+def _serve_asset(name: str, request: Request, extra_headers: Optional[Dict[str, str]] = None):
+    store: AssetStore = app.state.assets
+    path = store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Asset not found.")
+
+    etag = store.etag(name)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        **(extra_headers or {}),
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    # FileResponse handles Range / If-Range and keeps our ETag
+    media_type = CONTENT_TYPES.get(name.rsplit(".", 1)[-1], "application/octet-stream")
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@app.api_route("/assets/{name}", methods=["GET", "HEAD"])
+def get_asset(name: str, request: Request):
+    """Serve a processed asset by content hash; names never change meaning, so cache forever."""
+    return _serve_asset(name, request)
+
+
+@app.api_route("/images/{image_id}", methods=["GET", "HEAD"])
+def get_image(image_id: str, request: Request, w: Optional[int] = None, format: Optional[str] = None):
+    """
+    Serve the best encoded variant of a processed image: the format comes from
+    ?format= or the Accept header, the size from ?w= (smallest variant at least that wide).
+    """
+    manifest = load_manifest(app.state.assets, image_id) if AssetStore.valid_name(f"{image_id}.json") else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    variant = choose_variant(manifest, request.headers.get("accept", ""), width=w, fmt=format)
+    return _serve_asset(variant["name"], request, {"Vary": "Accept"})
+
+
+@app.get("/prewarm")
+async def prewarm_status():
+    """Ranked themes the scheduler keeps warm, which parts are still missing, and the remaining budget."""
+    prewarmer: Prewarmer = app.state.prewarmer
+    themes = []
+    for theme in prewarmer.ranked():
+        missing = await _missing_room_parts(theme) if app.state.video_client and app.state.image_client else list(ROOM_PARTS)
+        themes.append({"theme": theme, "missing": missing})
+    return {
+        "enabled": settings.PREWARM_ENABLED,
+        "idle": prewarmer.idle(),
+        "budget_left": prewarmer.budget_left(),
+        "themes": themes,
+        "last_run": prewarmer.last_run,
+    }
+
+
+@app.delete("/cache")
+def clear_cache(request: Request):
+    _require_admin(request)
+    app.state.cache.clear()
+    return {"cleared": True}
+
+
+@app.delete("/cache/{part}")
+def invalidate_cache(request: Request, part: str, theme: str):
+    _require_admin(request)
+    if part not in ROOM_SPECS:
+        raise HTTPException(status_code=404, detail=f"Unknown room part: {part}")
+    removed = app.state.cache.invalidate(cache_key(**ROOM_SPECS[part](theme)))
+    return {"part": part, "theme": theme, "invalidated": removed}
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Image and video post-processing for generated room assets."""
@@ -0,0 +1,139 @@
+"""
+Background removal with a shared, preloaded rembg session.
+
+The ONNX model is resolved and initialized once (create_session) instead of
+on the first request, and a warm-up inference runs before the app reports
+ready so the first card after a deploy is not the slow one. rembg and
+onnxruntime are imported on first use: together with scipy and pymatting
+they take seconds to import, which would otherwise delay every worker start.
+
+Assets drawn on the prompts' #00FF00 backdrop go through the NumPy chroma
+keyer first; rembg only runs when that result fails its own checks.
+"""
+import io
+import logging
+import os
+import time
+from typing import BinaryIO, Dict, Optional, Union
+
+from PIL import Image
+
+from media.chroma import ChromaKeyConfig, chroma_key
+from media.encode import EncodeConfig, encode_to_store
+from media.store import AssetStore
+from metrics import FALLBACKS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def _rembg():
+    # rembg imports pymatting, whose numba TBB threading layer hangs interpreter exit when it is first
+    # initialised off the main thread, which is where the in-process model load runs. rembg only
+    # calls pymatting's parallel code for alpha matting, which we never enable.
+    os.environ.setdefault("NUMBA_THREADING_LAYER", "workqueue")
+    import rembg
+
+    return rembg
+
+
+def create_session(model_name: str = "u2net", intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """
+    Build a rembg session for model_name (u2net, isnet-general-use, silueta, ...).
+    Thread counts of 0 leave the ONNX Runtime defaults in place.
+    """
+    import onnxruntime as ort
+
+    sess_opts = ort.SessionOptions()
+    if intra_op_threads > 0:
+        sess_opts.intra_op_num_threads = intra_op_threads
+    if inter_op_threads > 0:
+        sess_opts.inter_op_num_threads = inter_op_threads
+    return _rembg().new_session(model_name, sess_opts=sess_opts)
+
+
+def warm_up(session) -> float:
+    """Run one inference on a small chroma-green image; returns the time it took."""
+    started = time.perf_counter()
+    _rembg().remove(Image.new("RGB", (320, 320), (0, 255, 0)), session=session)
+    return time.perf_counter() - started
+
+
+# Raw bytes, a file path, or a binary file object positioned at the start
+ImageSource = Union[bytes, str, BinaryIO]
+
+
+def _open_image(source: ImageSource) -> Image.Image:
+    # Paths and file objects are decoded in place; only raw bytes need wrapping
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def cut_out(
+    source: ImageSource,
+    session=None,
+    chroma_config: Optional[ChromaKeyConfig] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """
+    CPU-bound part of background removal; returns the RGBA cut-out.
+    Tries the #00FF00 chroma key first when chroma_config is given and only
+    runs rembg when the keyed result fails its quality checks. Stage durations
+    (chroma_key, rembg) and a chroma_rejected flag are added to `timings`.
+    """
+    if timings is None:
+        timings = {}
+    # Open image with PIL
+    input_image = _open_image(source)
+
+    output_image = None
+    if chroma_config is not None:
+        started = time.perf_counter()
+        output_image, stats = chroma_key(input_image, chroma_config)
+        timings["chroma_key"] = time.perf_counter() - started
+        if output_image is not None:
+            logger.info(f"Chroma key fast path took {(time.perf_counter() - started) * 1000:.0f}ms")
+        else:
+            timings["chroma_rejected"] = 1.0
+            logger.warning(f"Chroma key rejected ({stats['reason']}), falling back to rembg")
+
+    if output_image is None:
+        # Remove background using rembg
+        started = time.perf_counter()
+        output_image = _rembg().remove(input_image, session=session)
+        timings["rembg"] = time.perf_counter() - started
+    return output_image
+
+
+def remove_background(source: ImageSource, session=None, chroma_config: Optional[ChromaKeyConfig] = None) -> bytes:
+    """Remove the background and return the cut-out as PNG bytes."""
+    output_buffer = io.BytesIO()
+    cut_out(source, session, chroma_config).save(output_buffer, format='PNG')
+    return output_buffer.getvalue()
+
+
+def remove_background_to_store(
+    source: ImageSource,
+    store: AssetStore,
+    session=None,
+    chroma_config: Optional[ChromaKeyConfig] = None,
+    encode_config: Optional[EncodeConfig] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> str:
+    """Remove the background and write the encoded variants to the asset store; returns the /images URL path."""
+    if timings is None:
+        timings = {}
+    image = cut_out(source, session, chroma_config, timings)
+    started = time.perf_counter()
+    url = encode_to_store(image, store, encode_config)
+    timings["encode"] = time.perf_counter() - started
+    return url
+
+
+def record_timings(timings: Dict[str, float], model_name: str = "") -> None:
+    """Export the stage durations collected by cut_out/remove_background_to_store."""
+    for stage in ("chroma_key", "rembg", "encode"):
+        if stage in timings:
+            STAGE_SECONDS.observe(timings[stage], stage=stage, model=model_name if stage == "rembg" else "")
+    if timings.get("chroma_rejected"):
+        FALLBACKS.inc(kind="chroma_rejected")
@@ -0,0 +1,127 @@
+"""
+Vectorized chroma keying for assets rendered on a solid #00FF00 background.
+
+The card and ball-caller prompts ask for a flat green backdrop, so most
+images can be keyed with a few NumPy operations instead of a neural network.
+chroma_key() checks its own result and returns None when the backdrop was not
+clean enough, letting the caller fall back to rembg.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class ChromaKeyConfig:
+    def __init__(
+        self,
+        low: int = 40,
+        high: int = 90,
+        min_hue_saturation: float = 0.35,
+        border_width: int = 4,
+        min_border_coverage: float = 0.9,
+        max_soft_fraction: float = 0.04,
+        min_keyed_fraction: float = 0.05,
+        max_keyed_fraction: float = 0.95,
+        max_hole_fraction: float = 0.01,
+    ):
+        # Green dominance (g - max(r, b)) below `low` is foreground, above `high` is background
+        self.low = low
+        self.high = high
+        # Minimum HSV saturation for a pixel to be considered part of the backdrop
+        self.min_hue_saturation = min_hue_saturation
+        self.border_width = border_width
+        self.min_border_coverage = min_border_coverage
+        self.max_soft_fraction = max_soft_fraction
+        self.min_keyed_fraction = min_keyed_fraction
+        self.max_keyed_fraction = max_keyed_fraction
+        # Keyed pixels enclosed by the subject usually mean green artwork, not backdrop
+        self.max_hole_fraction = max_hole_fraction
+
+
+def _alpha_mask(rgb: np.ndarray, config: ChromaKeyConfig) -> np.ndarray:
+    """Soft alpha in [0, 1] from green dominance, restricted to saturated green hues."""
+    r = rgb[..., 0].astype(np.int16)
+    g = rgb[..., 1].astype(np.int16)
+    b = rgb[..., 2].astype(np.int16)
+    max_rb = np.maximum(r, b)
+    dominance = g - max_rb
+
+    # HSV saturation for green-dominant pixels is (g - min(r, b)) / g
+    saturation = (g - np.minimum(r, b)).astype(np.float32) / np.maximum(g, 1)
+    is_key_hue = (dominance > 0) & (saturation >= config.min_hue_saturation)
+
+    span = max(config.high - config.low, 1)
+    keyed = np.clip((dominance - config.low).astype(np.float32) / span, 0.0, 1.0)
+    keyed[~is_key_hue] = 0.0
+    return 1.0 - keyed
+
+
+def _suppress_spill(rgb: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """Clamp green to max(r, b) on soft edges so the backdrop does not bleed into the outline."""
+    out = rgb.copy()
+    edge = (alpha > 0.0) & (alpha < 1.0)
+    if edge.any():
+        r = out[..., 0]
+        b = out[..., 2]
+        limit = np.maximum(r, b)
+        g = out[..., 1]
+        g[edge] = np.minimum(g[edge], limit[edge])
+    return out
+
+
+def _enclosed(keyed: np.ndarray, opaque: np.ndarray) -> np.ndarray:
+    """Keyed pixels with opaque pixels on all four sides along their row and column."""
+    left = np.maximum.accumulate(opaque, axis=1)
+    right = np.maximum.accumulate(opaque[:, ::-1], axis=1)[:, ::-1]
+    up = np.maximum.accumulate(opaque, axis=0)
+    down = np.maximum.accumulate(opaque[::-1, :], axis=0)[::-1, :]
+    return keyed & left & right & up & down
+
+
+def _quality(alpha: np.ndarray, config: ChromaKeyConfig) -> Dict[str, float]:
+    w = config.border_width
+    border = np.concatenate([
+        alpha[:w, :].ravel(),
+        alpha[-w:, :].ravel(),
+        alpha[:, :w].ravel(),
+        alpha[:, -w:].ravel(),
+    ])
+    keyed = alpha < 0.05
+    # The hole check only needs coarse geometry, so run it on every other pixel
+    coarse = alpha[::2, ::2]
+    return {
+        "border_coverage": float(np.mean(border < 0.05)),
+        "keyed_fraction": float(np.mean(keyed)),
+        "soft_fraction": float(np.mean((alpha >= 0.05) & (alpha <= 0.95))),
+        "hole_fraction": float(np.mean(_enclosed(coarse < 0.05, coarse > 0.5))),
+    }
+
+
+def chroma_key(image: Image.Image, config: Optional[ChromaKeyConfig] = None) -> Tuple[Optional[Image.Image], Dict[str, Any]]:
+    """
+    Key out a #00FF00 backdrop. Returns (RGBA image, stats) when the result
+    passes the coverage checks, or (None, stats) with stats["reason"] set.
+    """
+    config = config or ChromaKeyConfig()
+    rgb = np.asarray(image.convert("RGB"), dtype=np.uint8)
+    alpha = _alpha_mask(rgb, config)
+    stats: Dict[str, Any] = _quality(alpha, config)
+
+    if stats["border_coverage"] < config.min_border_coverage:
+        stats["reason"] = f"only {stats['border_coverage']:.0%} of the border is key colour"
+        return None, stats
+    if not config.min_keyed_fraction <= stats["keyed_fraction"] <= config.max_keyed_fraction:
+        stats["reason"] = f"keyed {stats['keyed_fraction']:.0%} of the image"
+        return None, stats
+    if stats["soft_fraction"] > config.max_soft_fraction:
+        stats["reason"] = f"{stats['soft_fraction']:.1%} of pixels are semi-transparent"
+        return None, stats
+    if stats["hole_fraction"] > config.max_hole_fraction:
+        stats["reason"] = f"{stats['hole_fraction']:.1%} of pixels are keyed holes inside the subject"
+        return None, stats
+
+    rgba = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = _suppress_spill(rgb, alpha)
+    rgba[..., 3] = np.round(alpha * 255).astype(np.uint8)
+    return Image.fromarray(rgba), stats
@@ -0,0 +1,135 @@
+"""
+Size-optimized encoding for processed UI assets.
+
+A cut-out is cropped to its alpha bounding box (background removal leaves
+wide transparent margins), then written to the asset store as WebP, AVIF
+when Pillow supports it, and a PNG fallback, at full size plus a few
+downscaled widths for mobile. A small JSON manifest lists the variants;
+/images/{id} uses it to pick the best one for the client's Accept header
+and requested width.
+"""
+import io
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from PIL import Image, features
+
+from media.store import AssetStore
+
+IMAGE_URL_PREFIX = "/images/"
+
+# Preference order when the client accepts several formats
+FORMAT_PREFERENCE = ("avif", "webp", "png")
+FORMAT_MIME = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+
+
+class EncodeConfig:
+    def __init__(
+        self,
+        widths: Sequence[int] = (768, 384),
+        webp_lossless: bool = True,
+        webp_quality: int = 90,
+        avif: bool = True,
+        avif_quality: int = 80,
+        trim: bool = True,
+    ):
+        self.widths = tuple(sorted({w for w in widths if w > 0}, reverse=True))
+        self.webp_lossless = webp_lossless
+        self.webp_quality = webp_quality
+        self.avif = avif and _avif_supported()
+        self.avif_quality = avif_quality
+        self.trim = trim
+
+    @property
+    def formats(self) -> List[str]:
+        return [f for f in FORMAT_PREFERENCE if f != "avif" or self.avif]
+
+
+def _avif_supported() -> bool:
+    try:
+        return bool(features.check("avif"))
+    except (ValueError, KeyError):
+        return False
+
+
+def trim_to_alpha(image: Image.Image) -> Image.Image:
+    """Crop away fully transparent margins."""
+    if image.mode != "RGBA":
+        return image
+    bbox = image.getchannel("A").getbbox()
+    if bbox is None or bbox == (0, 0) + image.size:
+        return image
+    return image.crop(bbox)
+
+
+def _encode(image: Image.Image, fmt: str, config: EncodeConfig) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", lossless=config.webp_lossless, quality=config.webp_quality, method=4, exact=False)
+    elif fmt == "avif":
+        image.save(buffer, format="AVIF", quality=config.avif_quality, speed=8)
+    else:
+        image.save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
+
+
+def encode_to_store(image: Image.Image, store: AssetStore, config: Optional[EncodeConfig] = None) -> str:
+    """Write every variant plus a manifest to the store; returns the /images URL path."""
+    config = config or EncodeConfig()
+    if config.trim:
+        image = trim_to_alpha(image)
+
+    sizes = [image.size]
+    for width in config.widths:
+        if width < image.width:
+            sizes.append((width, max(1, round(image.height * width / image.width))))
+
+    variants: List[Dict[str, Any]] = []
+    for size in sizes:
+        resized = image if size == image.size else image.resize(size, Image.LANCZOS)
+        for fmt in config.formats:
+            data = _encode(resized, fmt, config)
+            variants.append({
+                "format": fmt,
+                "width": size[0],
+                "height": size[1],
+                "bytes": len(data),
+                "name": store.put(data, fmt),
+            })
+
+    manifest = {"width": image.width, "height": image.height, "variants": variants}
+    manifest_name = store.put(json.dumps(manifest, sort_keys=True).encode("utf-8"), "json")
+    return IMAGE_URL_PREFIX + manifest_name.split(".", 1)[0]
+
+
+def load_manifest(store: AssetStore, image_id: str) -> Optional[Dict[str, Any]]:
+    path = store.path(f"{image_id}.json")
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _accepted_formats(accept: str) -> List[str]:
+    accept = (accept or "").lower()
+    accepted = [fmt for fmt in ("avif", "webp") if FORMAT_MIME[fmt] in accept]
+    return accepted + ["png"]
+
+
+def choose_variant(manifest: Dict[str, Any], accept: str = "", width: Optional[int] = None, fmt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pick a variant: an explicit fmt wins, otherwise the best format in Accept
+    (PNG always qualifies). Among that format's sizes, take the smallest one at
+    least `width` wide, or the largest when none is or no width was asked for.
+    """
+    variants = manifest["variants"]
+    available = {v["format"] for v in variants}
+    candidates = [fmt] if fmt in available else _accepted_formats(accept)
+    chosen_format = next((f for f in FORMAT_PREFERENCE if f in candidates and f in available), "png")
+
+    sized = sorted((v for v in variants if v["format"] == chosen_format), key=lambda v: v["width"])
+    if width:
+        for variant in sized:
+            if variant["width"] >= width:
+                return variant
+    return sized[-1]
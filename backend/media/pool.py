@@ -0,0 +1,190 @@
+"""
+Process pool for background removal and output encoding.
+
+Each worker process loads its own rembg session once (in the pool
+initializer) so inference runs on every core without contending for the
+GIL. Submissions are bounded: once `workers + max_queue` images are in
+flight, remove_background() raises PoolSaturated so the server can shed load
+instead of buffering images in memory. Callers that must not shed (the image
+is already paid for) reserve a slot with acquire_slot() first, which queues
+them without holding anything but a coroutine. A slot is held until the
+worker is done with the image, even if the caller stopped waiting for it.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple, Union
+
+from logs import configure_logging
+from media.background import create_session, record_timings, remove_background_to_store, warm_up
+from media.chroma import ChromaKeyConfig
+from media.encode import EncodeConfig
+from media.store import AssetStore
+
+logger = logging.getLogger(__name__)
+
+# Per-process state, set by _init_worker
+_session = None
+_chroma_config: Optional[ChromaKeyConfig] = None
+_store: Optional[AssetStore] = None
+_encode_config: Optional[EncodeConfig] = None
+_start_barrier: Optional[threading.Barrier] = None
+
+# How long start() waits for every worker to load its model before counting the ones that did
+START_TIMEOUT = 600.0
+
+
+class PoolSaturated(Exception):
+    """Raised when the image processing queue is full."""
+
+
+def _init_worker(
+    store_root: str,
+    model_name: str,
+    intra_op_threads: int,
+    inter_op_threads: int,
+    warmup: bool,
+    chroma_config: Optional[ChromaKeyConfig],
+    encode_config: Optional[EncodeConfig],
+    log_level: str,
+    log_format: str,
+    start_barrier,
+):
+    global _session, _chroma_config, _store, _encode_config, _start_barrier
+    configure_logging(log_level, log_format)
+    _start_barrier = start_barrier
+    _chroma_config = chroma_config
+    _encode_config = encode_config
+    _store = AssetStore(store_root)
+    try:
+        _session = create_session(model_name, intra_op_threads, inter_op_threads)
+        if warmup:
+            warm_up(_session)
+    except Exception as e:
+        # Chroma keying still works; rembg will try to load its default model per call
+        logger.warning(f"Image worker failed to load rembg model '{model_name}': {e}")
+
+
+def _worker_ready() -> Tuple[int, bool]:
+    # Every worker holds here until all of them have arrived, so each of the start() probes runs in a
+    # different process instead of one fast worker answering them all
+    try:
+        _start_barrier.wait(START_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass
+    return os.getpid(), _session is not None
+
+
+def _process(source: Union[bytes, str]) -> Tuple[str, Dict[str, float]]:
+    # Workers write straight to the asset store so only the short URL crosses the process boundary.
+    # Stage timings travel back too: metrics live in the parent process, which serves /metrics.
+    timings: Dict[str, float] = {}
+    url = remove_background_to_store(source, _store, _session, _chroma_config, _encode_config, timings)
+    return url, timings
+
+
+class ImageWorkerPool:
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        store_root: str,
+        model_name: str,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        warmup: bool = True,
+        chroma_config: Optional[ChromaKeyConfig] = None,
+        encode_config: Optional[EncodeConfig] = None,
+        log_level: str = "INFO",
+        log_format: str = "json",
+    ):
+        self.workers = workers
+        self.model_name = model_name
+        self.max_queue = max_queue
+        self._pending = 0
+        self._freed: Optional[asyncio.Event] = None
+        # spawn, not fork: the parent has an event loop, threads and possibly ONNX state
+        context = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                store_root, model_name, intra_op_threads, inter_op_threads, warmup,
+                chroma_config, encode_config, log_level, log_format, context.Barrier(workers),
+            ),
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def saturated(self) -> bool:
+        return self._pending >= self.capacity
+
+    async def start(self) -> int:
+        """Spawn every worker and wait for their models to load; returns how many distinct workers loaded one."""
+        loop = asyncio.get_running_loop()
+        ready = await asyncio.gather(*(loop.run_in_executor(self._executor, _worker_ready) for _ in range(self.workers)))
+        return len({pid for pid, loaded in ready if loaded})
+
+    async def remove_background(self, source: Union[bytes, str], reserved: bool = False) -> str:
+        """
+        Process image bytes or a file path; passing a path keeps the image out of the IPC pipe.
+        Raises PoolSaturated when the pool is full, unless the caller holds a slot from acquire_slot().
+        """
+        loop = asyncio.get_running_loop()
+        if not reserved:
+            if self.saturated():
+                raise PoolSaturated(f"{self._pending} images already queued for processing")
+            self._pending += 1
+        try:
+            future = self._executor.submit(_process, source)
+        except BaseException:
+            self._release()
+            raise
+        # Cancelling the caller does not stop a worker that already started, so the slot is released by the
+        # executor future itself (on a pool thread, hence the hop back to the loop)
+        future.add_done_callback(lambda _f: self._release_from_thread(loop))
+        url, timings = await asyncio.wrap_future(future)
+        record_timings(timings, self.model_name)
+        return url
+
+    async def acquire_slot(self) -> None:
+        """
+        Wait for and reserve a slot; pass reserved=True to the remove_background() call that uses it,
+        or call release_slot() if it is never made.
+        """
+        # Every release wakes all waiters, but the check and the increment run without an await between
+        # them, so only as many proceed as there are free slots and the rest go back to waiting
+        while self.saturated():
+            if self._freed is None:
+                self._freed = asyncio.Event()
+            self._freed.clear()
+            await self._freed.wait()
+        self._pending += 1
+
+    def release_slot(self) -> None:
+        self._release()
+
+    def _release_from_thread(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Loop already closed at shutdown
+            pass
+
+    def _release(self) -> None:
+        self._pending -= 1
+        if self._freed is not None:
+            self._freed.set()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,103 @@
+"""
+Content-addressed store for processed assets.
+
+Files are named after the SHA-256 of their bytes, so a name never changes
+meaning: the /assets route can serve them with strong ETags and
+`Cache-Control: immutable`, and identical outputs are stored once.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+ASSET_URL_PREFIX = "/assets/"
+_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{2,5}$")
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "mp4": "video/mp4",
+    "webm": "video/webm",
+    "jpg": "image/jpeg",
+    "json": "application/json",
+}
+
+
+class AssetStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def valid_name(name: str) -> bool:
+        return bool(_NAME_RE.match(name))
+
+    @staticmethod
+    def url_for(name: str) -> str:
+        return ASSET_URL_PREFIX + name
+
+    @staticmethod
+    def etag(name: str) -> str:
+        return f'"{name.split(".", 1)[0]}"'
+
+    def path(self, name: str) -> Optional[str]:
+        if not self.valid_name(name):
+            return None
+        path = os.path.join(self.root, name[:2], name)
+        return path if os.path.isfile(path) else None
+
+    def put(self, data: bytes, ext: str) -> str:
+        """Store data (if not already present) and return its asset name."""
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        target_dir = os.path.join(self.root, name[:2])
+        target = os.path.join(target_dir, name)
+        if os.path.isfile(target):
+            return name
+        os.makedirs(target_dir, exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return name
+
+    def put_file(self, source_path: str, ext: str) -> str:
+        """Move a finished file into the store without reading it into memory; returns its asset name."""
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        name = f"{digest.hexdigest()}.{ext}"
+        target_dir = os.path.join(self.root, name[:2])
+        target = os.path.join(target_dir, name)
+        if os.path.isfile(target):
+            os.remove(source_path)
+            return name
+        os.makedirs(target_dir, exist_ok=True)
+        # os.replace is atomic on the same filesystem; shutil.move copies across filesystems
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.move(source_path, tmp_path)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return name
+
+    def scratch_dir(self) -> str:
+        """A temp directory on the store's filesystem, so put_file() can rename instead of copy."""
+        return tempfile.mkdtemp(dir=self.root, prefix=".scratch-")
@@ -0,0 +1,185 @@
+"""
+Web-optimized transcodes of downloaded videos.
+
+The room background is a short clip played on loop, so every output is
+built to start and restart instantly: MP4s carry the moov atom up front
+(faststart) and re-encoded variants get a keyframe at the start and every
+two seconds. The frontend always plays the room video muted, so re-encoded
+variants drop the audio track. From one source this produces:
+
+- mp4: the original streams remuxed with faststart (no re-encode)
+- mp4_mobile: H.264 scaled down to `mobile_height` at a lower bitrate
+- webm: VP9 (smaller than H.264 at the same quality)
+- webm_av1: AV1, off by default because it is slow to encode
+- poster: a JPEG of the first frame, shown while the video loads
+
+Each output is an ffmpeg subprocess; a semaphore caps how many run at once.
+Without ffmpeg on PATH the source file is stored as-is.
+"""
+import asyncio
+import logging
+import os
+import shutil
+from typing import Dict, List, Optional
+
+from media.store import AssetStore
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodeConfig:
+    def __init__(
+        self,
+        ffmpeg: str = "ffmpeg",
+        workers: int = 1,
+        mobile_height: int = 720,
+        mobile_crf: int = 28,
+        webm: bool = True,
+        webm_crf: int = 34,
+        av1: bool = False,
+        av1_crf: int = 38,
+        poster: bool = True,
+        keyframe_seconds: int = 2,
+    ):
+        self.ffmpeg = ffmpeg
+        self.workers = max(1, workers)
+        self.mobile_height = mobile_height
+        self.mobile_crf = mobile_crf
+        self.webm = webm
+        self.webm_crf = webm_crf
+        self.av1 = av1
+        self.av1_crf = av1_crf
+        self.poster = poster
+        self.keyframe_seconds = keyframe_seconds
+
+
+def ffmpeg_available(ffmpeg: str = "ffmpeg") -> bool:
+    return shutil.which(ffmpeg) is not None
+
+
+def _keyframes(config: TranscodeConfig) -> List[str]:
+    return ["-force_key_frames", f"expr:gte(t,n_forced*{config.keyframe_seconds})"]
+
+
+def _output_args(name: str, config: TranscodeConfig) -> Optional[List[str]]:
+    """ffmpeg arguments (between input and output path) for one output, or None if disabled."""
+    if name == "mp4":
+        return ["-map", "0:v", "-map", "0:a?", "-c", "copy", "-movflags", "+faststart"]
+    if name == "mp4_mobile" and config.mobile_height:
+        return [
+            # Never upscale: min() keeps smaller sources at their own height
+            "-vf", f"scale=-2:min({config.mobile_height}\\,ih)",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", str(config.mobile_crf),
+            "-profile:v", "main", "-pix_fmt", "yuv420p",
+            *_keyframes(config),
+            "-an",
+            "-movflags", "+faststart",
+        ]
+    if name == "webm" and config.webm:
+        return [
+            "-c:v", "libvpx-vp9", "-crf", str(config.webm_crf), "-b:v", "0",
+            "-row-mt", "1", "-deadline", "good", "-cpu-used", "4",
+            *_keyframes(config),
+            "-an",
+        ]
+    if name == "webm_av1" and config.av1:
+        return [
+            "-c:v", "libsvtav1", "-crf", str(config.av1_crf), "-preset", "8",
+            *_keyframes(config),
+            "-an",
+        ]
+    if name == "poster" and config.poster:
+        return ["-frames:v", "1", "-q:v", "3"]
+    return None
+
+
+# Output name -> file extension
+OUTPUTS = {
+    "mp4": "mp4",
+    "mp4_mobile": "mp4",
+    "webm": "webm",
+    "webm_av1": "webm",
+    "poster": "jpg",
+}
+
+# Outputs the room can play as its main video, best first
+PLAYABLE_OUTPUTS = ("mp4", "webm", "mp4_mobile", "webm_av1")
+
+
+def playable_url(variants: Dict[str, str]) -> Optional[str]:
+    """The URL to play from transcode() output: a video variant, else the stored source, never the poster."""
+    for output in PLAYABLE_OUTPUTS:
+        if output in variants:
+            return variants[output]
+    # Keys that are not outputs are the source stored as-is under its own extension (e.g. "mov")
+    for name, url in variants.items():
+        if name not in OUTPUTS:
+            return url
+    return None
+
+
+class VideoTranscoder:
+    def __init__(self, store: AssetStore, config: Optional[TranscodeConfig] = None):
+        self.store = store
+        self.config = config or TranscodeConfig()
+        self.enabled = ffmpeg_available(self.config.ffmpeg)
+        self._semaphore = asyncio.Semaphore(self.config.workers)
+
+    async def _run_ffmpeg(self, source_path: str, args: List[str], out_path: str) -> bool:
+        async with self._semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                self.config.ffmpeg, "-y", "-v", "error", "-i", source_path, *args, out_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
+        if proc.returncode != 0:
+            logger.warning(f"ffmpeg failed for {os.path.basename(out_path)}: {stderr.decode(errors='replace').strip()[-500:]}")
+            return False
+        return True
+
+    async def _store_source(self, source_path: str, source_ext: str) -> Dict[str, str]:
+        name = await asyncio.to_thread(self.store.put_file, source_path, source_ext)
+        return {"mp4" if source_ext == "mp4" else source_ext: self.store.url_for(name)}
+
+    async def transcode(self, source_path: str, source_ext: str = "mp4") -> Dict[str, str]:
+        """
+        Build every enabled output from source_path and return {output name: /assets URL}.
+        Takes ownership of the source: it is deleted afterwards, or moved into
+        the store when ffmpeg is unavailable or the faststart remux fails.
+        """
+        if not self.enabled:
+            return await self._store_source(source_path, source_ext)
+
+        scratch = self.store.scratch_dir()
+        try:
+            jobs = {}
+            for output, ext in OUTPUTS.items():
+                args = _output_args(output, self.config)
+                if args is not None:
+                    out_path = os.path.join(scratch, f"{output}.{ext}")
+                    jobs[output] = (out_path, ext, asyncio.ensure_future(self._run_ffmpeg(source_path, args, out_path)))
+            try:
+                await asyncio.gather(*(task for _, _, task in jobs.values()))
+            except BaseException:
+                for _, _, task in jobs.values():
+                    task.cancel()
+                raise
+
+            urls: Dict[str, str] = {}
+            for output, (out_path, ext, task) in jobs.items():
+                if task.result() and os.path.isfile(out_path):
+                    name = await asyncio.to_thread(self.store.put_file, out_path, ext)
+                    urls[output] = self.store.url_for(name)
+            if "mp4" not in urls:
+                urls.update(await self._store_source(source_path, source_ext))
+            return urls
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+            if os.path.exists(source_path):
+                os.remove(source_path)
@@ -0,0 +1,197 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are updated where the work happens; gauges are
+read from callbacks at scrape time so they always reflect live state
+(queued images, outstanding upstream jobs, ...). Each uvicorn worker
+exposes its own numbers, like the default prometheus_client registry.
+
+The pipeline stages timed in STAGE_SECONDS are:
+start_generation, poll_wait, asset_url, image_download, chroma_key, rembg,
+encode, background_removal (queue + processing, as seen by the API),
+video_download and video_transcode.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_REGISTRY: List["_Metric"] = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set_function(self, collect: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """collect() returns {label values tuple: value}, or {(): value} for an unlabelled gauge."""
+        self._collect = collect
+
+    def _samples(self) -> List[str]:
+        if self._collect is None:
+            return []
+        try:
+            items = sorted(self._collect().items())
+        except Exception:
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """{label values: (count, sum)}, e.g. for benchmarks diffing two snapshots."""
+        with self._lock:
+            return {k: (int(v[-1]), v[-2]) for k, v in self._values.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "orbella_stage_seconds",
+    "Duration of each generation pipeline stage",
+    ("stage", "model"),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "orbella_http_request_seconds",
+    "API request duration by route and status",
+    ("method", "route", "status"),
+)
+CACHE_LOOKUPS = Counter(
+    "orbella_cache_lookups_total",
+    "Result cache lookups by asset kind and outcome",
+    ("kind", "result"),
+)
+FALLBACKS = Counter(
+    "orbella_fallbacks_total",
+    "Degraded paths taken (background removal failures, metadata URL lookups, chroma key rejections, ...)",
+    ("kind",),
+)
+UPSTREAM_RESPONSES = Counter(
+    "orbella_upstream_responses_total",
+    "Scenario API responses by operation and status code",
+    ("operation", "status"),
+)
+CANCELLATIONS = Counter(
+    "orbella_cancellations_total",
+    "Work stopped because nobody was waiting for it any more (client disconnects, abandoned generations and jobs)",
+    ("kind",),
+)
+INFLIGHT = Gauge(
+    "orbella_inflight",
+    "Work currently in progress, by kind",
+    ("kind",),
+)
+QUEUE_DEPTH = Gauge(
+    "orbella_queue_depth",
+    "Work waiting for capacity, by queue",
+    ("queue",),
+)
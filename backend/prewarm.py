@@ -0,0 +1,244 @@
+"""
+Background pre-generation of popular themes.
+
+ThemeStats keeps an exponentially decayed request count per theme, shared
+between uvicorn workers through a small JSON file and capped at the
+`max_themes` best-scoring themes. Requests are only counted while the
+scheduler runs, since it is what flushes them. Prewarmer ranks those
+themes (plus a seed list of the built-in rooms) and, while the app is idle,
+generates whichever room parts are missing from the result cache, so the
+first player to pick a popular theme gets a warm room.
+
+Upstream spend is capped by a budget of generated parts per rolling window
+and a concurrency limit. Player generations abandoned halfway through are
+finished for the cache only if the theme is wanted, and are charged to the
+same budget. Only one worker per host runs the scheduler, via a
+claim in the shared ClaimStore.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from singleflight import ClaimStore
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "prewarm-leader"
+
+# Seed themes rank below anything players actually asked for
+SEED_SCORE = 0.5
+
+
+class ThemeStats:
+    def __init__(self, path: str, half_life: float = 3 * 24 * 3600, max_themes: int = 1000):
+        self.path = path
+        self.half_life = half_life
+        # Theme strings come from clients, so only the best-scoring ones are kept in memory and on disk
+        self.max_themes = max_themes
+        self._scores: Dict[str, float] = {}
+        self._updated_at = time.time()
+        self._pending: Dict[str, float] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._load()
+
+    def _decay(self, since: float, now: float) -> float:
+        return math.pow(0.5, max(0.0, now - since) / self.half_life)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._scores = {k: float(v) for k, v in data.get("scores", {}).items()}
+            self._updated_at = float(data.get("updated_at", time.time()))
+        except (OSError, ValueError):
+            pass
+
+    def record(self, theme: str, weight: float = 1.0) -> None:
+        self._pending[theme] = self._pending.get(theme, 0.0) + weight
+        if len(self._pending) > 2 * self.max_themes:
+            # Pruned in batches so a stream of one-off themes costs one sort per max_themes requests
+            self._pending = self._top(self._pending)
+
+    def _top(self, scores: Dict[str, float]) -> Dict[str, float]:
+        if len(scores) <= self.max_themes:
+            return scores
+        return dict(sorted(scores.items(), key=lambda item: -item[1])[: self.max_themes])
+
+    def scores(self, now: Optional[float] = None) -> Dict[str, float]:
+        now = now or time.time()
+        factor = self._decay(self._updated_at, now)
+        merged = {k: v * factor for k, v in self._scores.items()}
+        for theme, weight in self._pending.items():
+            merged[theme] = merged.get(theme, 0.0) + weight
+        return merged
+
+    def flush(self) -> None:
+        """Merge this worker's new requests into the shared file (re-read first so other workers' counts survive)."""
+        self._load()
+        now = time.time()
+        scores = self._top({k: v for k, v in self.scores(now).items() if v >= 0.01})
+        self._scores, self._updated_at, self._pending = scores, now, {}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"updated_at": now, "scores": scores}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Prewarmer:
+    def __init__(
+        self,
+        stats: ThemeStats,
+        claims: ClaimStore,
+        missing_parts: Callable[[str], Awaitable[List[str]]],
+        warm_part: Callable[[str, str], Awaitable[bool]],
+        seeds: Sequence[str] = (),
+        top_n: int = 10,
+        interval: float = 60.0,
+        idle_after: float = 120.0,
+        budget: int = 24,
+        budget_window: float = 24 * 3600,
+        concurrency: int = 1,
+    ):
+        self.stats = stats
+        self.claims = claims
+        self.missing_parts = missing_parts
+        self.warm_part = warm_part
+        self.seeds = list(seeds)
+        self.top_n = top_n
+        self.interval = interval
+        self.idle_after = idle_after
+        self.budget = budget
+        self.budget_window = budget_window
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._spent: deque = deque()
+        self._last_activity = 0.0
+        self._active = 0
+        self._leader = False
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Dict[str, object] = {}
+
+    def record(self, theme: str) -> None:
+        """Note a player request: it counts toward the theme's rank and postpones idle work."""
+        if self._task is not None:
+            # Only the scheduler flushes stats; without it they would pile up in memory unread
+            self.stats.record(theme)
+        self._last_activity = time.monotonic()
+
+    @contextmanager
+    def player_request(self, theme: str):
+        """Wrap a player-initiated generation: ranks the theme and keeps the scheduler out of the way."""
+        self.record(theme)
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._last_activity = time.monotonic()
+
+    def idle(self) -> bool:
+        return self._active == 0 and time.monotonic() - self._last_activity >= self.idle_after
+
+    def ranked(self) -> List[str]:
+        scores = self.stats.scores()
+        for seed in self.seeds:
+            scores[seed] = max(scores.get(seed, 0.0), SEED_SCORE)
+        return sorted(scores, key=lambda theme: (-scores[theme], theme))[: self.top_n]
+
+    def wants(self, theme: str) -> bool:
+        """Whether the scheduler would warm this theme anyway, so a half-done generation is worth finishing."""
+        return theme in self.ranked() and self.budget_left() > 0
+
+    def adopt(self, theme: str) -> bool:
+        """
+        Take over a generation its player abandoned, if the theme is wanted; the rest of
+        the run is charged to the budget like any other prewarm.
+        """
+        if not self.wants(theme):
+            return False
+        self._spent.append(time.monotonic())
+        return True
+
+    def budget_left(self) -> int:
+        cutoff = time.monotonic() - self.budget_window
+        while self._spent and self._spent[0] < cutoff:
+            self._spent.popleft()
+        return max(0, self.budget - len(self._spent))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            self.stats.flush()
+        except OSError:
+            pass
+        if self._leader:
+            self.claims.release(LEADER_KEY)
+            self._leader = False
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.stats.flush()
+                if self._leader:
+                    self.claims.refresh(LEADER_KEY)
+                else:
+                    self._leader = self.claims.try_claim(LEADER_KEY)
+                if self._leader and self.idle() and self.budget_left() > 0:
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Prewarm pass failed: {e}")
+
+    async def run_once(self) -> Dict[str, List[str]]:
+        """Warm missing parts of the top themes, best first, until busy or out of budget."""
+        started = time.time()
+        warmed: Dict[str, List[str]] = {}
+        pending = []
+        for theme in self.ranked():
+            missing = await self.missing_parts(theme)
+            for part in missing:
+                if self.budget_left() <= 0:
+                    break
+                self._spent.append(time.monotonic())
+                pending.append(asyncio.create_task(self._warm(theme, part, warmed)))
+        if pending:
+            await asyncio.gather(*pending)
+        self.last_run = {"started_at": started, "finished_at": time.time(), "warmed": warmed}
+        return warmed
+
+    async def _warm(self, theme: str, part: str, warmed: Dict[str, List[str]]) -> None:
+        async with self._semaphore:
+            if not self.idle():
+                # A player showed up while we were queued; leave the upstream to them
+                self._spent.pop()
+                return
+            started = time.perf_counter()
+            try:
+                produced = await self.warm_part(theme, part)
+            except Exception as e:
+                logger.warning(f"Prewarm of {part} for '{theme}' failed: {e}")
+                return
+            if not produced:
+                # Someone else filled the cache meanwhile; no upstream spend
+                self._spent.pop()
+            warmed.setdefault(theme, []).append(part)
+            logger.info(f"Prewarmed {part} for '{theme}' in {time.perf_counter() - started:.1f}s")
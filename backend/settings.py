@@ -0,0 +1,166 @@
+"""Runtime configuration read from the environment (see .env.example)."""
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Scenario API root; point it at bench/fake_scenario.py for offline load tests
+SCENARIO_API_BASE = os.getenv("SCENARIO_API_BASE") or "https://api.cloud.scenario.com/v1"
+
+# Shared HTTP connection pool used for every Scenario API and asset call
+HTTP_MAX_CONNECTIONS = env_int("HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE = env_int("HTTP_MAX_KEEPALIVE", 20)
+HTTP_KEEPALIVE_EXPIRY = env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+HTTP_TIMEOUT = env_float("HTTP_TIMEOUT", 30.0)
+HTTP_CONNECT_TIMEOUT = env_float("HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP2_ENABLED = env_bool("HTTP2_ENABLED", True)
+
+# Result cache for generated themes (memory LRU + disk store)
+CACHE_DIR = os.getenv("CACHE_DIR") or os.path.join(os.path.dirname(__file__), ".cache", "results")
+CACHE_MEMORY_MB = env_int("CACHE_MEMORY_MB", 256)
+CACHE_TTL = env_float("CACHE_TTL", 7 * 24 * 3600)
+# Entries that point at signed upstream URLs must expire before the signature does
+CACHE_SIGNED_URL_TTL = env_float("CACHE_SIGNED_URL_TTL", 3600)
+
+# Bearer token for the cache admin endpoints (DELETE /cache...); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or ""
+
+# Cross-worker claim files used to coalesce identical generations
+CLAIM_DIR = os.getenv("CLAIM_DIR") or os.path.join(os.path.dirname(__file__), ".cache", "claims")
+CLAIM_STALE_AFTER = env_float("CLAIM_STALE_AFTER", 900)
+CLAIM_POLL_INTERVAL = env_float("CLAIM_POLL_INTERVAL", 1.0)
+
+# Background generation jobs (/jobs)
+JOB_MAX_RETAINED = env_int("JOB_MAX_RETAINED", 500)
+JOB_RETENTION_SECONDS = env_float("JOB_RETENTION_SECONDS", 3600)
+SSE_HEARTBEAT_SECONDS = env_float("SSE_HEARTBEAT_SECONDS", 15)
+# Cancel a running job after this long with no event stream open and no status poll (0 = never)
+JOB_ABANDON_SECONDS = env_float("JOB_ABANDON_SECONDS", 30)
+
+# Live bingo rooms (/ws/rooms/{id})
+ROOM_CALL_INTERVAL = env_float("ROOM_CALL_INTERVAL", 4.0)
+ROOM_INTERMISSION = env_float("ROOM_INTERMISSION", 10.0)
+# Messages a connection may fall behind before it is dropped and has to reconnect
+ROOM_SEND_QUEUE = env_int("ROOM_SEND_QUEUE", 256)
+ROOM_SEND_TIMEOUT = env_float("ROOM_SEND_TIMEOUT", 10.0)
+ROOM_REPLAY_EVENTS = env_int("ROOM_REPLAY_EVENTS", 200)
+ROOM_HEARTBEAT_SECONDS = env_float("ROOM_HEARTBEAT_SECONDS", 15.0)
+ROOM_IDLE_SECONDS = env_float("ROOM_IDLE_SECONDS", 60.0)
+ROOM_MAX_ROOMS = env_int("ROOM_MAX_ROOMS", 1000)
+ROOM_MAX_CARDS = env_int("ROOM_MAX_CARDS", 50000)
+# Cards per POST /cards batch or /cards/verify audit
+CARDS_MAX_BATCH = env_int("CARDS_MAX_BATCH", 100000)
+
+# Centralized Scenario job poller (seconds)
+POLL_IMAGE_INITIAL = env_float("POLL_IMAGE_INITIAL", 1.0)
+POLL_IMAGE_MAX = env_float("POLL_IMAGE_MAX", 5.0)
+POLL_IMAGE_DEADLINE = env_float("POLL_IMAGE_DEADLINE", 300)
+POLL_VIDEO_INITIAL = env_float("POLL_VIDEO_INITIAL", 5.0)
+POLL_VIDEO_MAX = env_float("POLL_VIDEO_MAX", 15.0)
+POLL_VIDEO_DEADLINE = env_float("POLL_VIDEO_DEADLINE", 900)
+POLL_MAX_CONCURRENCY = env_int("POLL_MAX_CONCURRENCY", 16)
+
+# Background removal (rembg / ONNX Runtime)
+REMBG_MODEL = os.getenv("REMBG_MODEL") or "u2net"
+REMBG_INTRA_OP_THREADS = env_int("REMBG_INTRA_OP_THREADS", 0)
+REMBG_INTER_OP_THREADS = env_int("REMBG_INTER_OP_THREADS", 0)
+REMBG_WARMUP = env_bool("REMBG_WARMUP", True)
+
+# Chroma-key fast path for #00FF00 assets (rembg is the fallback)
+CHROMA_KEY_ENABLED = env_bool("CHROMA_KEY_ENABLED", True)
+CHROMA_KEY_LOW = env_int("CHROMA_KEY_LOW", 40)
+CHROMA_KEY_HIGH = env_int("CHROMA_KEY_HIGH", 90)
+CHROMA_KEY_MIN_BORDER_COVERAGE = env_float("CHROMA_KEY_MIN_BORDER_COVERAGE", 0.9)
+
+# Image post-processing process pool (0 workers = run in this process's threadpool)
+IMAGE_WORKERS = env_int("IMAGE_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+IMAGE_QUEUE_SIZE = env_int("IMAGE_QUEUE_SIZE", 16)
+IMAGE_RETRY_AFTER = env_int("IMAGE_RETRY_AFTER", 10)
+
+# Content-addressed store for processed assets, served from /assets
+ASSET_DIR = os.getenv("ASSET_DIR") or os.path.join(os.path.dirname(__file__), ".cache", "assets")
+
+# Output encoding for processed UI images
+IMAGE_VARIANT_WIDTHS = [int(w) for w in (os.getenv("IMAGE_VARIANT_WIDTHS") or "768,384").split(",") if w.strip().isdigit()]
+IMAGE_WEBP_LOSSLESS = env_bool("IMAGE_WEBP_LOSSLESS", True)
+IMAGE_WEBP_QUALITY = env_int("IMAGE_WEBP_QUALITY", 90)
+IMAGE_AVIF = env_bool("IMAGE_AVIF", True)
+
+# Streaming downloads of upstream assets
+FETCH_MAX_IMAGE_BYTES = env_int("FETCH_MAX_IMAGE_BYTES", 32 * 1024 * 1024)
+FETCH_MAX_VIDEO_BYTES = env_int("FETCH_MAX_VIDEO_BYTES", 512 * 1024 * 1024)
+# Downloads stay in memory up to this size, then spill to a temp file
+FETCH_SPOOL_BYTES = env_int("FETCH_SPOOL_BYTES", 8 * 1024 * 1024)
+FETCH_CHUNK_BYTES = env_int("FETCH_CHUNK_BYTES", 1024 * 1024)
+FETCH_SPOOL_DIR = os.getenv("FETCH_SPOOL_DIR") or None
+
+# Local copies of generated videos: parallel Range download, then ffmpeg transcodes into the asset store
+VIDEO_DOWNLOAD_ENABLED = env_bool("VIDEO_DOWNLOAD_ENABLED", True)
+VIDEO_DOWNLOAD_DIR = os.getenv("VIDEO_DOWNLOAD_DIR") or os.path.join(os.path.dirname(__file__), ".cache", "downloads")
+VIDEO_DOWNLOAD_PART_BYTES = env_int("VIDEO_DOWNLOAD_PART_BYTES", 8 * 1024 * 1024)
+VIDEO_DOWNLOAD_CONCURRENCY = env_int("VIDEO_DOWNLOAD_CONCURRENCY", 4)
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or "ffmpeg"
+VIDEO_TRANSCODE_WORKERS = env_int("VIDEO_TRANSCODE_WORKERS", max(1, (os.cpu_count() or 2) // 4))
+VIDEO_MOBILE_HEIGHT = env_int("VIDEO_MOBILE_HEIGHT", 720)
+VIDEO_WEBM = env_bool("VIDEO_WEBM", True)
+VIDEO_AV1 = env_bool("VIDEO_AV1", False)
+
+# Background pre-generation of popular themes while the app is idle; off by default because it spends
+# up to PREWARM_BUDGET upstream generations (videos included) per window without a player asking
+PREWARM_ENABLED = env_bool("PREWARM_ENABLED", False)
+PREWARM_SEED_THEMES = [t.strip() for t in (os.getenv("PREWARM_SEED_THEMES") or "classic bingo,aztec adventure,space odyssey,pirate treasure,candy land,jungle safari,vegas nights,ocean deep").split(",") if t.strip()]
+PREWARM_TOP_N = env_int("PREWARM_TOP_N", 10)
+PREWARM_INTERVAL = env_float("PREWARM_INTERVAL", 60.0)
+# Seconds without player generations before the scheduler may call upstream
+PREWARM_IDLE_SECONDS = env_float("PREWARM_IDLE_SECONDS", 120.0)
+# Room parts (video, card or ball caller) generated per budget window
+PREWARM_BUDGET = env_int("PREWARM_BUDGET", 24)
+PREWARM_BUDGET_WINDOW = env_float("PREWARM_BUDGET_WINDOW", 24 * 3600)
+PREWARM_CONCURRENCY = env_int("PREWARM_CONCURRENCY", 1)
+PREWARM_HALF_LIFE_HOURS = env_float("PREWARM_HALF_LIFE_HOURS", 72.0)
+# Distinct themes kept in the request history; the lowest-scoring ones are dropped beyond this
+PREWARM_MAX_THEMES = env_int("PREWARM_MAX_THEMES", 1000)
+PREWARM_STATS_PATH = os.getenv("PREWARM_STATS_PATH") or os.path.join(os.path.dirname(__file__), ".cache", "theme_stats.json")
+
+# Resolved asset URLs are cached until ASSET_URL_EXPIRY_MARGIN seconds before their signature
+# expires; URLs without a recognisable expiry are kept for ASSET_URL_TTL seconds
+ASSET_URL_TTL = env_float("ASSET_URL_TTL", 600.0)
+ASSET_URL_EXPIRY_MARGIN = env_float("ASSET_URL_EXPIRY_MARGIN", 120.0)
+
+# Upstream governor: concurrent Scenario jobs per model, request rate and retries
+UPSTREAM_MAX_VIDEO_JOBS = env_int("UPSTREAM_MAX_VIDEO_JOBS", 4)
+UPSTREAM_MAX_IMAGE_JOBS = env_int("UPSTREAM_MAX_IMAGE_JOBS", 8)
+# Requests per second across create, poll and asset calls (0 = unlimited)
+UPSTREAM_RATE = env_float("UPSTREAM_RATE", 5.0)
+UPSTREAM_BURST = env_int("UPSTREAM_BURST", 10)
+UPSTREAM_MAX_RETRIES = env_int("UPSTREAM_MAX_RETRIES", 5)
+UPSTREAM_RETRY_BASE = env_float("UPSTREAM_RETRY_BASE", 1.0)
+UPSTREAM_RETRY_MAX = env_float("UPSTREAM_RETRY_MAX", 30.0)
+# Ask Scenario to cancel jobs whose every waiter has gone away
+UPSTREAM_CANCEL_ABANDONED = env_bool("UPSTREAM_CANCEL_ABANDONED", True)
+
+# Logging: "json" (one object per line, with request_id) or "text"
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+LOG_FORMAT = os.getenv("LOG_FORMAT") or "json"
+
+# /readyz re-verifies the Scenario credentials at most this often (seconds)
+READY_CREDENTIALS_INTERVAL = env_float("READY_CREDENTIALS_INTERVAL", 300.0)
@@ -0,0 +1,167 @@
+"""
+Request coalescing for identical generation requests.
+
+SingleFlight coalesces concurrent callers inside one process: the first caller
+for a key runs the work and everyone else awaits the same task. The work is
+cancelled when its last waiter goes away, unless keep_if_abandoned() says the
+result is still worth finishing for the cache. It is asked at most once per
+flight, so a caller that charges a budget for the decision is charged once.
+
+ClaimStore extends this across uvicorn workers on the same host with claim
+files: the worker holding a key's claim generates, the others wait for the
+claim to go away and then read the shared disk cache.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from metrics import CANCELLATIONS
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict[str, int] = {}
+        # Keys whose abandoned work keep_if_abandoned() already agreed to finish
+        self._kept: Set[str] = set()
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def _done(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+            self._kept.discard(key)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], keep_if_abandoned: Optional[Callable[[], bool]] = None) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            logger.info(f"Joining in-flight generation ({key[:12]})")
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # Shield so one waiter going away does not cancel the shared work
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1 and key not in self._kept:
+                if keep_if_abandoned is not None and keep_if_abandoned():
+                    self._kept.add(key)
+                    logger.info(f"Last waiter left; finishing generation for the cache ({key[:12]})")
+                else:
+                    logger.info(f"Last waiter left; cancelling generation ({key[:12]})")
+                    CANCELLATIONS.inc(kind="generation")
+                    task.cancel()
+            raise
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+
+
+class ClaimStore:
+    def __init__(self, root: str, stale_after: float = 900.0):
+        self.root = root
+        self.stale_after = stale_after
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.claim")
+
+    def try_claim(self, key: str) -> bool:
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_if_stale(path):
+                    return False
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def refresh(self, key: str) -> None:
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def release(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def is_claimed(self, key: str) -> bool:
+        path = self._path(key)
+        return os.path.exists(path) and not self._break_if_stale(path)
+
+    def _break_if_stale(self, path: str) -> bool:
+        """Remove a claim whose owner died or stopped refreshing it. Returns True if removed."""
+        try:
+            age = time.time() - os.path.getmtime(path)
+            with open(path) as f:
+                pid = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return False
+        stale = age > self.stale_after
+        if not stale and pid and pid != os.getpid():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                stale = True
+            except PermissionError:
+                pass
+        if stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return stale
+
+
+async def run_claimed(
+    claims: ClaimStore,
+    key: str,
+    lookup: Callable[[], Awaitable[Optional[Any]]],
+    produce: Callable[[], Awaitable[Any]],
+    poll_interval: float = 1.0,
+) -> Any:
+    """
+    Run produce() while holding the cross-worker claim for key. If another
+    worker holds it, wait for it to finish and return lookup() instead.
+    """
+    while True:
+        if claims.try_claim(key):
+            heartbeat = asyncio.ensure_future(_refresh_claim(claims, key))
+            try:
+                # Another worker may have finished between our cache miss and the claim
+                hit = await lookup()
+                if hit is not None:
+                    return hit
+                return await produce()
+            finally:
+                heartbeat.cancel()
+                claims.release(key)
+
+        logger.info(f"Waiting for another worker to finish ({key[:12]})")
+        while claims.is_claimed(key):
+            await asyncio.sleep(poll_interval)
+        hit = await lookup()
+        if hit is not None:
+            return hit
+        # The owner failed without caching anything; try to take over
+
+
+async def _refresh_claim(claims: ClaimStore, key: str) -> None:
+    while True:
+        await asyncio.sleep(claims.stale_after / 3)
+        claims.refresh(key)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from game.cards import LINE_NAMES, NOT_WON, as_cards, audit_claims, generate_cards, line_bits, validate_cards
+from game.engine import FREE_CELL, BingoEngine, validate_card
+
+
+def test_seed_reproduces_the_batch():
+    a = generate_cards(500, seed=42)
+    b = generate_cards(500, seed=42)
+    assert a.shape == (500, 25)
+    assert np.array_equal(a, b)
+    assert not np.array_equal(a, generate_cards(500, seed=43))
+
+
+def test_generated_cards_follow_the_rules():
+    cards = generate_cards(2000, seed=1)
+    assert validate_cards(cards) == []
+    assert (cards[:, FREE_CELL] == 0).all()
+    for card in cards[:50].tolist():
+        assert validate_card(card) == card
+
+
+def test_unique_batch_has_no_duplicates():
+    cards = generate_cards(5000, seed=9, unique=True)
+    assert len({tuple(row) for row in cards.tolist()}) == len(cards)
+
+
+def test_validate_cards_flags_broken_rows():
+    cards = generate_cards(4, seed=2).astype(np.int16)
+    cards[1, 0] = 16  # outside the B column
+    cards[2, 5] = cards[2, 0]  # repeated number
+    cards[3, FREE_CELL] = 33  # FREE centre filled
+    assert validate_cards(cards) == [1, 2, 3]
+
+
+def test_as_cards_rejects_ragged_input():
+    with pytest.raises(ValueError):
+        as_cards([[1, 2, 3]])
+    with pytest.raises(ValueError):
+        as_cards([["x"] * 25])
+    assert as_cards([]).shape == (0, 25)
+
+
+def test_audit_matches_the_engine():
+    cards = generate_cards(300, seed=5)
+    engine = BingoEngine(seed=5)
+    for i, card in enumerate(cards.tolist()):
+        engine.add_card(str(i), card)
+    first_win = {}
+    while not engine.finished:
+        _, wins = engine.call()
+        for win in wins:
+            first_win.setdefault(int(win.card_id), len(engine.called))
+    valid, won_at, lines = audit_claims(cards, engine.called)
+    assert valid.all()
+    assert won_at.tolist() == [first_win[i] for i in range(len(cards))]
+    assert lines.shape == (300, len(LINE_NAMES))
+
+
+def test_audit_respects_claim_time():
+    cards = generate_cards(1, seed=8)
+    row = cards[0, :5].tolist()
+    called = [n for n in range(1, 76) if n not in row][:10] + row
+    # Row 1 completes on the last call
+    valid, won_at, lines = audit_claims(cards, called, claimed_at=[len(called) - 1])
+    assert not valid[0]
+    assert won_at[0] == len(called)
+    assert not lines[0].any()
+    valid, _, lines = audit_claims(cards, called, claimed_at=[len(called)])
+    assert valid[0]
+    assert LINE_NAMES[int(np.flatnonzero(lines[0])[0])] == "Row 1"
+    assert line_bits(lines) == [1]
+
+
+def test_audit_reports_cards_that_never_won():
+    cards = generate_cards(3, seed=4)
+    valid, won_at, lines = audit_claims(cards, [])
+    assert not valid.any()
+    assert won_at.tolist() == [NOT_WON] * 3
+    assert line_bits(lines) == [0, 0, 0]
+
+
+@pytest.mark.parametrize("claimed_at", [[-1], [4], [1, 2]])
+def test_audit_rejects_out_of_range_claims(claimed_at):
+    with pytest.raises(ValueError):
+        audit_claims(generate_cards(1, seed=1), [1, 2, 3], claimed_at=claimed_at)
@@ -0,0 +1,158 @@
+import random
+
+import pytest
+
+from game.engine import (
+    FREE_CELL, MAX_NUMBER, WIN_LINES, BingoEngine, generate_card, letter_for, marks_for, validate_card, winning_lines,
+)
+
+
+def _card():
+    # B 1-5, I 16-20, N 31-35 (FREE centre), G 46-50, O 61-65; row r holds the r-th number of each column
+    card = [0] * 25
+    for col, low in enumerate((1, 16, 31, 46, 61)):
+        for row in range(5):
+            card[row * 5 + col] = low + row
+    card[FREE_CELL] = 0
+    return card
+
+
+def test_win_lines_match_check_bingo_order():
+    names = [name for _type, name, _mask, _indices in WIN_LINES]
+    assert names == [
+        "Row 1", "Row 2", "Row 3", "Row 4", "Row 5",
+        "Column B", "Column I", "Column N", "Column G", "Column O",
+        "Diagonal \\", "Diagonal /",
+    ]
+    assert all(len(indices) == 5 for _type, _name, _mask, indices in WIN_LINES)
+
+
+def test_letter_for():
+    assert [letter_for(n) for n in (1, 15, 16, 45, 60, 75)] == ["B", "B", "I", "N", "G", "O"]
+    assert letter_for(0) == letter_for(76) == ""
+
+
+def test_generate_card_follows_the_rules():
+    rng = random.Random(7)
+    for _ in range(50):
+        card = generate_card(rng)
+        assert validate_card(card) == card
+        assert card[FREE_CELL] == 0
+
+
+@pytest.mark.parametrize("card", [
+    [0] * 24,
+    _card()[:FREE_CELL] + [33] + _card()[FREE_CELL + 1:],
+    [16] + _card()[1:],
+    [2] + _card()[1:],
+])
+def test_validate_card_rejects_broken_cards(card):
+    with pytest.raises(ValueError):
+        validate_card(card)
+
+
+def test_row_win_is_reported_once():
+    engine = BingoEngine()
+    engine.add_card("p", _card())
+    for number in (1, 16, 31, 46):
+        _, wins = engine.call(number)
+        assert wins == []
+    assert not engine.verify("p")
+    _, wins = engine.call(61)
+    assert [w.card_id for w in wins] == ["p"]
+    assert wins[0].to_dict()["lines"][0]["name"] == "Row 1"
+    assert engine.verify("p")
+    assert [line["name"] for line in engine.winning_lines("p")] == ["Row 1"]
+    # Completing a second line reports only the new one
+    for number in (2, 3, 4):
+        assert engine.call(number)[1] == []
+    _, wins = engine.call(5)
+    assert [line["name"] for line in wins[0].to_dict()["lines"]] == ["Column B"]
+
+
+def test_free_centre_counts_toward_lines():
+    engine = BingoEngine()
+    engine.add_card("p", _card())
+    for number in (3, 18, 48):
+        assert engine.call(number)[1] == []
+    _, wins = engine.call(63)
+    assert [line["name"] for line in wins[0].to_dict()["lines"]] == ["Row 3"]
+
+
+def test_lines_complete_at_registration_do_not_count():
+    engine = BingoEngine()
+    for number in (1, 16, 31, 46, 61):
+        engine.call(number)
+    engine.add_card("late", _card())
+    assert not engine.verify("late")
+    assert engine.winning_lines("late") == []
+    # A line completed after registration does
+    for number in (2, 17, 32, 47):
+        assert engine.call(number)[1] == []
+    _, wins = engine.call(62)
+    assert [w.card_id for w in wins] == ["late"]
+    assert [line["name"] for line in engine.winning_lines("late")] == ["Row 2"]
+
+
+def test_call_rejects_repeats_and_runs_out():
+    engine = BingoEngine(seed=3)
+    engine.call(10)
+    with pytest.raises(ValueError):
+        engine.call(10)
+    with pytest.raises(ValueError):
+        engine.call(MAX_NUMBER + 1)
+    while not engine.finished:
+        engine.call()
+    assert sorted(engine.called) == list(range(1, MAX_NUMBER + 1))
+    assert engine.call() == (None, [])
+
+
+def test_removed_card_is_not_marked():
+    engine = BingoEngine()
+    engine.add_card("p", _card())
+    engine.remove_card("p")
+    assert "p" not in engine
+    for number in (1, 16, 31, 46, 61):
+        assert engine.call(number)[1] == []
+
+
+def test_engine_matches_a_brute_force_referee():
+    rng = random.Random(11)
+    for game in range(20):
+        engine = BingoEngine(seed=game)
+        cards = {f"c{i}": generate_card(rng) for i in range(200)}
+        for card_id, card in cards.items():
+            engine.add_card(card_id, card)
+        reported = {card_id: set() for card_id in cards}
+        while not engine.finished:
+            _, wins = engine.call()
+            for win in wins:
+                new = {line["name"] for line in win.to_dict()["lines"]}
+                assert not new & reported[win.card_id]
+                reported[win.card_id] |= new
+        for card_id, card in cards.items():
+            expected = {line["name"] for line in winning_lines(marks_for(card, engine.called))}
+            assert reported[card_id] == expected
+            assert engine.marks(card_id) == marks_for(card, engine.called)
+
+
+@pytest.mark.parametrize("value", [True, 1.0])
+def test_validate_card_rejects_non_int_numbers(value):
+    card = _card()
+    card[0] = value
+    with pytest.raises(ValueError):
+        validate_card(card)
+
+
+@pytest.mark.parametrize("value", [False, 0.0, "0"])
+def test_validate_card_rejects_non_int_free_centre(value):
+    card = _card()
+    card[FREE_CELL] = value
+    with pytest.raises(ValueError):
+        validate_card(card)
+
+
+def test_validate_card_accepts_none_or_zero_centre():
+    card = _card()
+    card[FREE_CELL] = None
+    assert validate_card(card)[FREE_CELL] == 0
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import httpx
+
+from llm.scenario import JobPoller, PollProfile
+
+FAST = {"image": PollProfile(initial=0.01, maximum=0.02, factor=1.5, deadline=1.0)}
+AUTH = ("key", "secret")
+
+
+def _job(status, progress=0.0):
+    return {"job": {"jobId": "j", "status": status, "progress": progress, "metadata": {"assetIds": ["a1"]}}}
+
+
+def _run(handler, scenario):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            poller = JobPoller(http, profiles=FAST, cancel_abandoned=False)
+            try:
+                return await scenario(poller)
+            finally:
+                await poller.aclose()
+
+    return asyncio.run(main())
+
+
+def test_returns_payload_once_job_succeeds():
+    polls = []
+
+    def handler(request):
+        polls.append(request.url.path)
+        return httpx.Response(200, json=_job("success" if len(polls) >= 3 else "in-progress", 0.5))
+
+    progress = []
+    result = _run(handler, lambda poller: poller.wait("https://api.test/jobs/j", AUTH, on_progress=progress.append))
+    assert result["job"]["status"] == "success"
+    assert len(polls) == 3
+    assert progress == [0.5, 0.5, 0.5]
+
+
+def test_deadline_resolves_to_none():
+    def handler(request):
+        return httpx.Response(200, json=_job("in-progress"))
+
+    profiles = {"image": PollProfile(initial=0.01, maximum=0.02, factor=1.0, deadline=0.1)}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            poller = JobPoller(http, profiles=profiles, cancel_abandoned=False)
+            try:
+                return await asyncio.wait_for(poller.wait("https://api.test/jobs/j", AUTH), timeout=2.0)
+            finally:
+                await poller.aclose()
+
+    assert asyncio.run(main()) is None
+
+
+def test_malformed_response_does_not_strand_other_waiters():
+    bad_polls = []
+
+    def handler(request):
+        if request.url.path.endswith("/bad"):
+            bad_polls.append(1)
+            # Garbled once, then a real answer
+            if len(bad_polls) == 1:
+                return httpx.Response(200, content=b"<html>oops</html>")
+            return httpx.Response(200, json=_job("success"))
+        return httpx.Response(200, json=_job("success"))
+
+    async def scenario(poller):
+        return await asyncio.wait_for(
+            asyncio.gather(poller.wait("https://api.test/jobs/bad", AUTH), poller.wait("https://api.test/jobs/good", AUTH)),
+            timeout=2.0,
+        )
+
+    bad, good = _run(handler, scenario)
+    assert bad["job"]["status"] == "success"
+    assert good["job"]["status"] == "success"
+    assert len(bad_polls) == 2
+
+
+def test_failing_progress_callback_does_not_stop_polling():
+    def handler(request):
+        return httpx.Response(200, json=_job("success", 1.0))
+
+    def explode(progress):
+        raise RuntimeError("callback bug")
+
+    async def scenario(poller):
+        return await asyncio.wait_for(poller.wait("https://api.test/jobs/j", AUTH, on_progress=explode), timeout=2.0)
+
+    assert _run(handler, scenario)["job"]["status"] == "success"
+
+
+def test_non_object_body_is_retried():
+    bodies = [json.dumps(["not", "a", "job"]).encode(), json.dumps(_job("success")).encode()]
+
+    def handler(request):
+        return httpx.Response(200, content=bodies.pop(0) if len(bodies) > 1 else bodies[0])
+
+    async def scenario(poller):
+        return await asyncio.wait_for(poller.wait("https://api.test/jobs/j", AUTH), timeout=2.0)
+
+    assert _run(handler, scenario)["job"]["status"] == "success"
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+from game.engine import generate_card
+from game.rooms import CLOSE_REPLACED, CLOSE_ROOM_CLOSED, RoomClosed, RoomHub
+
+
+def test_room_that_idles_out_between_lookup_and_join_is_replaced():
+    async def main():
+        hub = RoomHub(call_interval=0.01, idle_timeout=0.05)
+        room = hub.room("lobby")
+        # The connection is still being accepted when the idle timeout fires
+        await asyncio.sleep(0.2)
+        assert room.closed
+        with pytest.raises(RoomClosed):
+            room.join()
+        fresh = hub.room("lobby")
+        assert fresh is not room and not fresh.closed
+        sub = fresh.join()
+        await asyncio.sleep(0.05)
+        assert fresh.engine.called, "the new room should be drawing balls"
+        assert not sub.dropped
+        await hub.aclose()
+        assert sub.dropped and sub.close_code == CLOSE_ROOM_CLOSED
+
+    asyncio.run(main())
+
+
+def test_hub_replaces_a_closed_room_still_registered():
+    async def main():
+        hub = RoomHub(max_rooms=1, call_interval=0.01, idle_timeout=60)
+        room = hub.room("a")
+        # Closed but not yet removed by its on_close callback
+        room.closed = True
+        fresh = hub.room("a")
+        assert fresh is not room
+        await room.aclose()
+        await hub.aclose()
+
+    asyncio.run(main())
+
+
+def test_replaced_connection_stops_at_once_and_is_ignored():
+    async def main():
+        hub = RoomHub(call_interval=60, idle_timeout=60)
+        room = hub.room("r")
+        old = room.join(player="al")
+        token = json.loads(old.queue.get_nowait())["token"]
+        old.queue.get_nowait()  # snapshot
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        pump = asyncio.create_task(room.pump(old, send, heartbeat=15, send_timeout=1))
+        await asyncio.sleep(0.01)
+        new = room.join(player="al", token=token)
+        assert old.close_code == CLOSE_REPLACED
+        # The writer is waiting on an empty queue; close() must wake it well before the heartbeat
+        await asyncio.wait_for(pump, timeout=1)
+        assert sent == []
+        # Late messages from the old socket do not act for the player
+        room.handle(old, json.dumps({"type": "card", "numbers": generate_card()}))
+        assert "al" not in room.engine
+        room.handle(new, json.dumps({"type": "card", "numbers": generate_card()}))
+        assert "al" in room.engine
+        await hub.aclose()
+
+    asyncio.run(main())
+
+
+def test_closing_a_full_queue_still_wakes_the_writer():
+    async def main():
+        hub = RoomHub(call_interval=60, idle_timeout=60, queue_size=2)
+        room = hub.room("full")
+        sub = room.join()
+        sub.offer("x")
+        assert sub.queue.full()
+        sub.close(CLOSE_ROOM_CLOSED, "Room closed")
+        sent = []
+
+        async def send(text):
+            sent.append(text)
+
+        await asyncio.wait_for(room.pump(sub, send, heartbeat=15, send_timeout=1), timeout=1)
+        assert sent == []
+        await hub.aclose()
+
+    asyncio.run(main())
@@ -844,44 +844,50 @@ class OrbellaRoom {
         try {
             const base = window.ORBELLA_API_BASE || 'http://127.0.0.1:8000';
 
-            // Call all three APIs simultaneously
-            const [videoResponse, cardResponse, ballCallerResponse] = await Promise.all([
-                fetch(base + '/scenario/generate', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ theme })
-                }),
-                fetch(base + '/scenario/generate-card', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ theme })
-                }),
-                fetch(base + '/scenario/generate-ball-caller', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ theme })
-                })
-            ]);
-
-            if (!videoResponse.ok || !cardResponse.ok || !ballCallerResponse.ok) {
+            // Start a background generation job, then follow its progress over SSE
+            const jobResponse = await fetch(base + '/jobs', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ theme })
+            });
+
+            if (!jobResponse.ok) {
                 throw new Error('Generation failed');
             }
 
-            const [videoData, cardData, ballCallerData] = await Promise.all([
-                videoResponse.json(),
-                cardResponse.json(),
-                ballCallerResponse.json()
-            ]);
+            const jobHandle = await jobResponse.json();
+            const roomData = await this.waitForJob(base, jobHandle);
+            if (roomData.errors && Object.keys(roomData.errors).length > 0) {
+                console.warn('Partial room generation:', roomData.errors);
+            }
+
+            const videoData = roomData.video || {};
+            const cardData = roomData.card || {};
+            const ballCallerData = roomData.ball_caller || {};
 
             console.log('Video data:', videoData);
             console.log('Card data:', cardData);
             console.log('Ball Caller data:', ballCallerData);
 
-            const videoUrls = videoData.asset_urls || [];
-            const cardUrls = cardData.asset_urls || [];
-            const originalCardUrls = cardData.original_urls || cardUrls;
-            const ballCallerUrls = ballCallerData.asset_urls || [];
-            const originalBallCallerUrls = ballCallerData.original_urls || ballCallerUrls;
+            // Processed images come in several widths; ask for one that fits this screen
+            const imageWidth = Math.ceil(window.innerWidth * (window.devicePixelRatio || 1));
+            const toAbsolute = (urls) => urls.map(u => {
+                if (typeof u !== 'string' || !u.startsWith('/')) return u;
+                return u.startsWith('/images/') ? `${base}${u}?w=${imageWidth}` : base + u;
+            });
+            // Locally transcoded videos list their variants; pick the lightest one this device plays well
+            const pickVideo = (variants) => {
+                const probe = document.createElement('video');
+                if (window.innerWidth * (window.devicePixelRatio || 1) <= 1280 && variants.mp4_mobile) return variants.mp4_mobile;
+                if (variants.webm_av1 && probe.canPlayType('video/webm; codecs="av01.0.05M.08"')) return variants.webm_av1;
+                if (variants.webm && probe.canPlayType('video/webm; codecs="vp9"')) return variants.webm;
+                return variants.mp4 || Object.values(variants)[0];
+            };
+            const videoUrls = toAbsolute(videoData.videos ? videoData.videos.map(pickVideo) : (videoData.asset_urls || []));
+            const cardUrls = toAbsolute(cardData.asset_urls || []);
+            const originalCardUrls = cardData.original_urls ? toAbsolute(cardData.original_urls) : cardUrls;
+            const ballCallerUrls = toAbsolute(ballCallerData.asset_urls || []);
+            const originalBallCallerUrls = ballCallerData.original_urls ? toAbsolute(ballCallerData.original_urls) : ballCallerUrls;
 
             if (videoUrls.length > 0 || cardUrls.length > 0) {
                 // Save to local storage
@@ -929,6 +935,55 @@ class OrbellaRoom {
         }
     }
 
+    waitForJob(base, jobHandle) {
+        const labels = { video: 'video', card: 'card', ball_caller: 'ball caller' };
+        const progress = {};
+
+        return new Promise((resolve, reject) => {
+            const events = new EventSource(base + jobHandle.events_url);
+
+            // Leaving the page abandons the room; tell the server so it stops generating for nobody
+            const cancelJob = () => {
+                fetch(base + jobHandle.status_url, { method: 'DELETE', keepalive: true }).catch(() => {});
+            };
+            window.addEventListener('pagehide', cancelJob);
+
+            events.addEventListener('progress', (e) => {
+                const data = JSON.parse(e.data);
+                progress[data.part] = Math.round(data.progress * 100);
+                const summary = Object.entries(progress)
+                    .map(([part, pct]) => `${labels[part] || part} ${pct}%`)
+                    .join(', ');
+                this.setStatus(`Generating... ${summary}`);
+            });
+
+            events.addEventListener('asset', (e) => {
+                const data = JSON.parse(e.data);
+                progress[data.part] = 100;
+                console.log(`Room part ready: ${data.part}`);
+            });
+
+            events.addEventListener('done', (e) => {
+                events.close();
+                window.removeEventListener('pagehide', cancelJob);
+                const job = JSON.parse(e.data);
+                if (job.status === 'failure') {
+                    reject(new Error('Generation failed'));
+                    return;
+                }
+                resolve({ ...job.results, errors: job.errors });
+            });
+
+            // EventSource reconnects on its own; only give up once it has closed
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    window.removeEventListener('pagehide', cancelJob);
+                    reject(new Error('Lost connection to generation job'));
+                }
+            };
+        });
+    }
+
     // === LOADING ANIMATION ===
 
     showLoadingAnimation() {
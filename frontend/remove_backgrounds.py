@@ -1,17 +1,51 @@
 #!/usr/bin/env python3
 """
 Video Background Removal Script
-Removes solid color backgrounds from video files and creates transparent WebM output
+Builds the frontend's WebM videos from video_manifest.json: transparent nav
+icons (chromakey on their solid background) and VP9 room previews.
+
+Jobs run concurrently, one per CPU by default, and libvpx-vp9 threads are
+split between them. An output is skipped when its input file hash and
+encoding parameters match the last successful build recorded in
+.video_build_cache.json, so re-running after touching one file only
+re-encodes that file.
+
+Usage:
+    python3 remove_backgrounds.py              # incremental build
+    python3 remove_backgrounds.py --force      # rebuild everything
+    python3 remove_backgrounds.py --dry-run    # list what would be rebuilt
 """
 
+import argparse
+import glob
+import hashlib
+import json
+import os
 import subprocess
 import sys
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MANIFEST = os.path.join(SCRIPT_DIR, 'video_manifest.json')
+CACHE_FILE = '.video_build_cache.json'
+
+# Bump when the generated ffmpeg commands change so every output is rebuilt
+BUILD_VERSION = 1
+
+PRESET_DEFAULTS = {
+    # Transparent WebM: key out a solid background color
+    'chromakey': {'color': '0x000000', 'similarity': 0.3, 'blend': 0.1, 'crf': 30, 'cpu_used': 2},
+    # Plain VP9 WebM, e.g. room previews
+    'vp9': {'crf': 34, 'cpu_used': 2},
+}
+
 
-def check_ffmpeg():
+def check_ffmpeg(ffmpeg='ffmpeg'):
     """Check if FFmpeg is installed"""
     try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+        subprocess.run([ffmpeg, '-version'], capture_output=True, check=True)
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
@@ -30,104 +64,203 @@ def install_ffmpeg_instructions():
     print("    https://ezgif.com/video-to-gif (then gif-to-video)")
     sys.exit(1)
 
-def remove_background_chromakey(input_file, output_file, color_hex, similarity=0.3, blend=0.1):
-    """
-    Remove background using chromakey filter
-    
-    Args:
-        input_file: Input video path
-        output_file: Output video path (WebM with alpha)
-        color_hex: Hex color of background to remove (e.g., '0x2a3a4f')
-        similarity: Color similarity threshold (0.01-1.0)
-        blend: Blending threshold (0.0-1.0)
-    """
-    cmd = [
-        'ffmpeg',
-        '-i', input_file,
-        '-vf', f"chromakey={color_hex}:{similarity}:{blend},format=yuva420p",
+def load_cache(base_dir):
+    try:
+        with open(os.path.join(base_dir, CACHE_FILE)) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache.setdefault('hashes', {})
+    cache.setdefault('outputs', {})
+    return cache
+
+def save_cache(base_dir, cache):
+    path = os.path.join(base_dir, CACHE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_sha256(base_dir, rel_path, cache):
+    """Hash a file, reusing the cached hash while its size and mtime are unchanged"""
+    st = os.stat(os.path.join(base_dir, rel_path))
+    known = cache['hashes'].get(rel_path)
+    if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+        return known['sha256']
+    digest = hashlib.sha256()
+    with open(os.path.join(base_dir, rel_path), 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    cache['hashes'][rel_path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+def plan_jobs(manifest_path):
+    """Expand the manifest rules into one job per matched input file"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    jobs = []
+    for rule in manifest.get('rules', []):
+        preset = rule['preset']
+        if preset not in PRESET_DEFAULTS:
+            print(f"⚠️  Unknown preset '{preset}' in rule '{rule.get('name', rule['inputs'])}'")
+            continue
+        matched = sorted(glob.glob(os.path.join(base_dir, rule['inputs'])))
+        if not matched:
+            print(f"⚠️  No files match: {rule['inputs']}")
+        for input_path in matched:
+            rel_input = os.path.relpath(input_path, base_dir)
+            name = os.path.basename(rel_input)
+            params = dict(PRESET_DEFAULTS[preset])
+            params.update(rule.get('params', {}))
+            params.update(rule.get('files', {}).get(name, {}))
+            jobs.append({
+                'input': rel_input,
+                'output': rule['output'].format(dir=os.path.dirname(rel_input), stem=os.path.splitext(name)[0]),
+                'preset': preset,
+                'params': params,
+            })
+    return base_dir, jobs
+
+def job_signature(job):
+    """Everything that affects the encoded output, apart from the input bytes"""
+    payload = json.dumps({'version': BUILD_VERSION, 'preset': job['preset'], 'params': job['params']}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def build_command(ffmpeg, job, input_path, output_path, threads):
+    params = job['params']
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-i', input_path]
+    if job['preset'] == 'chromakey':
+        cmd += ['-vf', f"chromakey={params['color']}:{params['similarity']}:{params['blend']},format=yuva420p"]
+        pix_fmt = 'yuva420p'
+    else:
+        pix_fmt = 'yuv420p'
+    cmd += [
         '-c:v', 'libvpx-vp9',
         '-b:v', '0',
-        '-crf', '30',
-        '-pix_fmt', 'yuva420p',
+        '-crf', str(params['crf']),
+        '-pix_fmt', pix_fmt,
+        '-deadline', 'good',
+        '-cpu-used', str(params['cpu_used']),
+        # Row-based multithreading lets VP9 use its share of the cores even at icon sizes
+        '-row-mt', '1',
+        '-threads', str(threads),
         '-an',  # Remove audio
+        '-f', 'webm',
         '-y',  # Overwrite output
-        output_file
+        output_path,
     ]
-    
-    print(f"Processing {os.path.basename(input_file)}...")
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(f"✅ Created: {os.path.basename(output_file)}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error processing {input_file}")
-        print(f"Error: {e.stderr}")
-        return False
+    return cmd
+
+def run_job(ffmpeg, base_dir, job, threads):
+    """Encode one file to a temp path and rename it into place; returns (ok, seconds, error)"""
+    output_path = os.path.join(base_dir, job['output'])
+    tmp_path = output_path + '.part'
+    cmd = build_command(ffmpeg, job, os.path.join(base_dir, job['input']), tmp_path, threads)
+    started = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, elapsed, result.stderr.strip()
+    os.replace(tmp_path, output_path)
+    return True, elapsed, None
+
+def format_size(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB" if num_bytes >= 1024 * 1024 else f"{num_bytes / 1024:.0f} KB"
+
+def process_videos(manifest_path=DEFAULT_MANIFEST, ffmpeg='ffmpeg', max_jobs=None, force=False, dry_run=False):
+    """Build every manifest output whose input or parameters changed"""
+    base_dir, jobs = plan_jobs(manifest_path)
+    cache = load_cache(base_dir)
+
+    todo = []
+    skipped = 0
+    for job in jobs:
+        if not os.path.exists(os.path.join(base_dir, job['input'])):
+            print(f"⚠️  File not found: {job['input']}")
+            continue
+        job['input_sha256'] = file_sha256(base_dir, job['input'], cache)
+        job['signature'] = job_signature(job)
+        built = cache['outputs'].get(job['output'])
+        up_to_date = (
+            built is not None
+            and built.get('input_sha256') == job['input_sha256']
+            and built.get('signature') == job['signature']
+            and os.path.exists(os.path.join(base_dir, job['output']))
+        )
+        if up_to_date and not force:
+            skipped += 1
+        else:
+            todo.append(job)
+
+    print(f"\n🎬 {len(jobs)} outputs in manifest: {len(todo)} to build, {skipped} up to date\n")
+    if dry_run:
+        for job in todo:
+            print(f"   {job['input']} -> {job['output']}")
+        save_cache(base_dir, cache)
+        return 0
+    if not todo:
+        save_cache(base_dir, cache)
+        return 0
 
-def process_videos():
-    """Process all three navigation icon videos"""
-    
     # Check FFmpeg
-    if not check_ffmpeg():
+    if not check_ffmpeg(ffmpeg):
         install_ffmpeg_instructions()
-    
-    # Define video files and their background colors (estimated from screenshot)
-    videos = [
-        {
-            'input': 'assets/videos/fire-icon.mp4',
-            'output': 'assets/videos/fire-icon-transparent.webm',
-            'color': '0x5a3a4f',  # Dark purplish background
-            'similarity': 0.4,
-            'blend': 0.15
-        },
-        {
-            'input': 'assets/videos/bingo-card-icon.mp4',
-            'output': 'assets/videos/bingo-card-icon-transparent.webm',
-            'color': '0x4a4a3f',  # Dark greenish background
-            'similarity': 0.4,
-            'blend': 0.15
-        },
-        {
-            'input': 'assets/videos/dice-icon.mp4',
-            'output': 'assets/videos/dice-icon-transparent.webm',
-            'color': '0x5a4a5f',  # Dark purple background
-            'similarity': 0.4,
-            'blend': 0.15
-        }
-    ]
-    
-    print("\n🎬 Starting background removal process...\n")
-    
-    success_count = 0
-    for video in videos:
-        if os.path.exists(video['input']):
-            if remove_background_chromakey(
-                video['input'],
-                video['output'],
-                video['color'],
-                video['similarity'],
-                video['blend']
-            ):
-                success_count += 1
-        else:
-            print(f"⚠️  File not found: {video['input']}")
-    
-    print(f"\n✨ Processed {success_count} out of {len(videos)} videos")
-    
-    if success_count > 0:
-        print("\n📝 Next steps:")
-        print("1. Check the generated *-transparent.webm files")
-        print("2. If backgrounds aren't fully removed, try the online tool:")
-        print("   https://www.unscreen.com")
-        print("3. Rename files to:")
-        print("   - fire-icon.webm")
-        print("   - bingo-card-icon.webm")
-        print("   - dice-icon.webm")
-        print("4. Refresh your browser to see the changes!")
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(max_jobs or cpus, len(todo)))
+    # Split the cores between concurrent encodes instead of letting each one grab all of them
+    threads = max(1, cpus // workers)
+    print(f"Running {workers} ffmpeg jobs at a time with {threads} VP9 threads each\n")
+
+    lock = threading.Lock()
+    failures = 0
+    total_encode = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, ffmpeg, base_dir, job, threads): job for job in todo}
+        for future in as_completed(futures):
+            job = futures[future]
+            ok, elapsed, error = future.result()
+            total_encode += elapsed
+            if not ok:
+                failures += 1
+                print(f"❌ {job['output']}  failed after {elapsed:.1f}s")
+                print(f"   Error: {error}")
+                continue
+            size = os.path.getsize(os.path.join(base_dir, job['output']))
+            print(f"✅ {job['output']}  {elapsed:.1f}s  ({format_size(size)})")
+            with lock:
+                cache['outputs'][job['output']] = {
+                    'input': job['input'],
+                    'input_sha256': job['input_sha256'],
+                    'signature': job['signature'],
+                    'seconds': round(elapsed, 2),
+                }
+                # Save as we go so an interrupted batch keeps the outputs it finished
+                save_cache(base_dir, cache)
+
+    wall = time.perf_counter() - started
+    print(f"\n✨ Built {len(todo) - failures} of {len(todo)} outputs in {wall:.1f}s "
+          f"({total_encode:.1f}s of encoding), skipped {skipped}, failed {failures}")
+    return 1 if failures else 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build transparent icon and room preview WebMs from video_manifest.json")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help="manifest path (default: %(default)s)")
+    parser.add_argument('--ffmpeg', default='ffmpeg', help="ffmpeg executable (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="concurrent ffmpeg jobs (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="rebuild outputs even if they are up to date")
+    parser.add_argument('--dry-run', action='store_true', help="only list the outputs that would be rebuilt")
+    return parser.parse_args()
 
 if __name__ == '__main__':
+    args = parse_args()
     try:
-        process_videos()
+        sys.exit(process_videos(args.manifest, args.ffmpeg, args.jobs, args.force, args.dry_run))
     except KeyboardInterrupt:
         print("\n\n⛔ Process cancelled by user")
         sys.exit(1)